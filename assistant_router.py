@@ -0,0 +1,152 @@
+"""
+One-request intent routing and answering for the Woolly assistant.
+
+Obvious requests (time/date, today's schedule, today's menu, weather) are routed by a few
+precompiled patterns with no model call. Everything else goes out as a single streamed
+chat request with one tool per built-in intent: the model either calls a tool (intent plus
+arguments, e.g. the song to play) or answers directly, and a direct answer's text is
+handed to the caller while it streams so it can be spoken sentence by sentence. That
+replaces the classify-then-answer pair of requests with at most one per turn. Each turn
+reports its route, latency and token usage, and the router keeps running totals.
+"""
+import json
+import os
+import re
+import threading
+import time
+
+import tracing
+
+ROUTER_MODEL = os.getenv("ASSISTANT_MODEL", "gpt-3.5-turbo")
+
+SYSTEM_PROMPT = (
+    "You are Woolly, a friendly voice assistant for the residents of a senior living facility. "
+    "Use a tool when the request is about the weather, playing music, the current time or date, "
+    "today's schedule or events, or today's food menu. Otherwise answer directly in one to three "
+    "short, plain sentences that read well aloud; for outfit questions, suggest practical clothing."
+)
+
+LOCAL_ROUTES = [
+    ("time_date", r"\b(?:what(?:'s| is) the (?:time|date)|what time is it|what day is (?:it|today)|"
+                  r"(?:today'?s|the) date|what(?:'s| is) today)\b"),
+    ("food_menu", r"\b(?:menu|for (?:lunch|dinner|dessert|soup)|what(?:'s| are) we eating)\b"),
+    ("today_schedule", r"\b(?:schedule|calendar|what(?:'s| is) (?:on|happening) today|events? today|activities today)\b"),
+    ("weather", r"\b(?:weather|temperature outside|is it (?:raining|snowing|cold|hot|sunny))\b"),
+]
+_LOCAL = [(intent, re.compile(pattern)) for intent, pattern in LOCAL_ROUTES]
+# Requests that mention these need a real answer even if they also mention the weather or time
+_DEFER = re.compile(r"\b(?:wear|outfit|dress|coat|jacket|umbrella|should i|remind|why|how long)\b")
+
+TOOLS = [
+    {"type": "function", "function": {"name": "weather", "description": "Current local weather conditions",
+                                      "parameters": {"type": "object", "properties": {}}}},
+    {"type": "function", "function": {"name": "play_music", "description": "Play a song on Spotify",
+                                      "parameters": {"type": "object", "properties": {
+                                          "song": {"type": "string", "description": "Song (and artist) to play, empty if not given"}}}}},
+    {"type": "function", "function": {"name": "time_date", "description": "The current time and date",
+                                      "parameters": {"type": "object", "properties": {}}}},
+    {"type": "function", "function": {"name": "today_schedule", "description": "Today's facility schedule and events",
+                                      "parameters": {"type": "object", "properties": {}}}},
+    {"type": "function", "function": {"name": "food_menu", "description": "Today's lunch and dinner menu",
+                                      "parameters": {"type": "object", "properties": {}}}},
+]
+
+
+def route_local(text):
+    """Intent for an unambiguous request, or None if the model should decide"""
+    text = text.lower().replace("’", "'")
+    if _DEFER.search(text):
+        return None
+    matched = {intent for intent, pattern in _LOCAL if pattern.search(text)}
+    # Two different matches (e.g. "what's the weather for lunch") are left to the model
+    return matched.pop() if len(matched) == 1 else None
+
+
+class AssistantRouter:
+    def __init__(self, client, model=ROUTER_MODEL):
+        self.client = client
+        self.model = model
+        self.lock = threading.Lock()
+        self.totals = {"turns": 0, "local_routes": 0, "llm_calls": 0, "prompt_tokens": 0,
+                       "completion_tokens": 0, "latency_ms": 0.0}
+
+    def route(self, text, speak_deltas=None):
+        """
+        Route one user request.
+        Args:
+            text: Transcribed request
+            speak_deltas: Optional callable given an iterable of answer text fragments as they stream
+        Returns:
+            dict with intent, args, answer (text spoken for a direct answer, else None), source
+            ("local" or the model name), llm_calls, prompt/completion tokens and latency_ms
+        """
+        start = time.monotonic()
+        with tracing.span("route") as span:
+            intent = route_local(text)
+            if intent:
+                turn = {"intent": intent, "args": {}, "answer": None, "source": "local", "llm_calls": 0,
+                        "prompt_tokens": 0, "completion_tokens": 0}
+            else:
+                turn = self._route_llm(text, speak_deltas)
+            span.set(intent=turn["intent"], source=turn["source"])
+        turn["latency_ms"] = (time.monotonic() - start) * 1000
+        with self.lock:
+            self.totals["turns"] += 1
+            self.totals["local_routes"] += turn["source"] == "local"
+            for name in ("llm_calls", "prompt_tokens", "completion_tokens", "latency_ms"):
+                self.totals[name] += turn[name]
+        tracing.count("llm_tokens", turn["prompt_tokens"], kind="prompt")
+        tracing.count("llm_tokens", turn["completion_tokens"], kind="completion")
+        return turn
+
+    def _route_llm(self, text, speak_deltas):
+        tracing.count("api_calls", api="chat")
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": text}],
+            tools=TOOLS,
+            temperature=0.7,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        calls = {}  # tool call index -> [name, argument fragments]
+        usage = {}
+        answer = []
+
+        def content():
+            for chunk in stream:
+                if chunk.usage:
+                    usage["prompt"] = chunk.usage.prompt_tokens
+                    usage["completion"] = chunk.usage.completion_tokens
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                for call in delta.tool_calls or []:
+                    entry = calls.setdefault(call.index, ["", []])
+                    if call.function and call.function.name:
+                        entry[0] = call.function.name
+                    if call.function and call.function.arguments:
+                        entry[1].append(call.function.arguments)
+                if delta.content:
+                    answer.append(delta.content)
+                    yield delta.content
+
+        if speak_deltas:
+            speak_deltas(content())
+        for _ in content():
+            pass  # drain whatever the speaker did not consume
+
+        turn = {"intent": "other", "args": {}, "answer": "".join(answer) or None, "source": self.model,
+                "llm_calls": 1, "prompt_tokens": usage.get("prompt", 0), "completion_tokens": usage.get("completion", 0)}
+        if calls:
+            name, fragments = calls[min(calls)]
+            turn["intent"] = name
+            try:
+                turn["args"] = json.loads("".join(fragments) or "{}")
+            except json.JSONDecodeError:
+                turn["args"] = {}
+        return turn
+
+    def stats(self):
+        with self.lock:
+            return dict(self.totals)
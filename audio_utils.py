@@ -0,0 +1,61 @@
+"""Small in-process PCM helpers shared by the capture, playback and upload paths."""
+import wave
+
+import numpy as np
+
+
+def read_wav(path):
+    """Read a 16-bit WAV file as a mono int16 array; returns (samples, sample_rate)"""
+    with wave.open(str(path), "rb") as wf:
+        channels = wf.getnchannels()
+        rate = wf.getframerate()
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM is supported")
+        samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples, rate
+
+
+def write_wav(path, samples, rate):
+    """Write a mono int16 array as a 16-bit WAV file"""
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(np.asarray(samples, dtype=np.int16).tobytes())
+
+
+def lowpass_taps(src_rate, dst_rate):
+    """Hamming-windowed sinc that stops everything above dst_rate / 2, sized to the rate ratio"""
+    ratio = src_rate / dst_rate
+    n = np.arange(-int(8 * ratio), int(8 * ratio) + 1)
+    # The transition band (about 3.3 * src_rate / len(n) wide) ends at the new Nyquist frequency
+    cutoff = (dst_rate / 2 - 1.65 * src_rate / len(n)) / src_rate
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(len(n))
+    return taps / taps.sum()
+
+
+def resample(samples, src_rate, dst_rate):
+    """
+    Resample a mono int16 array by linear interpolation. When downsampling, content above the
+    new Nyquist frequency is filtered out first so it doesn't alias into the speech band.
+    """
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples
+    signal = np.asarray(samples, dtype=np.float32)
+    if dst_rate < src_rate:
+        signal = np.convolve(signal, lowpass_taps(src_rate, dst_rate), mode="same")
+    duration = len(samples) / src_rate
+    dst_len = int(round(duration * dst_rate))
+    src_times = np.arange(len(samples)) / src_rate
+    dst_times = np.arange(dst_len) / dst_rate
+    return np.clip(np.interp(dst_times, src_times, signal), -32768, 32767).astype(np.int16)
+
+
+def frame_rms(samples):
+    """Root-mean-square level of an int16 frame"""
+    if len(samples) == 0:
+        return 0.0
+    floats = samples.astype(np.float32)
+    return float(np.sqrt(np.mean(floats * floats)))
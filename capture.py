@@ -0,0 +1,225 @@
+"""
+Persistent microphone capture into a preallocated ring buffer.
+
+One arecord process per input device stays open and a reader thread reads its PCM straight
+into a NumPy ring (readinto() on the ring's own memory, so no bytes object per chunk). The
+ring is mirrored: every chunk is stored twice, capacity apart, so any window of up to the
+ring's length is a single contiguous slice. Consumers (VAD, the wake word detector, STT
+upload) get read-only views of the audio they need without copying it, writing it to disk
+or reopening the device.
+
+Positions are absolute sample counts since the service was created. A view stays valid
+until the writer laps it, ring_seconds later; copy it if it has to live longer.
+"""
+import os
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+import tracing
+from vad import Endpointer, arecord_command, capture_summary
+
+DEFAULT_DEVICE = os.getenv("AUDIO_INPUT_DEVICE", "plughw:3,0")
+DEFAULT_RATE = 44100
+
+
+class CaptureOverrun(Exception):
+    """The requested audio has already been overwritten by newer samples"""
+
+
+class AudioRing:
+    """Mirrored int16 ring; window(start, end) is a view for any span up to capacity - chunk samples"""
+    def __init__(self, capacity, chunk):
+        self.chunk = chunk
+        self.capacity = -(-capacity // chunk) * chunk  # whole chunks, so a write never wraps
+        self.buffer = np.zeros(2 * self.capacity, dtype=np.int16)
+        # Byte views of each chunk's primary copy, made once so the reader allocates nothing per read
+        self.slots = [memoryview(self.buffer[i:i + chunk]).cast("B") for i in range(0, self.capacity, chunk)]
+        self.written = 0
+
+    def next_chunk(self):
+        """Bytes the next chunk is read into: the primary copy of the oldest chunk"""
+        return self.slots[self.written % self.capacity // self.chunk]
+
+    def commit(self):
+        offset = self.written % self.capacity
+        self.buffer[self.capacity + offset:self.capacity + offset + self.chunk] = self.buffer[offset:offset + self.chunk]
+        self.written += self.chunk
+
+    @property
+    def oldest(self):
+        """First position still readable (the chunk being filled is not)"""
+        return max(0, self.written + self.chunk - self.capacity)
+
+    def window(self, start, end):
+        if start < self.oldest:
+            raise CaptureOverrun(f"samples {start}..{end} were overwritten (oldest is {self.oldest})")
+        if end > self.written or end < start:
+            raise ValueError(f"samples {start}..{end} are not captured yet (written {self.written})")
+        offset = start % self.capacity
+        view = self.buffer[offset:offset + end - start]
+        view.flags.writeable = False
+        return view
+
+
+class CaptureService:
+    """
+    Always-on capture from one input device.
+    Args:
+        device: ALSA capture device
+        fs: Sample rate
+        ring_seconds: Audio kept in the ring; the longest window a consumer can ask for
+        chunk_ms: Size of each read from arecord, and so the granularity of positions
+    """
+    def __init__(self, device=DEFAULT_DEVICE, fs=DEFAULT_RATE, ring_seconds=30.0, chunk_ms=20):
+        self.device = device
+        self.fs = fs
+        self.ring = AudioRing(int(fs * ring_seconds), int(fs * chunk_ms / 1000))
+        self.condition = threading.Condition()
+        self.process = None
+        self.thread = None
+        self.opens = 0
+        self.overruns = 0
+        self._wake_at = float("inf")  # lowest position a waiter is blocked on
+
+    def start(self):
+        """Open the device and start filling the ring; no-op if already running"""
+        with self.condition:
+            if self.process is not None:
+                return
+            # Unbuffered pipe: readinto() lands in the ring without an intermediate copy
+            self.process = subprocess.Popen(arecord_command(self.device, self.fs), stdout=subprocess.PIPE,
+                                            bufsize=0)
+            self.opens += 1
+            self.thread = threading.Thread(target=self._reader, args=(self.process,), name="capture-reader",
+                                           daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Release the device (e.g. for a recording that opens it itself); positions keep counting"""
+        with self.condition:
+            process, thread = self.process, self.thread
+            self.process = self.thread = None
+        if process is None:
+            return
+        process.terminate()
+        process.wait()
+        thread.join()
+
+    def running(self):
+        return self.process is not None
+
+    def _reader(self, process):
+        pipe = process.stdout
+        while True:
+            chunk = self.ring.next_chunk()
+            filled = pipe.readinto(chunk)
+            while filled and filled < len(chunk):
+                n = pipe.readinto(chunk[filled:])
+                if not n:
+                    break
+                filled += n
+            if filled < len(chunk):
+                break
+            with self.condition:
+                self.ring.commit()
+                if self.ring.written >= self._wake_at:
+                    self._wake_at = float("inf")
+                    self.condition.notify_all()
+        with self.condition:
+            if self.process is process:
+                self.process = self.thread = None
+            self.condition.notify_all()
+
+    @property
+    def position(self):
+        """Absolute position of the newest captured sample"""
+        return self.ring.written
+
+    def wait(self, position, timeout=None):
+        """Block until position samples have been captured; False on timeout or if capture stopped"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.ring.written < position and self.process is not None:
+                # Only wake once this position is reached, not on every chunk
+                self._wake_at = min(self._wake_at, position)
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            return self.ring.written >= position
+
+    def view(self, start, end):
+        """Read-only view of samples start..end"""
+        try:
+            return self.ring.window(start, end)
+        except CaptureOverrun:
+            self.overruns += 1
+            raise
+
+    def latest(self, seconds):
+        """View of the most recent seconds of audio (less if the ring holds less)"""
+        end = self.ring.written
+        return self.view(max(self.ring.oldest, end - int(seconds * self.fs)), end)
+
+    def read(self, position, samples, timeout=2.0):
+        """Wait for and return the view of samples starting at position; None if capture stopped"""
+        if not self.wait(position + samples, timeout):
+            return None
+        return self.view(position, position + samples)
+
+    def record_until_silence(self, max_duration=10.0, leading_silence=3.0, trailing_silence=0.8, start=None):
+        """
+        vad.record_until_silence() on the ring: endpoint from start (default now) without
+        touching the device or the disk.
+        Returns:
+            (view of the captured samples, capture summary as in vad.save_capture())
+        """
+        if max_duration * self.fs > self.ring.capacity - self.ring.chunk:
+            raise ValueError(f"max_duration {max_duration}s does not fit in the capture ring")
+        self.start()
+        endpointer = Endpointer(fs=self.fs, leading_silence=min(leading_silence, max_duration),
+                                trailing_silence=trailing_silence, max_duration=max_duration)
+        began = time.monotonic()
+        start = self.position if start is None else start
+        position = start
+        while True:
+            frame = self.read(position, endpointer.frame_samples)
+            if frame is None:
+                endpointer.stop_reason = "device_closed"
+                break
+            position += endpointer.frame_samples
+            if endpointer.process(frame):
+                break
+        return self.view(start, position), capture_summary(endpointer, max_duration, began)
+
+    def stats(self):
+        return {
+            "opens": self.opens,
+            "overruns": self.overruns,
+            "captured_seconds": round(self.ring.written / self.fs, 1),
+            "ring_bytes": self.ring.buffer.nbytes,
+        }
+
+    def close(self):
+        self.stop()
+
+
+_services = {}
+_service_lock = threading.Lock()
+
+
+def get_capture(device=None, fs=DEFAULT_RATE):
+    """Process-wide capture service for an input device (default AUDIO_INPUT_DEVICE); start() it to begin"""
+    device = device or DEFAULT_DEVICE
+    with _service_lock:
+        service = _services.get(device)
+        if service is None:
+            service = _services[device] = CaptureService(device, fs)
+            tracing.add_collector(lambda: {f'capture_{name}{{device="{device}"}}': value
+                                           for name, value in service.stats().items()})
+        elif service.fs != fs:
+            raise ValueError(f"{device} is already captured at {service.fs} Hz")
+        return service
@@ -1,44 +1,150 @@
+"""
+MP3 to WAV conversion for the prompt libraries, plus aplay helpers.
+
+convert_batch() transcodes every *.mp3 in a directory into one output folder per profile:
+    device -- 44.1 kHz mono 16-bit, what the playback engine plays (<dir>/wav)
+    stt    -- 16 kHz mono 16-bit, what the STT backends take (<dir>/wav16k)
+The ffmpeg processes run side by side, one per core by default. A WAV that is newer than its MP3
+is skipped. So is one whose MP3 still hashes to the value recorded in the output folder's
+manifest when it was converted, which keeps regenerated but identical prompts from being
+transcoded again.
+"""
+import argparse
+import hashlib
+import json
 import os
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def convert_mp3_to_wav(input_dir):
-    # Get the absolute path of the input directory
+FFMPEG = os.getenv("FFMPEG", "ffmpeg")
+PROFILES = {
+    "device": {"sample_rate": 44100, "folder": "wav"},
+    "stt": {"sample_rate": 16000, "folder": "wav16k"},
+}
+MANIFEST = ".convert_manifest.json"
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir):
+    try:
+        with open(output_dir / MANIFEST, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    tmp_path = output_dir / (MANIFEST + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, output_dir / MANIFEST)
+
+
+def transcode(mp3_file, wav_file, sample_rate):
+    """Convert one file with ffmpeg; the WAV only appears once it is complete. Returns an error or None"""
+    tmp_file = wav_file.with_name(f".{wav_file.stem}.tmp.wav")
+    try:
+        subprocess.run([
+            FFMPEG, "-y", "-nostdin", "-loglevel", "error",
+            "-i", str(mp3_file),
+            "-acodec", "pcm_s16le",       # 16-bit PCM
+            "-ar", str(sample_rate),
+            "-ac", "1",                   # mono
+            str(tmp_file)
+        ], check=True, capture_output=True)
+        os.replace(tmp_file, wav_file)
+        return None
+    except subprocess.CalledProcessError as e:
+        return e.stderr.decode(errors="replace").strip()
+    except Exception as e:
+        return str(e)
+    finally:
+        tmp_file.unlink(missing_ok=True)
+
+
+def plan(mp3_files, output_dir, manifest, force=False):
+    """Split the sources into (to convert, skipped), hashing only files whose WAV looks stale"""
+    todo, skipped = [], []
+    for mp3_file in mp3_files:
+        wav_file = output_dir / f"{mp3_file.stem}.wav"
+        if not force and wav_file.exists():
+            if wav_file.stat().st_mtime >= mp3_file.stat().st_mtime:
+                skipped.append(mp3_file)
+                continue
+            digest = file_hash(mp3_file)
+            if manifest.get(mp3_file.name) == digest:
+                skipped.append(mp3_file)
+                continue
+        todo.append(mp3_file)
+    return todo, skipped
+
+
+def convert_batch(input_dir, profiles=("device",), workers=None, force=False, pattern="*.mp3"):
+    """
+    Transcode every MP3 in input_dir for each profile, in parallel.
+    Args:
+        input_dir: Directory holding the MP3 files
+        profiles: Names from PROFILES
+        workers: ffmpeg processes at once (default: one per core)
+        force: Convert even files that are up to date
+    Returns:
+        Summary dict: converted, skipped, failed, seconds, files_per_second
+    """
     input_dir = Path(input_dir).resolve()
-    
-    # Create output directory if it doesn't exist
-    output_dir = input_dir / "wav"
-    output_dir.mkdir(exist_ok=True)
-    
-    # Get all MP3 files in the input directory
-    mp3_files = list(input_dir.glob("*.mp3"))
-    
+    mp3_files = sorted(input_dir.glob(pattern))
+    summary = {"converted": 0, "skipped": 0, "failed": 0, "seconds": 0.0, "files_per_second": 0.0}
     if not mp3_files:
         print("No MP3 files found in the directory.")
-        return
-    
-    print(f"Found {len(mp3_files)} MP3 files to convert.")
-    
-    # Convert each MP3 file to WAV
-    for mp3_file in mp3_files:
-        wav_file = output_dir / f"{mp3_file.stem}.wav"
-        print(f"Converting {mp3_file.name} to {wav_file.name}...")
-        
-        try:
-            # Use ffmpeg to convert the file
-            subprocess.run([
-                "ffmpeg",
-                "-i", str(mp3_file),
-                "-acodec", "pcm_s16le",  # Use 16-bit PCM encoding
-                "-ar", "44100",          # Set sample rate to 44.1kHz
-                "-ac", "1",              # Set to mono
-                str(wav_file)
-            ], check=True, capture_output=True)
-            print(f"Successfully converted {mp3_file.name}")
-        except subprocess.CalledProcessError as e:
-            print(f"Error converting {mp3_file.name}: {e.stderr.decode()}")
-        except Exception as e:
-            print(f"Unexpected error converting {mp3_file.name}: {str(e)}")
+        return summary
+
+    start = time.monotonic()
+    workers = workers or os.cpu_count() or 1
+    jobs = []
+    manifests = {}
+    for name in profiles:
+        output_dir = input_dir / PROFILES[name]["folder"]
+        output_dir.mkdir(exist_ok=True)
+        manifests[output_dir] = load_manifest(output_dir)
+        todo, skipped = plan(mp3_files, output_dir, manifests[output_dir], force)
+        summary["skipped"] += len(skipped)
+        jobs += [(mp3_file, output_dir, PROFILES[name]["sample_rate"]) for mp3_file in todo]
+    print(f"Found {len(mp3_files)} MP3 files: {len(jobs)} conversions for {', '.join(profiles)}, "
+          f"{summary['skipped']} up to date ({workers} workers)")
+
+    # Each worker just waits on its ffmpeg process, so threads are enough to keep every core busy
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="convert") as pool:
+        futures = [(job, pool.submit(transcode, job[0], job[1] / f"{job[0].stem}.wav", job[2])) for job in jobs]
+        for (mp3_file, output_dir, sample_rate), future in futures:
+            error = future.result()
+            if error is None:
+                summary["converted"] += 1
+                manifests[output_dir][mp3_file.name] = file_hash(mp3_file)
+                print(f"Converted {mp3_file.name} ({sample_rate} Hz)")
+            else:
+                summary["failed"] += 1
+                print(f"Error converting {mp3_file.name}: {error}")
+
+    for output_dir, manifest in manifests.items():
+        save_manifest(output_dir, manifest)
+    summary["seconds"] = time.monotonic() - start
+    summary["files_per_second"] = summary["converted"] / summary["seconds"] if summary["seconds"] else 0.0
+    print(f"Converted {summary['converted']}, skipped {summary['skipped']}, failed {summary['failed']} "
+          f"in {summary['seconds']:.2f}s ({summary['files_per_second']:.1f} files/s)")
+    return summary
+
+
+def convert_mp3_to_wav(input_dir):
+    """Convert every MP3 in input_dir to 44.1 kHz mono WAV in input_dir/wav"""
+    return convert_batch(input_dir, profiles=("device",))
 
 def play_audio(file_path, device="plughw:3,0"):
     """
@@ -63,22 +169,30 @@ def list_audio_devices():
     except Exception as e:
         print(f"Unexpected error listing audio devices: {str(e)}")
 
-if __name__ == "__main__":
-    # Get the directory of the script
-    script_dir = Path(__file__).parent
-    audio_dir = script_dir / "general_intelligence"
-    
+def main():
+    parser = argparse.ArgumentParser(description="Convert MP3 prompts to WAV for playback and STT")
+    parser.add_argument("input_dir", nargs="?", default=str(Path(__file__).parent / "general_intelligence"),
+                        help="Directory with the MP3 files (default: general_intelligence)")
+    parser.add_argument("--profiles", nargs="+", default=["device"], choices=list(PROFILES),
+                        help="Output profiles (default: device)")
+    parser.add_argument("--workers", type=int, help="ffmpeg processes at once (default: one per core)")
+    parser.add_argument("--force", action="store_true", help="Convert files that are already up to date")
+    parser.add_argument("--batch", action="store_true", help="Only convert: skip the device list and test playback")
+    args = parser.parse_args()
+
+    audio_dir = Path(args.input_dir)
     if not audio_dir.exists():
         print(f"Error: Directory {audio_dir} does not exist.")
-    else:
+        return 1
+    if not args.batch:
         # First, list available audio devices
         print("Available audio devices:")
         list_audio_devices()
-        
-        # Convert MP3s to WAV
-        convert_mp3_to_wav(audio_dir)
-        print("Conversion complete!")
-        
+
+    summary = convert_batch(audio_dir, args.profiles, workers=args.workers, force=args.force)
+    print("Conversion complete!")
+
+    if not args.batch:
         # Example of playing a converted file
         wav_dir = audio_dir / "wav"
         if wav_dir.exists():
@@ -87,4 +201,9 @@ if __name__ == "__main__":
             wav_files = list(wav_dir.glob("*.wav"))
             if wav_files:
                 print(f"Playing {wav_files[0].name}...")
-                play_audio(wav_files[0]) 
\ No newline at end of file
+                play_audio(wav_files[0])
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    exit(main())
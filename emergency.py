@@ -0,0 +1,192 @@
+"""
+Shared client for the emergency outcall endpoint.
+
+Keeps kept-alive HTTPS sessions that are connected at startup (and re-warmed while idle), so
+the nurse call never pays a cold TCP+TLS handshake. Each dispatch has strict connect/read
+timeouts and an idempotency key shared by every attempt. Latencies go into histograms.
+
+Every request that reaches the endpoint may place a nurse call, so by default a dispatch is only
+retried when no connection was made, and never hedged. The hedged second request and retries
+after 5xx or read errors are only duplicate-safe if the endpoint dedupes on Idempotency-Key;
+set OUTCALL_IDEMPOTENT=1 once it is confirmed that it does.
+"""
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+import tracing
+from tracing import LatencyHistogram
+
+OUTCALL_URL = os.getenv("OUTCALL_URL", "https://724cu8r3wk.execute-api.ca-central-1.amazonaws.com/Prod/outcall")
+
+
+def never_sent(error):
+    """True if a request failed before a connection to the server existed, so retrying it can't place a second call"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+class EmergencyClient:
+    def __init__(self, url=OUTCALL_URL, connect_timeout=2.0, read_timeout=5.0, hedge_delay=1.5,
+                 max_attempts=3, deadline=15.0, keepalive_interval=240.0, idempotent=None):
+        self.url = url
+        parts = urlsplit(url)
+        self.base_url = f"{parts.scheme}://{parts.netloc}/"
+        self.timeout = (connect_timeout, read_timeout)
+        self.hedge_delay = hedge_delay
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.keepalive_interval = keepalive_interval
+        # Whether the endpoint dedupes on Idempotency-Key; only then are hedges and resends safe
+        self.idempotent = idempotent if idempotent is not None else os.getenv("OUTCALL_IDEMPOTENT") == "1"
+        # Two independent sessions so a hedged request gets its own warm connection
+        self.sessions = [self._new_session(), self._new_session()]
+        self.pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="outcall")
+        self.histograms = {"attempt": LatencyHistogram(), "dispatch": LatencyHistogram(), "prewarm": LatencyHistogram()}
+        self.counters = {"dispatches": 0, "attempts": 0, "hedges": 0, "retries": 0, "failures": 0}
+        self.lock = threading.Lock()
+        self._keepalive = None
+
+    @staticmethod
+    def _new_session():
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0))
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0))
+        session.headers.update({'Content-Type': 'application/json'})
+        return session
+
+    def _count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+        tracing.count(f"outcall_{name}", n)
+
+    def prewarm(self):
+        """Open (or refresh) the pooled connections with a cheap request to the API host"""
+        for session in self.sessions:
+            start = time.monotonic()
+            try:
+                session.head(self.base_url, timeout=self.timeout)
+                self.histograms["prewarm"].observe((time.monotonic() - start) * 1000)
+            except requests.RequestException as e:
+                print(f"Outcall pre-warm failed: {e}")
+
+    def start_keepalive(self):
+        """Pre-connect now and re-warm in the background before idle connections are dropped"""
+        if self._keepalive is not None:
+            return
+
+        def loop():
+            while True:
+                self.prewarm()
+                time.sleep(self.keepalive_interval)
+
+        self._keepalive = threading.Thread(target=loop, name="outcall-keepalive", daemon=True)
+        self._keepalive.start()
+
+    def _send(self, session, payload, idempotency_key):
+        self._count("attempts")
+        start = time.monotonic()
+        try:
+            return session.post(self.url, json=payload, timeout=self.timeout,
+                                headers={'Idempotency-Key': idempotency_key})
+        finally:
+            end = time.monotonic()
+            self.histograms["attempt"].observe((end - start) * 1000)
+            tracing.record("outcall_attempt", start, end)
+
+    def dispatch(self, payload):
+        """
+        Send the outcall request.
+        Returns:
+            HTTP status code of the first non-5xx response (of any response unless idempotent),
+            or None if every attempt failed
+        """
+        self._count("dispatches")
+        idempotency_key = str(uuid.uuid4())
+        start = time.monotonic()
+        last_error = None
+        try:
+            for attempt in range(self.max_attempts):
+                if attempt:
+                    self._count("retries")
+                    time.sleep(min(2.0, 0.25 * 2 ** attempt) * (0.5 + random.random()))
+                remaining = self.deadline - (time.monotonic() - start)
+                if remaining <= 0:
+                    break
+
+                futures = {self.pool.submit(self._send, self.sessions[0], payload, idempotency_key)}
+                done, _ = wait(futures, timeout=min(self.hedge_delay, remaining))
+                if not done and self.idempotent:
+                    # Primary is slow: race a second request on the other warm connection
+                    self._count("hedges")
+                    futures.add(self.pool.submit(self._send, self.sessions[1], payload, idempotency_key))
+
+                resendable = True
+                while futures:
+                    remaining = self.deadline - (time.monotonic() - start)
+                    done, pending = wait(futures, timeout=max(0.0, remaining), return_when=FIRST_COMPLETED)
+                    if not done:
+                        break
+                    for future in done:
+                        try:
+                            response = future.result()
+                        except requests.RequestException as e:
+                            last_error = e
+                            resendable = resendable and (self.idempotent or never_sent(e))
+                            continue
+                        if response.status_code < 500 or not self.idempotent:
+                            # The server has the request; without dedupe another attempt could call twice
+                            return response.status_code
+                        last_error = f"HTTP {response.status_code}"
+                    futures = pending
+                if futures or not resendable:
+                    break  # still in flight at the deadline, or it may have reached the server
+
+            self._count("failures")
+            print(f"Emergency outcall failed: {last_error}")
+            return None
+        finally:
+            end = time.monotonic()
+            self.histograms["dispatch"].observe((end - start) * 1000)
+            tracing.record("outcall_dispatch", start, end)
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+        return {"counters": counters, **{name: h.snapshot() for name, h in self.histograms.items()}}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide outcall client"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = EmergencyClient()
+        return _client
+
+
+def call_for_help(emergency_phone_number, user_first_name="", user_last_name="", emergency_first_name="SRR"):
+    """Dispatch the nurse call; returns the HTTP status code (None if it could not be delivered)"""
+    data = {
+        "emergencyPhoneNumber": emergency_phone_number,
+        "emergencyFirstname": emergency_first_name,
+        "userFirstName": user_first_name,
+        "userLastName": user_last_name
+    }
+    status_code = get_client().dispatch(data)
+    print(f"Emergency request sent, response status code: {status_code}")
+    return status_code
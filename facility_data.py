@@ -0,0 +1,262 @@
+"""
+Memory-resident facility calendar and food menu.
+
+The calendar and menu JSON files are loaded once and reloaded only when their mtime
+changes. For each day the spoken schedule, menu and morning announcement are rendered
+ahead of time, and texts registered with presynthesize() are also rendered through the
+TTS cache and kept decoded in memory. A background thread re-prepares at midnight and
+whenever a file changes, so a request for today's schedule or menu is a dictionary lookup
+with no file I/O and no TTS call.
+"""
+import datetime
+import json
+import os
+import threading
+import time
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "general_intelligence")
+CALENDAR_PATH = os.getenv("FACILITY_CALENDAR_PATH", os.path.join(DATA_DIR, "may_2025_calendar.json"))
+MENU_PATH = os.getenv("FACILITY_MENU_PATH", os.path.join(DATA_DIR, "food.json"))
+
+# Voice the morning announcement is played in (morningSRR.py)
+ANNOUNCEMENT_VOICE = {"voice": "nova", "model": "tts-1", "sample_rate": 16000}
+
+
+def get_ordinal(n):
+    # Returns the ordinal string for a given integer n (e.g., 1 -> '1st')
+    if 10 <= n % 100 <= 20:
+        suffix = 'th'
+    else:
+        suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+    return f"{n}{suffix}"
+
+
+def spoken_date(date):
+    return f"{date.strftime('%B')} {get_ordinal(date.day)}, {date.year}"
+
+
+def render_schedule(date, calendar):
+    """The wake-word listener's answer to "what's on today?" """
+    key = date.strftime('%Y-%m-%d')
+    if key not in calendar:
+        return f"It's {spoken_date(date)}. There is no schedule found for today."
+    day_of_week = calendar[key].get('Day', '')
+    events = calendar[key].get('Events', [])
+    if not events:
+        return f"Today is {day_of_week}, {spoken_date(date)}. There are no scheduled events for today."
+
+    event_lines = []
+    for i, event in enumerate(events):
+        parts = []
+        if event.get('Time', '').strip():
+            parts.append(f"At {event['Time'].strip()}, ")
+        if event.get('Name', '').strip():
+            parts.append(f"you have {event['Name'].strip()}")
+        if event.get('Location', '').strip():
+            parts.append(f" in the {event['Location'].strip()}")
+        if parts:
+            line = "".join(parts)
+            event_lines.append(f"and {line}" if i == len(events) - 1 else line)
+    return f"Today is {day_of_week}, {spoken_date(date)}. Here's what's on your schedule: " + ", ".join(event_lines) + "."
+
+
+def render_menu(date, food):
+    """The wake-word listener's answer to "what's for lunch?" """
+    menu = food['days'].get(date.strftime('%Y-%m-%d'))
+    if menu is None:
+        return "I'm sorry, I couldn't find today's menu in the system."
+
+    parts = ["Here's what's on the menu for today: "]
+    if 'soup' in menu:
+        parts.append(f"\nFor soup, we're serving {menu['soup']}.")
+    for meal in ('lunch', 'dinner'):
+        if meal not in menu:
+            continue
+        parts.append(f"\nFor {meal}, ")
+        items = []
+        if 'main_1' in menu[meal]:
+            items.append(menu[meal]['main_1'])
+        if 'main_2' in menu[meal]:
+            items.append(f"or you can have {menu[meal]['main_2']}")
+        parts.append(" ".join(items))
+        if 'sides' in menu[meal] and meal == 'dinner':
+            parts.append(f"\nThe sides include {menu[meal]['sides']}")
+        if 'note' in menu[meal]:
+            parts.append(f"\nNote: {menu[meal]['note']}")
+        if f'dessert_{meal}' in menu:
+            parts.append(f"\nFor dessert, we have {menu[f'dessert_{meal}']}")
+    return "".join(parts)
+
+
+def render_morning(date, calendar, food):
+    """The morning PA announcement: schedule followed by the day's menu"""
+    greeting = f"Good morning residents, hope you all slept well. It is {spoken_date(date)}."
+    key = date.strftime('%Y-%m-%d')
+    parts = []
+    if key not in calendar:
+        parts.append(f"{greeting} There is no schedule found for today.")
+    elif not calendar[key].get('Events', []):
+        parts.append(f"{greeting} There are no scheduled events today.")
+    else:
+        event_lines = []
+        for event in calendar[key]['Events']:
+            line = []
+            if event.get('Time', '').strip():
+                line.append(f"At {event['Time'].strip()} ")
+            if event.get('Name', '').strip():
+                line.append(f"there is {event['Name'].strip()}")
+            if event.get('Location', '').strip():
+                line.append(f" in the {event['Location'].strip()}")
+            if line:
+                event_lines.append("".join(line))
+        parts.append(f"{greeting} Here is your schedule: " + ". ".join(event_lines))
+
+    menu = food['days'].get(key)
+    if menu is None:
+        parts.append("\n\nI'm sorry, I couldn't find today's menu in the system.")
+        return "".join(parts)
+    parts.append("\n\nHere's today's menu: ")
+    if 'soup' in menu:
+        parts.append(f"\nFor soup, we have {menu['soup']}.")
+    for meal in ('lunch', 'dinner'):
+        if meal not in menu:
+            continue
+        parts.append(f"\nFor {meal}:")
+        if 'main_1' in menu[meal]:
+            parts.append(f"\n- {menu[meal]['main_1']}")
+        if 'main_2' in menu[meal]:
+            parts.append(f"\n- Alternatively, if you want something else, we have {menu[meal]['main_2']}")
+        if 'sides' in menu[meal] and meal == 'dinner':
+            parts.append(f"\nSides: {menu[meal]['sides']}")
+        if 'note' in menu[meal]:
+            parts.append(f"\nNote: {menu[meal]['note']}")
+        if f'dessert_{meal}' in menu:
+            parts.append(f"\nDessert: {menu[f'dessert_{meal}']}")
+    return "".join(parts)
+
+
+class FacilityData:
+    def __init__(self, calendar_path=CALENDAR_PATH, menu_path=MENU_PATH, check_interval=60.0):
+        self.paths = {"calendar": calendar_path, "food": menu_path}
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.reload_lock = threading.Lock()
+        self.data = {}    # name -> (mtime, parsed JSON)
+        self.days = {}    # date -> {kind: text}
+        self.audio = {}   # (date, kind) -> (int16 samples, sample rate)
+        self.speech = {}  # kind -> tts_cache.get() keyword arguments
+        self._thread = None
+
+    def _reload(self):
+        """Re-read any file whose mtime changed; returns True if something was reloaded"""
+        changed = False
+        with self.reload_lock:
+            for name, path in self.paths.items():
+                mtime = os.path.getmtime(path)
+                if self.data.get(name, (None,))[0] == mtime:
+                    continue
+                with open(path, 'r') as f:
+                    parsed = json.load(f)
+                # Hand-edited files sometimes carry stray whitespace in the date keys
+                if name == "calendar":
+                    parsed = {key.strip(): day for key, day in parsed.items()}
+                else:
+                    parsed["days"] = {key.strip(): day for key, day in parsed.get("days", {}).items()}
+                self.data[name] = (mtime, parsed)
+                changed = True
+        if changed:
+            with self.lock:
+                self.days.clear()
+                self.audio.clear()
+        return changed
+
+    def presynthesize(self, kind, **voice):
+        """Keep the day's text of this kind synthesized in memory with the given TTS cache voice"""
+        self.speech[kind] = voice
+
+    def render(self, date=None):
+        """Render every kind's text for a day and keep it in memory; drops older days"""
+        date = date or datetime.date.today()
+        self._reload()
+        calendar, food = self.data["calendar"][1], self.data["food"][1]
+        texts = {
+            "schedule": render_schedule(date, calendar),
+            "menu": render_menu(date, food),
+            "morning": render_morning(date, calendar, food),
+        }
+        with self.lock:
+            self.days = {d: t for d, t in self.days.items() if d >= date}
+            self.audio = {k: a for k, a in self.audio.items() if k[0] >= date}
+            self.days[date] = texts
+        return texts
+
+    def prepare(self, date=None):
+        """Render and pre-synthesize every kind for a day; the TTS round-trips belong on the start() thread"""
+        date = date or datetime.date.today()
+        texts = self.render(date)
+        for kind, voice in self.speech.items():
+            try:
+                from audio_utils import read_wav
+                from tts_cache import get_cache
+
+                samples = read_wav(get_cache().get(texts[kind], **voice))
+                with self.lock:
+                    self.audio[(date, kind)] = samples
+            except Exception as e:
+                print(f"Could not pre-synthesize today's {kind}: {e}")
+        return texts
+
+    def text(self, kind, date=None):
+        """Rendered text for a day, from memory when it has been prepared; a miss renders without synthesizing"""
+        date = date or datetime.date.today()
+        with self.lock:
+            texts = self.days.get(date)
+        if texts is None:
+            try:
+                texts = self.render(date)
+            except Exception as e:
+                if kind == "schedule":
+                    return f"I'm sorry, I couldn't retrieve today's schedule: {str(e)}"
+                if kind == "menu":
+                    return f"I'm sorry, I couldn't retrieve today's menu: {str(e)}"
+                return f"Good morning residents, hope you all slept well. I'm sorry, I couldn't retrieve today's information: {str(e)}"
+        return texts[kind]
+
+    def audio_for(self, kind, date=None):
+        """(samples, sample_rate) pre-synthesized for a day, or None if not ready"""
+        with self.lock:
+            return self.audio.get((date or datetime.date.today(), kind))
+
+    def start(self):
+        """Prepare today now, then again after every midnight and whenever a file changes"""
+        if self._thread is not None:
+            return
+
+        def loop():
+            prepared = None
+            while True:
+                today = datetime.date.today()
+                try:
+                    if self._reload() or prepared != today:
+                        self.prepare(today)
+                        prepared = today
+                except Exception as e:
+                    print(f"Facility data refresh failed: {e}")
+                midnight = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time())
+                time.sleep(max(1.0, min(self.check_interval, (midnight - datetime.datetime.now()).total_seconds() + 1)))
+
+        self._thread = threading.Thread(target=loop, name="facility-data", daemon=True)
+        self._thread.start()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide facility data store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FacilityData()
+        return _store
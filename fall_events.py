@@ -0,0 +1,83 @@
+"""
+Bounded work queue that runs fall check-ins off the MQTT network thread.
+
+submit() never blocks. Each event gets one of these outcomes:
+    queued     -- a check-in will run for it on the worker thread
+    coalesced  -- a check-in for the same device is already waiting or running and covers it
+    debounced  -- it arrived within the debounce period of the last accepted event for the device
+    dropped    -- the queue is full
+"""
+import queue
+import statistics
+import threading
+import time
+
+
+class FallEventQueue:
+    def __init__(self, handler, maxsize=8, debounce_seconds=30.0, workers=1):
+        self.handler = handler
+        self.debounce_seconds = debounce_seconds
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.lock = threading.Lock()
+        self.active = set()        # device keys with a check-in waiting or running
+        self.last_accepted = {}    # device key -> monotonic time of last accepted event
+        self.counts = {"queued": 0, "coalesced": 0, "debounced": 0, "dropped": 0, "handled": 0, "failed": 0}
+        self.queue_times = []
+        self.workers = [
+            threading.Thread(target=self._run, name=f"fall-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, event=None, key="me"):
+        """Offer a fall event for a device; returns the outcome without waiting for the check-in"""
+        now = time.monotonic()
+        with self.lock:
+            if key in self.active:
+                outcome = "coalesced"
+            elif now - self.last_accepted.get(key, float("-inf")) < self.debounce_seconds:
+                outcome = "debounced"
+            else:
+                try:
+                    self.queue.put_nowait((key, event, now))
+                    self.active.add(key)
+                    self.last_accepted[key] = now
+                    outcome = "queued"
+                except queue.Full:
+                    outcome = "dropped"
+            self.counts[outcome] += 1
+        return outcome
+
+    def _run(self):
+        while True:
+            key, event, enqueued_at = self.queue.get()
+            waited = time.monotonic() - enqueued_at
+            with self.lock:
+                self.queue_times.append(waited)
+                del self.queue_times[:-1000]
+            print(f"Starting check-in for {key} after {waited * 1000:.0f} ms in queue")
+            # Set up front so the finally block still has an outcome if a BaseException escapes the handler
+            outcome = "failed"
+            try:
+                self.handler(key, event)
+                outcome = "handled"
+            except Exception as e:
+                print(f"Error handling fall event for {key}: {e}")
+            finally:
+                with self.lock:
+                    self.active.discard(key)
+                    self.counts[outcome] += 1
+                self.queue.task_done()
+
+    def metrics(self):
+        """Queue depth, time-in-queue and outcome counters"""
+        with self.lock:
+            times = list(self.queue_times)
+            metrics = {f"fall_events_{name}": count for name, count in self.counts.items()}
+            metrics["fall_queue_depth"] = self.queue.qsize()
+            metrics["fall_checkins_active"] = len(self.active)
+        metrics["fall_queue_time_last_ms"] = round(times[-1] * 1000, 1) if times else 0.0
+        metrics["fall_queue_time_mean_ms"] = round(statistics.mean(times) * 1000, 1) if times else 0.0
+        metrics["fall_queue_time_max_ms"] = round(max(times) * 1000, 1) if times else 0.0
+        return metrics
@@ -1,119 +1,107 @@
 import speech_recognition as sr
-from openai import OpenAI
 import os
-import requests
+import sys
 from dotenv import load_dotenv
-import subprocess
-import threading
+
+# Shared modules live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from runtime import StageTimeout, get_async_openai, get_runtime, speak, stage
+import asyncio
+import emergency
+import numpy as np
+import tracing
+from stt_backends import get_stt
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# Initialize OpenAI client (async, shared with the runtime loop)
+client = get_async_openai()
 
 EMERGENCYNUMBER = os.getenv('EMERGENCYNUMBER')  # Set your emergency number here or in .env
 
-def play_audio_file(output_file):
-    def play_audio():
-        if os.name == 'posix':
-            # Use aplay with specific device output for Orange Pi
-            subprocess.run(["aplay", "-D", "plughw:3,0", output_file])
-        else:
-            os.system(f"start {output_file}")
-    
-    threading.Thread(target=play_audio).start()
-
-def speak_response(response):
-    """Convert text response to speech using OpenAI TTS and play it back"""
-    speech_response = client.audio.speech.create(
-        model="tts-1",
-        voice="nova",
-        input=response
-    )
-    speech_response.stream_to_file("response.wav")
-    play_audio_file("response.wav")
+async def speak_response(response):
+    """Stream the response through OpenAI TTS into the playback engine and wait for it to finish"""
+    try:
+        await stage("tts", speak(response, voice="nova", model="tts-1", client=client))
+    except Exception as e:
+        print(f"Error in text-to-speech: {e}")
 
-def call_for_help():
-    url = "https://724cu8r3wk.execute-api.ca-central-1.amazonaws.com/Prod/outcall"
-    headers = {'Content-Type': 'application/json'}
-    data = {
-        "emergencyPhoneNumber": EMERGENCYNUMBER,
-        "emergencyFirstname": "SRR",
-        "userFirstName": "",
-        "userLastName": ""
-    }
-    response = requests.post(url, json=data, headers=headers)
-    print(f"Emergency request sent, response status code: {response.status_code}")
+async def call_for_help():
+    try:
+        await stage("outcall", asyncio.to_thread(emergency.call_for_help, EMERGENCYNUMBER))
+    except StageTimeout:
+        pass
     # Play a TTS message for reassurance
-    reassurance = "Ok, don't worry, the nurse is coming to help you. Please remain calm."
-    speech_response = client.audio.speech.create(
-        model="tts-1",
-        voice="nova",
-        input=reassurance
-    )
-    speech_response.stream_to_file("emergency.wav")
-    play_audio_file("emergency.wav")
+    await speak_response("Ok, don't worry, the nurse is coming to help you. Please remain calm.")
 
 def listen_to_speech():
-    """Listen to user's speech and convert to text"""
+    """Listen to user's speech until they pause; returns the recorded AudioData"""
     recognizer = sr.Recognizer()
     
     with sr.Microphone() as source:
         print("Listening...")
         recognizer.adjust_for_ambient_noise(source)
-        audio = recognizer.listen(source)
-        
-    try:
-        text = recognizer.recognize_google(audio)
-        print(f"You said: {text}")
-        return text
-    except sr.UnknownValueError:
+        return recognizer.listen(source)
+
+async def speech_to_text(audio):
+    """Transcribe with Google, hedged by the local engine; None if nothing was understood"""
+    samples = np.frombuffer(audio.get_raw_data(convert_width=2), dtype=np.int16)
+    transcript = await stage("transcribe", get_stt("google").transcribe(samples, audio.sample_rate))
+    if not transcript.text:
         print("Could not understand audio")
         return None
-    except sr.RequestError as e:
-        print(f"Could not request results; {e}")
-        return None
+    print(f"You said: {transcript.text} ({transcript.engine})")
+    return transcript.text
 
-def analyze_with_openai(text):
+async def analyze_with_openai(text):
     """Analyze text using OpenAI to determine if help is needed"""
     try:
-        response = client.chat.completions.create(
+        response = await stage("classify", client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": "You are an AI that analyzes if someone needs help based on their speech. Respond with 'HELP_NEEDED' if they need help, or 'NO_HELP_NEEDED' if they don't."},
                 {"role": "user", "content": text}
             ]
-        )
+        ))
         return response.choices[0].message.content.strip()
     except Exception as e:
         print(f"Error analyzing with OpenAI: {e}")
         return None
 
-def main():
+async def help_detection():
     print("Starting help detection system...")
-    speak_response("Please speak clearly into the microphone.")
+    emergency.get_client().start_keepalive()
+    tracing.start()
+    await speak_response("Please speak clearly into the microphone.")
     
     while True:
-        # Listen for speech
-        text = listen_to_speech()
+        # Listen for speech (speech_recognition blocks, so it runs off the event loop)
+        try:
+            audio = await stage("listen", asyncio.to_thread(listen_to_speech))
+            text = await speech_to_text(audio)
+        except StageTimeout:
+            continue
         if not text:
             continue
             
         # Analyze if help is needed
-        analysis = analyze_with_openai(text)
+        analysis = await analyze_with_openai(text)
         
         if analysis == "HELP_NEEDED":
             response = "I detect that you might need help. Calling for assistance now."
             print(response)
-            speak_response(response)
-            call_for_help()
+            # Say it while the outcall is already on its way
+            await asyncio.gather(speak_response(response), call_for_help())
         elif analysis == "NO_HELP_NEEDED":
             response = "I don't detect any immediate need for help. Let me know if you need anything!"
             print(response)
-            speak_response(response)
+            await speak_response(response)
         else:
             print("Could not determine if help is needed.")
 
+def main():
+    get_runtime().run(help_detection())
+
 if __name__ == "__main__":
     main()
@@ -12,11 +12,36 @@ import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 import threading
 import queue
+import asyncio
+
+# Shared modules live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tts_stream import PCM_SAMPLE_RATE, speak_text_stream
+from tts_cache import get_cache
+from playback import get_engine
+from runtime import (StageTimeout, capture_until_silence, get_async_openai, get_runtime, play, speak_interruptible,
+                     stage, transcribe)
+from runtime import speak as speak_stream
+from audio_utils import write_wav
+from wakeword import WakeWordEngine, create_detector
+from wake_match import WakeWordMatcher
+from run_logger import close_run_logger, create_run_folder, get_run_logger
+from run_archive import start_archiver
+from facility_data import ANNOUNCEMENT_VOICE, get_store
+from assistant_router import AssistantRouter
+import tracing
 
 # Load environment variables from .env file
 load_dotenv()
 
-is_speaking = False
+WAKE_MATCHER = WakeWordMatcher(words=("woolly",), prefixes=("hey",))
+
+# "single": local router, else one tool-calling request that also streams the answer;
+# "legacy": gpt-4 classification followed by a separate answer request
+ROUTING_MODE = os.getenv("ASSISTANT_ROUTING", "single")
+
+# Let the resident cut off a long reply by talking over it
+BARGE_IN = os.getenv("BARGE_IN", "0") == "1"
 
 def initialize_openai():
     """Initialize OpenAI client with API key"""
@@ -35,6 +60,10 @@ except Exception as e:
     print(f"Error initializing OpenAI client: {e}")
     sys.exit(1)
 
+router = AssistantRouter(client)
+# Coroutines on the shared runtime loop use the async client
+async_client = get_async_openai()
+
 def check_flac_installation():
     """Check if FLAC is installed and provide installation instructions if not"""
     try:
@@ -45,77 +74,38 @@ def check_flac_installation():
         print("brew install flac")
         return False
 
-def play_audio_file(output_file):
-    """Play audio file synchronously (waits until done)."""
-    if os.name == 'posix':
-        # Use aplay with specific device output for Orange Pi
-        subprocess.run(["aplay", "-D", "plughw:3,0", output_file])
-    else:
-        os.system(f"start {output_file}")
+async def play_audio_file(output_file):
+    """Play audio file and wait until done"""
+    await stage("play", play(output_file))
 
-def speak(text):
-    """Convert text to speech using OpenAI's TTS with Onyx voice, synchronously."""
+async def speak(text, cache=False):
+    """
+    Convert text to speech using OpenAI's TTS with Onyx voice, streaming playback as audio arrives.
+    Fixed phrases (cache=True) are kept in the shared TTS cache and replayed without a network call.
+    With BARGE_IN=1, talking over the reply stops it (best with a headset or an echo-cancelling mic).
+    """
     try:
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice="onyx",
-            input=text
-        )
-        # Save as MP3 first (required by OpenAI)
-        temp_mp3 = "temp_speech.mp3"
-        temp_wav = "temp_speech.wav"
-        
-        with open(temp_mp3, 'wb') as f:
-            for chunk in response.iter_bytes():
-                f.write(chunk)
-        
-        # Convert MP3 to WAV using ffmpeg
-        subprocess.run(['ffmpeg', '-i', temp_mp3, '-y', temp_wav], 
-                      stdout=subprocess.DEVNULL, 
-                      stderr=subprocess.DEVNULL)
-        
-        # Play the WAV file using the specific device
-        if os.name == 'posix':
-            # Use aplay with specific device output for Orange Pi
-            subprocess.run(["aplay", "-D", "plughw:3,0", temp_wav])
+        tts_cache = get_cache()
+        clip = tts_cache.lookup(text, voice="onyx", model="tts-1", sample_rate=PCM_SAMPLE_RATE) if cache else None
+        tee = [] if cache and not clip else None
+        speech = play(clip) if clip else speak_stream(text, voice="onyx", model="tts-1", client=async_client, tee=tee)
+        if BARGE_IN:
+            finished = await stage("tts", speak_interruptible(speech))
         else:
-            os.system(f"start {temp_wav}")
-        
-        # Clean up temporary files
-        try:
-            os.remove(temp_mp3)
-            os.remove(temp_wav)
-        except:
-            pass
-            
+            await stage("tts", speech)
+            finished = True
+        if tee and finished:
+            tts_cache.store(text, "onyx", "tts-1", PCM_SAMPLE_RATE, 1.0, b"".join(tee))
     except Exception as e:
         print(f"Error in text-to-speech: {e}")
 
-def record_audio(duration=2, fs=44100):
-    """Record audio from microphone"""
-    print("Recording...")
-    
-    # Use arecord with specific device for Orange Pi
-    temp_file = "temp_recording.wav"
-    subprocess.run([
-        "arecord",
-        "-D", "plughw:3,0",
-        "-f", "cd",
-        "-d", str(duration),
-        temp_file
-    ])
-    
-    return temp_file
-
-def transcribe_audio(audio_path):
+async def transcribe_audio(audio_path):
     """Transcribe audio using OpenAI's Whisper"""
     try:
-        with open(audio_path, "rb") as f:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=f
-            )
-        return transcript.text
+        text, stats = await stage("transcribe", transcribe(audio_path, client=async_client))
+        print(f"Uploaded {stats['bytes']} bytes ({stats['profile']}, was {stats['original_bytes']}), "
+              f"transcribed in {stats['request_ms']:.0f} ms")
+        return text
     except Exception as e:
         print(f"Error transcribing audio: {e}")
         return None
@@ -126,16 +116,21 @@ def transcribe_audio(audio_path):
         except:
             pass
 
-def listen_for_response():
+async def listen_for_response():
     """Listen for user's response and convert to text"""
-    global is_speaking
-    while is_speaking:
-        time.sleep(0.1)  # Wait until not speaking
-    audio_path = record_audio(duration=5)
-    if not audio_path:
+    # speak() only returns once its audio has finished, so the microphone never hears the reply
+    try:
+        result = await stage("record", capture_until_silence("temp_recording.wav", max_duration=5))
+    except StageTimeout:
+        return None
+    print(f"Recorded {result['captured_seconds']:.2f}s ({result['stop_reason']}), "
+          f"saved {result['saved_seconds']:.2f}s")
+    if not result["speech_detected"]:
+        # Nothing was said, so there is nothing worth sending to Whisper
+        os.remove(result["path"])
         return None
     try:
-        text = transcribe_audio(audio_path)
+        text = await transcribe_audio(result["path"])
         print(f"[Heard]: {text}")
         return text
     except Exception as e:
@@ -217,108 +212,21 @@ def get_time_date():
     now = datetime.datetime.now()
     return f"The current time is {now.strftime('%I:%M %p')} and the date is {now.strftime('%B %d, %Y')}"
 
-def get_ordinal(n):
-    # Returns the ordinal string for a given integer n (e.g., 1 -> '1st')
-    if 10 <= n % 100 <= 20:
-        suffix = 'th'
-    else:
-        suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
-    return f"{n}{suffix}"
-
 def get_todays_schedule():
-    today_dt = datetime.datetime.now()
-    today = today_dt.strftime('%Y-%m-%d')
-    month = today_dt.strftime('%B')
-    day = get_ordinal(today_dt.day)
-    year = today_dt.year
-    try:
-        with open('general_intelligence/may_2025_calendar.json', 'r') as f:
-            calendar = json.load(f)
-        if today in calendar:
-            day_info = calendar[today]
-            day_of_week = day_info.get('Day', '')
-            events = day_info.get('Events', [])
-            if not events:
-                return f"Today is {day_of_week}, {month} {day}, {year}. There are no scheduled events for today."
-            
-            response = f"Today is {day_of_week}, {month} {day}, {year}. Here's what's on your schedule: "
-            event_lines = []
-            for i, event in enumerate(events):
-                time = event.get('Time', '').strip()
-                name = event.get('Name', '').strip()
-                location = event.get('Location', '').strip()
-                
-                line = ""
-                if time:
-                    line += f"At {time}, "
-                if name:
-                    line += f"you have {name}"
-                if location:
-                    line += f" in the {location}"
-                if line:
-                    if i == len(events) - 1:
-                        line = f"and {line}"
-                    event_lines.append(line)
-            
-            response += ", ".join(event_lines) + "."
-            return response
-        else:
-            return f"It's {month} {day}, {year}. There is no schedule found for today."
-    except Exception as e:
-        return f"I'm sorry, I couldn't retrieve today's schedule: {str(e)}"
+    return get_store().text("schedule")
 
 def get_todays_menu():
-    """Get today's food menu from the food.json file"""
-    today_dt = datetime.datetime.now()
-    today = today_dt.strftime('%Y-%m-%d')
-    try:
-        with open('general_intelligence/food.json', 'r') as f:
-            food_data = json.load(f)
-        if today in food_data['days']:
-            menu = food_data['days'][today]
-            response = "Here's what's on the menu for today: "
-            
-            # Add soup
-            if 'soup' in menu:
-                response += f"\nFor soup, we're serving {menu['soup']}."
-            
-            # Add lunch
-            if 'lunch' in menu:
-                response += "\nFor lunch, "
-                lunch_items = []
-                if 'main_1' in menu['lunch']:
-                    lunch_items.append(menu['lunch']['main_1'])
-                if 'main_2' in menu['lunch']:
-                    lunch_items.append(f"or you can have {menu['lunch']['main_2']}")
-                if lunch_items:
-                    response += " ".join(lunch_items)
-                if 'note' in menu['lunch']:
-                    response += f"\nNote: {menu['lunch']['note']}"
-                if 'dessert_lunch' in menu:
-                    response += f"\nFor dessert, we have {menu['dessert_lunch']}"
-            
-            # Add dinner
-            if 'dinner' in menu:
-                response += "\nFor dinner, "
-                dinner_items = []
-                if 'main_1' in menu['dinner']:
-                    dinner_items.append(menu['dinner']['main_1'])
-                if 'main_2' in menu['dinner']:
-                    dinner_items.append(f"or you can have {menu['dinner']['main_2']}")
-                if dinner_items:
-                    response += " ".join(dinner_items)
-                if 'sides' in menu['dinner']:
-                    response += f"\nThe sides include {menu['dinner']['sides']}"
-                if 'note' in menu['dinner']:
-                    response += f"\nNote: {menu['dinner']['note']}"
-                if 'dessert_dinner' in menu:
-                    response += f"\nFor dessert, we have {menu['dessert_dinner']}"
-            
-            return response
-        else:
-            return "I'm sorry, I couldn't find today's menu in the system."
-    except Exception as e:
-        return f"I'm sorry, I couldn't retrieve today's menu: {str(e)}"
+    """Get today's food menu, rendered ahead of time by the facility data store"""
+    return get_store().text("menu")
+
+async def speak_facility(kind):
+    """Speak today's schedule or menu, from pre-synthesized audio when the store has it ready"""
+    audio = get_store().audio_for(kind)
+    if audio is None:
+        await speak(get_store().text(kind))
+        return
+    samples, rate = audio
+    await stage("play", play(samples, rate))
 
 def interpret_intent(text):
     # Call the original GPT-based intent function here
@@ -352,126 +260,187 @@ def interpret_intent(text):
         print(f"Error interpreting intent: {e}")
         return {"intent": "other", "details": ""}
 
-def handle_conversation():
+async def handle_conversation(run_log):
     while True:
-        response = listen_for_response()
+        response = await listen_for_response()
         while response:
-            intent = interpret_intent(response)
+            turn_start = time.monotonic()
+            run_log.log(f"Heard: {response}")
+            intent, answer = await route_request(response, run_log)
             if intent["intent"] == "today_schedule":
-                schedule_info = get_todays_schedule()
-                speak(schedule_info)
+                await speak_facility("schedule")
             elif intent["intent"] == "weather":
-                weather_info = get_weather()
-                speak(weather_info)
+                weather_info = await asyncio.to_thread(get_weather)
+                await speak(weather_info)
             elif intent["intent"] == "play_music":
                 if intent["details"]:
-                    result = play_spotify_song(intent["details"])
-                    speak(result)
+                    result = await asyncio.to_thread(play_spotify_song, intent["details"])
+                    await speak(result)
                 else:
-                    speak("What song would you like me to play?")
-                    song_response = listen_for_response()
+                    await speak("What song would you like me to play?", cache=True)
+                    song_response = await listen_for_response()
                     if song_response:
-                        result = play_spotify_song(song_response)
-                        speak(result)
+                        result = await asyncio.to_thread(play_spotify_song, song_response)
+                        await speak(result)
             elif intent["intent"] == "time_date":
                 time_date_info = get_time_date()
-                speak(time_date_info)
+                await speak(time_date_info)
             elif intent["intent"] == "food_menu":
-                menu_info = get_todays_menu()
-                speak(menu_info)
-            elif intent["intent"] == "outfit_advice":
-                # Use GPT to generate an outfit suggestion based on the details (which may include temperature)
-                try:
-                    gpt_response = client.chat.completions.create(
-                        model="gpt-3.5-turbo",
-                        messages=[{"role": "user", "content": response}],
-                        temperature=0.7
-                    )
-                    speak(gpt_response.choices[0].message.content)
-                except Exception as e:
-                    speak("I'm sorry, I couldn't process that request.")
-            else:
-                try:
-                    gpt_response = client.chat.completions.create(
-                        model="gpt-3.5-turbo",
-                        messages=[{"role": "user", "content": response}],
-                        temperature=0.7
-                    )
-                    speak(gpt_response.choices[0].message.content)
-                except Exception as e:
-                    speak("I'm sorry, I couldn't process that request.")
+                await speak_facility("menu")
+            elif answer is None:
+                # Outfit advice (the details may include temperature) and everything else:
+                # speak the answer sentence by sentence while GPT is still writing it
+                answer = await asyncio.to_thread(speak_chat_answer, response)
+            if answer:
+                run_log.log(f"Response: {answer}")
+            log_turn(run_log, turn_start)
             # After handling, ask if anything else
-            speak("Is there anything else I can help you with?")
-            final_response = listen_for_response()
+            await speak("Is there anything else I can help you with?", cache=True)
+            final_response = await listen_for_response()
             if final_response and any(word in final_response.lower() for word in ["no", "nope", "that's all", "that's it", "nothing else"]):
-                speak("Goodbye!")
+                run_log.log(f"Heard: {final_response}")
+                await speak("Goodbye!", cache=True)
+                if ROUTING_MODE != "legacy":
+                    run_log.log("Routing totals", **router.stats())
                 return
             else:
                 response = final_response
 
+async def route_request(text, run_log):
+    """
+    Decide what to do with a request.
+    Returns:
+        (intent dict with "intent" and "details", answer text already spoken, "" if an error cut
+        a spoken answer short, or None if nothing was spoken)
+    """
+    if ROUTING_MODE == "legacy":
+        intent = await asyncio.to_thread(interpret_intent, text)
+        run_log.log(f"Detected intent: {intent['intent']}", details=intent.get("details"))
+        return intent, None
+
+    loop = asyncio.get_running_loop()
+    answering = asyncio.Event()
+    started, abandoned = threading.Event(), threading.Event()
+
+    def speak_deltas(deltas):
+        def marked():
+            for delta in deltas:
+                if not started.is_set():
+                    started.set()
+                    loop.call_soon_threadsafe(answering.set)
+                if abandoned.is_set():
+                    return  # routing overran its deadline and the turn has moved on; stay quiet
+                yield delta
+        return speak_text_stream(client, marked(), voice="onyx", model="tts-1")
+
+    # The router's streamed request and the sentence TTS worker are blocking, so they run off the loop
+    routing = asyncio.ensure_future(asyncio.to_thread(router.route, text, speak_deltas=speak_deltas))
+    waiter = asyncio.ensure_future(answering.wait())
+    try:
+        # Only the decision is time-boxed: it ends with a tool call or the first words of an answer
+        await stage("route", asyncio.wait({routing, waiter}, return_when=asyncio.FIRST_COMPLETED))
+        turn = await routing
+    except Exception as e:
+        abandoned.set()
+        print(f"Error routing request: {e}")
+        # Part of an answer may already have been spoken; answering again would talk over it
+        return {"intent": "other", "details": ""}, "" if started.is_set() else None
+    finally:
+        waiter.cancel()
+    print(f"Routed to {turn['intent']} via {turn['source']} in {turn['latency_ms']:.0f} ms "
+          f"({turn['prompt_tokens']}+{turn['completion_tokens']} tokens)")
+    run_log.log(f"Detected intent: {turn['intent']}", details=turn["args"].get("song", ""), route=turn["source"],
+                llm_calls=turn["llm_calls"], prompt_tokens=turn["prompt_tokens"],
+                completion_tokens=turn["completion_tokens"], stage="route", duration_ms=round(turn["latency_ms"], 1))
+    return {"intent": turn["intent"], "details": turn["args"].get("song", "")}, turn["answer"]
+
+def speak_chat_answer(text):
+    """Stream a gpt-3.5-turbo answer into sentence-level TTS; returns the full answer (None on error)"""
+    try:
+        stream = client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[{"role": "user", "content": text}],
+            temperature=0.7,
+            stream=True
+        )
+        deltas = (chunk.choices[0].delta.content or "" for chunk in stream if chunk.choices)
+        result = speak_text_stream(client, deltas, voice="onyx", model="tts-1")
+        print(f"Spoke {result['sentences']} sentences")
+        return result["text"]
+    except Exception as e:
+        print(f"Error generating response: {e}")
+        get_runtime().submit(speak("I'm sorry, I couldn't process that request.", cache=True)).result()
+        return None
+
+def log_turn(run_log, turn_start):
+    """Log time from the user's request being understood to the first word of the reply"""
+    first_audio = get_engine().first_audio_since(turn_start)
+    if first_audio is None:
+        return
+    ttfw_ms = (first_audio - turn_start) * 1000
+    print(f"Time to first word: {ttfw_ms:.0f} ms")
+    run_log.log(f"Time to first word: {ttfw_ms:.0f} ms", stage="time_to_first_word", duration_ms=round(ttfw_ms, 1))
+
 def detect_wake_word(text):
-    """Return True if the wake word is detected in the text."""
-    if not text:
-        return False
-    
-    # Normalize the text by removing punctuation and converting to lowercase
-    text = text.lower().replace('.', '').replace(',', '').replace('!', '').replace('?', '')
-    
-    # List of possible wake word variations
-    wake_words = [
-        "woolly", "hey woolly",
-        "wolly", "hey wolly",
-        "wooly", "hey wooly",
-        "willy", "hey willy",
-        "willie", "hey willie",
-        "wally", "hey wally",
-        "olly", "hey olly",
-        "wollie", "hey wollie",
-        "wolli", "hey wolli",
-        "woli", "hey woli",
-        "woll", "hey woll"
-    ]
-    
-    # Check for exact matches
-    if any(wake_word in text for wake_word in wake_words):
+    """Return True if the wake word (or something that sounds like it) is in the text."""
+    return WAKE_MATCHER.matches(text)
+
+async def confirm_wake_word(engine, audio):
+    """Confirm a local hit with Whisper when the detector can't identify the word itself"""
+    if not engine.detector.needs_verification:
         return True
+    audio_path = "temp_wake_word.wav"
+    write_wav(audio_path, audio, engine.detector.sample_rate)
+    heard = await transcribe_audio(audio_path)
+    print(f"[Heard]: {heard}")
+    return detect_wake_word(heard)
+
+async def listen():
+    print("Initializing wake word listener...")
+    engine = WakeWordEngine(create_detector())
+    get_engine()  # open the speaker now, so a wrong AUDIO_OUTPUT_DEVICE fails at startup
+    start_archiver()
+    tracing.add_collector(lambda: {f"router_{name}": value for name, value in router.stats().items()})
+    tracing.start()
+    # Render today's schedule and menu (and their audio) now and again every midnight
+    store = get_store()
+    store.presynthesize("schedule", voice="onyx", model="tts-1", sample_rate=PCM_SAMPLE_RATE)
+    store.presynthesize("menu", voice="onyx", model="tts-1", sample_rate=PCM_SAMPLE_RATE)
+    store.presynthesize("morning", **ANNOUNCEMENT_VOICE)
+    store.start()
+    print(f"Wake word listener started ({type(engine.detector).__name__}). Say 'Woolly' or 'Hey Woolly' to activate.")
     
-    # Check for similar pronunciations using common mishearings
-    similar_words = {
-        "woolly": ["willy", "wally", "olly", "wollie", "wolli", "woli", "woll"],
-        "wolly": ["willy", "wally", "olly", "wollie", "wolli", "woli", "woll"],
-        "wooly": ["willy", "wally", "olly", "wollie", "wolli", "woli", "woll"]
-    }
-    
-    # Check if any part of the text contains a similar word
-    words = text.split()
-    for word in words:
-        for base_word, variations in similar_words.items():
-            if word in variations:
-                return True
-    
-    return False
+    try:
+        while True:
+            print("Listening for wake word...")
+            audio = await asyncio.to_thread(engine.wait_for_hit)
+            if await confirm_wake_word(engine, audio):
+                # Free the microphone for the conversation's own recordings
+                engine.stop()
+                await speak("Hello! I'm Woolly, a general intellgience system to help you with anything. How can I help you today?", cache=True)
+                run_folder = create_run_folder()
+                run_log = get_run_logger(run_folder)
+                run_log.log("Wake word detected!", kind="wake_word")
+                try:
+                    with tracing.run(run_folder):
+                        await handle_conversation(run_log)
+                finally:
+                    run_log.log("=== Interaction complete ===")
+                    close_run_logger(run_folder)
+                await asyncio.sleep(1)  # Small delay to prevent multiple triggers
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    finally:
+        engine.stop()
 
 def main():
     # Check for FLAC installation first
     if not check_flac_installation():
         return
-
-    print("Initializing wake word listener...")
-    print("Wake word listener started. Say 'Woolly' or 'Hey Woolly' to activate.")
-    
     try:
-        while True:
-            print("Listening for wake word...")
-            heard = listen_for_response()
-            if detect_wake_word(heard):
-                speak("Hello! I'm Woolly, a general intellgience system to help you with anything. How can I help you today?")
-                handle_conversation()
-                time.sleep(1)  # Small delay to prevent multiple triggers
+        get_runtime().run(listen())
     except KeyboardInterrupt:
         print("\nWake word listener stopped.")
-    except Exception as e:
-        print(f"An error occurred: {e}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -2,7 +2,9 @@
 import openai
 import os
 import subprocess
+import argparse
 from dotenv import load_dotenv
+from tts_cache import get_cache
 
 load_dotenv()  # take environment variables from .env.
 
@@ -66,8 +68,45 @@ def generate_unclear_response_audio(text="I didn't quite understand. Could you p
     convert_mp3_to_wav(temp_mp3, output_file)
     print(f"Generated audio file: {output_file}")
 
+# Fixed phrases spoken by r1.py (gTTS at 150% volume) and the wake word listener (OpenAI Onyx),
+# pre-rendered into the shared TTS cache so they play without a network call or ffmpeg
+R1_PHRASES = [
+    "Yoo-hoo! Hello!",
+    "Hey Ayaan! Did you fall? Say YES if you need help or NO if you are okay.",
+    "Hey Ayaan! I didn't hear you. Say YES if you need help or NO if you're okay.",
+    "Okay, sorry to disturb you. Enjoy the rest of your day.",
+    "Ok don't worry, the nurse is coming to help you. Please remain calm.",
+]
+LISTENER_PHRASES = [
+    "Hello! I'm Woolly, a general intellgience system to help you with anything. How can I help you today?",
+    "Is there anything else I can help you with?",
+    "Goodbye!",
+    "What song would you like me to play?",
+    "I'm sorry, I couldn't process that request.",
+]
+CACHED_PHRASES = (
+    [{"text": text, "voice": "en", "model": "gtts", "sample_rate": 44100, "gain": 1.5} for text in R1_PHRASES] +
+    [{"text": text, "voice": "onyx", "model": "tts-1", "sample_rate": 24000, "gain": 1.0} for text in LISTENER_PHRASES]
+)
+
+def warm_tts_cache(phrases=CACHED_PHRASES):
+    """Render every fixed phrase into the shared TTS cache ahead of time"""
+    cache = get_cache()
+    for phrase in phrases:
+        path = cache.get(**phrase)
+        print(f"Cached \"{phrase['text']}\" -> {path}")
+    print(f"TTS cache warm: {cache.hits} already cached, {cache.misses} rendered")
+
 if __name__ == "__main__":
-    generate_prompt_audio()
-    generate_emergency_audio()
-    generate_false_alarm_audio()
-    generate_unclear_response_audio()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate prompt audio files")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="Only pre-render the fixed phrases into the shared TTS cache")
+    args = parser.parse_args()
+
+    if args.warm_cache:
+        warm_tts_cache()
+    else:
+        generate_prompt_audio()
+        generate_emergency_audio()
+        generate_false_alarm_audio()
+        generate_unclear_response_audio()
\ No newline at end of file
@@ -0,0 +1,316 @@
+"""
+Hub mode: one process serving the fall check-ins of many rooms over MQTT.
+
+Rooms are listed in a JSON config (HUB_CONFIG, default hub.json):
+    {
+        "gateway_token": "...",            # optional: one ThingsBoard gateway connection for every room
+        "max_checkins": 4,                 # check-ins running at the same time
+        "queue_size": 16,
+        "debounce_seconds": 30,
+        "rooms": [
+            {"name": "Room 101", "token": "...", "resident": "Ayaan", "caller_name": "Clay",
+             "input_device": "plughw:3,0", "output_device": "plughw:3,0"}
+        ]
+    }
+Without a gateway token each room connects with its own device access token. Fall events go
+through one FallEventQueue keyed by room: debounce and coalescing are per room, and
+max_checkins worker threads bound how many check-ins run at once. The check-ins themselves are
+coroutines on the shared asyncio runtime, so they share one OpenAI client, one outcall
+connection pool, the TTS cache and one playback engine per output device. Every room has a
+small state machine (idle -> queued -> prompting -> listening -> resolved/escalating -> idle)
+that is published with its telemetry.
+"""
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+from dotenv import load_dotenv
+
+import emergency
+import tracing
+from fall_events import FallEventQueue
+from intent_fastpath import classify_local, is_confident
+from run_archive import start_archiver
+from run_logger import close_run_logger, create_run_folder, get_run_logger
+from playback import get_engine
+from runtime import StageTimeout, capture_until_silence, get_runtime, play, stage
+from stt_backends import get_stt
+
+HUB_CONFIG = os.getenv("HUB_CONFIG", "hub.json")
+DEVICE_RPC_TOPIC = "v1/devices/me/rpc/request/+"
+GATEWAY_RPC_TOPIC = "v1/gateway/rpc"
+
+# Prompts are rendered once per resident and then served from the TTS cache
+PHRASE_VOICE = {"voice": "en", "model": "gtts", "sample_rate": 44100, "gain": 1.5}
+PROMPTS = {
+    "greeting": "Yoo-hoo! Hello!",
+    "ask": "Hey {resident}! Did you fall? Say YES if you need help or NO if you are okay.",
+    "ask_again": "Hey {resident}! I didn't hear you. Say YES if you need help or NO if you're okay.",
+    "ok": "Okay, sorry to disturb you. Enjoy the rest of your day.",
+    "help": "Ok don't worry, the nurse is coming to help you. Please remain calm.",
+}
+RESPONSE_SECONDS = 7
+
+
+class Room:
+    def __init__(self, name, token=None, resident="", caller_name="", input_device="plughw:3,0",
+                 output_device=None):
+        self.name = name
+        self.token = token
+        self.resident = resident
+        self.caller_name = caller_name
+        self.input_device = input_device
+        self.output_device = output_device
+        self.state = "idle"
+        self.state_since = time.monotonic()
+        self.checkins = 0
+
+    def set_state(self, state):
+        self.state = state
+        self.state_since = time.monotonic()
+
+    def prompt(self, name):
+        return PROMPTS[name].format(resident=self.resident or "there")
+
+
+async def say(room, prompt):
+    from tts_cache import get_cache
+
+    clip = await asyncio.to_thread(get_cache().get, room.prompt(prompt), **PHRASE_VOICE)
+    await stage("play", play(clip, device=room.output_device))
+
+
+def response_filename(attempt):
+    """response.wav for the first answer (what the benches read), response_<n>.wav for re-prompts"""
+    return "response.wav" if attempt == 0 else f"response_{attempt + 1}.wav"
+
+
+async def listen(room, run_folder, run_log, attempt=0):
+    """Record the resident's answer in the room and classify it; returns 'ok', 'not_ok' or None"""
+    room.set_state("listening")
+    path = os.path.join(run_folder, response_filename(attempt))
+    try:
+        result = await stage("record", capture_until_silence(path,
+                                                             max_duration=RESPONSE_SECONDS,
+                                                             device=room.input_device),
+                             timeout=RESPONSE_SECONDS + 5)
+        run_log.log(f"Audio recording saved to {path}", attempt=attempt + 1)
+        if not result["speech_detected"]:
+            run_log.log("Could not understand audio")
+            return None
+        transcript = await stage("transcribe", get_stt().transcribe_file(result["path"]))
+    except Exception as e:
+        print(f"[{room.name}] Error listening for a response: {e}")
+        return None
+    text = transcript.text.lower()
+    intent, confidence = classify_local(text)
+    # There is no LLM fallback here, so a weak "ok" is asked again rather than trusted;
+    # a "not ok" always escalates, since a second prompt only delays the nurse
+    if intent == "ok" and not is_confident(intent, confidence):
+        intent = "unclear"
+    run_log.log(f"Transcription: {text}", engine=transcript.engine, stt_ms=round(transcript.seconds * 1000))
+    run_log.log(f"Detected intent: {intent}", confidence=round(confidence, 2))
+    return intent if intent in ("ok", "not_ok") else None
+
+
+async def call_for_help(room, run_log):
+    room.set_state("escalating")
+    try:
+        status_code = await stage("outcall", asyncio.to_thread(
+            emergency.call_for_help, os.getenv('EMERGENCY_NUMBER'), user_first_name=room.caller_name))
+    except StageTimeout:
+        status_code = None
+    run_log.emergency(f"Emergency call initiated with status code: {status_code}", status_code=status_code,
+                      device=room.name)
+    await say(room, "help")
+
+
+async def fall_checkin(room, run_folder, run_log):
+    """The r1.py check-in for one room: ask twice, escalate on "yes" or silence"""
+    room.set_state("prompting")
+    await say(room, "greeting")
+    await say(room, "ask")
+    for attempt in range(2):
+        intent = await listen(room, run_folder, run_log, attempt)
+        if intent == "ok":
+            room.set_state("resolved")
+            run_log.log("Action: False alarm - No action needed")
+            await say(room, "ok")
+            return
+        if intent == "not_ok":
+            run_log.emergency("Action: Emergency confirmed - Help needed")
+            await call_for_help(room, run_log)
+            return
+        if attempt == 0:
+            room.set_state("prompting")
+            await say(room, "ask_again")
+    run_log.emergency("Action: No response after two prompts - Escalating to emergency")
+    await call_for_help(room, run_log)
+
+
+class Hub:
+    def __init__(self, rooms, host, gateway_token=None, max_checkins=4, queue_size=16, debounce_seconds=30.0,
+                 checkin=fall_checkin, runs_root=None, port=1883):
+        self.rooms = {room.name: room for room in rooms}
+        self.host = host
+        self.port = port
+        self.gateway_token = gateway_token
+        self.checkin = checkin
+        self.runs_root = runs_root
+        self.clients = {}  # room name (or None for the gateway) -> mqtt client
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak_running = 0
+        self.queue = FallEventQueue(self._run_checkin, maxsize=queue_size, debounce_seconds=debounce_seconds,
+                                    workers=max_checkins)
+
+    @classmethod
+    def from_config(cls, path=HUB_CONFIG, **kwargs):
+        with open(path, 'r') as f:
+            config = json.load(f)
+        rooms = [Room(**room) for room in config["rooms"]]
+        return cls(rooms, os.getenv('THINGSBOARD_HOST'), gateway_token=config.get("gateway_token"),
+                   max_checkins=config.get("max_checkins", 4), queue_size=config.get("queue_size", 16),
+                   debounce_seconds=config.get("debounce_seconds", 30.0), **kwargs)
+
+    # MQTT
+
+    def connect(self):
+        if self.gateway_token:
+            self.clients[None] = self._client(self.gateway_token, GATEWAY_RPC_TOPIC, self._on_gateway_message)
+        else:
+            for room in self.rooms.values():
+                self.clients[room.name] = self._client(room.token, DEVICE_RPC_TOPIC, self._device_handler(room))
+        print(f"Hub serving {len(self.rooms)} rooms over {len(self.clients)} MQTT connection(s)")
+
+    def _client(self, token, topic, on_message):
+        client = mqtt.Client()
+        client.username_pw_set(token)
+
+        def on_connect(client, userdata, flags, rc):
+            if rc == 0:
+                # RPC acknowledgements are tiny; don't let Nagle hold them back
+                client.socket().setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                client.subscribe(topic)
+            else:
+                print(f'Failed to connect, return code {rc}')
+
+        client.on_connect = on_connect
+        client.on_message = on_message
+        client.connect(self.host, self.port, 60)
+        client.loop_start()
+        return client
+
+    def _device_handler(self, room):
+        def on_message(client, userdata, msg):
+            try:
+                message = json.loads(msg.payload.decode())
+            except ValueError:
+                return
+            if self._on_fall(room, message) == "queued":
+                response = {"msg": {"params": True, "method": "fallEvent"}, "metadata": {}, "msgType": "RPC message"}
+                client.publish('v1/devices/me/rpc/response/' + msg.topic.split('/')[-1], json.dumps(response))
+        return on_message
+
+    def _on_gateway_message(self, client, userdata, msg):
+        try:
+            message = json.loads(msg.payload.decode())
+            room = self.rooms[message["device"]]
+            data = message["data"]
+        except (ValueError, KeyError):
+            return
+        if self._on_fall(room, data) == "queued":
+            response = {"device": room.name, "id": data.get("id"),
+                        "data": {"params": True, "method": "fallEvent"}}
+            client.publish(GATEWAY_RPC_TOPIC, json.dumps(response))
+
+    def _on_fall(self, room, message):
+        # Runs on a paho network thread: never block here
+        if message.get('method') != 'fallEvent' or message.get('params') != True:
+            return None
+        outcome = self.queue.submit(message, key=room.name)
+        if outcome == "queued":
+            room.set_state("queued")
+        else:
+            print(f"[{room.name}] Fall event ignored ({outcome})")
+        self.publish_telemetry(room)
+        return outcome
+
+    def publish_telemetry(self, room):
+        telemetry = {"checkin_state": room.state, "checkins": room.checkins}
+        if self.gateway_token:
+            telemetry.update(self.metrics())
+            self.clients[None].publish('v1/gateway/telemetry', json.dumps({room.name: [telemetry]}))
+        elif room.name in self.clients:
+            telemetry.update(self.metrics())
+            self.clients[room.name].publish('v1/devices/me/telemetry', json.dumps(telemetry))
+
+    # Check-ins
+
+    def _run_checkin(self, key, event):
+        room = self.rooms[key]
+        with self.lock:
+            self.running += 1
+            self.peak_running = max(self.peak_running, self.running)
+        run_folder = create_run_folder(self.runs_root)
+        run_log = get_run_logger(run_folder)
+        run_log.log("=== Starting new interaction ===", kind="fall_checkin", device=room.name)
+        try:
+            # This worker thread blocks while the check-in runs on the shared event loop
+            get_runtime().run(tracing.traced(run_folder, self.checkin(room, run_folder, run_log)))
+        finally:
+            run_log.log("=== Interaction complete ===")
+            close_run_logger(run_folder)
+            room.checkins += 1
+            room.set_state("idle")
+            with self.lock:
+                self.running -= 1
+            self.publish_telemetry(room)
+
+    def metrics(self):
+        metrics = self.queue.metrics()
+        with self.lock:
+            metrics["hub_checkins_running"] = self.running
+            metrics["hub_checkins_peak"] = self.peak_running
+        return metrics
+
+    def states(self):
+        return {name: room.state for name, room in self.rooms.items()}
+
+    def close(self):
+        for client in self.clients.values():
+            client.loop_stop()
+            client.disconnect()
+
+
+def main():
+    load_dotenv()
+    hub = Hub.from_config()
+    # Open every room's speaker now, so a wrong output_device fails at startup rather than on a fall
+    for room in hub.rooms.values():
+        get_engine(room.output_device)
+
+    def signal_handler(sig, frame):
+        print('\nDisconnecting...')
+        hub.close()
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, signal_handler)
+    tracing.add_collector(hub.metrics)
+    tracing.start()
+    hub.connect()
+    # Shared by every room: one warm outcall connection and, with RUNS_ARCHIVE=1, one run archiver
+    emergency.get_client().start_keepalive()
+    start_archiver()
+    while True:
+        time.sleep(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Local fast path for the "Did you fall?" intent.
+
+A handful of precompiled patterns score a transcript for 'ok' and 'not_ok' cues; a clear,
+one-sided answer is returned with high confidence, anything ambiguous or unrelated comes back
+'unclear' / low confidence so the caller can escalate it to the LLM.
+"""
+import re
+
+# Confidence at or above which callers may skip the LLM
+CONFIDENT = 0.8
+
+STRONG, MEDIUM, WEAK = 3, 2, 1
+
+NOT_OK_CUES = [
+    (STRONG, r"(?<!if )\bi\s*(?:'ve|have)?\s*(?:just\s+)?(?:fell|fallen|slipped|tripped|collapsed)\b"),
+    (STRONG, r"\bi(?:'?m| am)\s+(?:down|hurt|injured|bleeding|stuck|in pain|in trouble|in distress|on the (?:floor|ground))\b"),
+    (STRONG, r"\b(?:help me|please help|call for help|get help|call 911|send someone|assist me|please assist|medical emergency|emergency)\b"),
+    (STRONG, r"\b(?:can'?t|cannot|can not)\s+(?:get\s+(?:back\s+)?up|stand|move|get to)\b"),
+    (STRONG, r"\b(?:need|needs)\s+(?:help|assistance|aid|support)\b"),
+    (STRONG, r"\b(?:hit my head|lost my balance|went down|on the (?:floor|ground)|lying on the floor)\b"),
+    (STRONG, r"\b(?:it hurts|really hurts|hurts|in pain|pain in my)\b"),
+    (STRONG, r"^(?:yes|yeah|yep|yup)\b"),
+    (MEDIUM, r"^help\b"),
+    (MEDIUM, r"\b(?:not|isn'?t)\s+(?:okay|ok|fine|good|alright|all right)\b"),
+    (WEAK, r"\b(?:dizzy|injured|accident|urgent|please hurry)\b"),
+]
+
+OK_CUES = [
+    (STRONG, r"\b(?:didn'?t|did not|haven'?t|have not|never)\s+fall(?:en)?\b"),
+    (STRONG, r"\b(?:no|not a)\s+fall\b"),
+    (STRONG, r"\bi(?:'?m| am)\s+(?:really\s+|perfectly\s+|totally\s+|all\s+)?(?:fine|okay|ok|good|alright|all right|steady|safe|unharmed|not hurt)\b"),
+    (STRONG, r"\b(?:all is well|all good|all clear|safe and sound|everything'?s?\s+(?:is\s+)?(?:fine|okay|ok|good|under control))\b"),
+    (STRONG, r"\b(?:no need to worry|no problems?|no worries|nothing happened|don'?t need help|no need for help)\b"),
+    (STRONG, r"\b(?:still on my feet|standing strong)\b"),
+    (STRONG, r"^(?:no|nope|nah)\b(?!\s+(?:idea|clue|one)\b)"),
+    (MEDIUM, r"^not at all\b"),
+]
+
+_NOT_OK = [(weight, re.compile(pattern)) for weight, pattern in NOT_OK_CUES]
+_OK = [(weight, re.compile(pattern)) for weight, pattern in OK_CUES]
+_SENTENCES = re.compile(r"[^.!?]+[.!?]?")
+_APOSTROPHES = str.maketrans({"’": "'", "‘": "'"})
+
+
+def _score(sentence, cues):
+    return sum(weight for weight, pattern in cues if pattern.search(sentence))
+
+
+def classify_local(text):
+    """
+    Score a transcript for ok / not_ok cues.
+    Returns:
+        (intent, confidence) with intent one of 'ok', 'not_ok', 'unclear' and confidence in [0, 1]
+    """
+    if not text:
+        return "unclear", 0.0
+    ok_score = not_ok_score = 0
+    for match in _SENTENCES.finditer(text.lower().translate(_APOSTROPHES)):
+        sentence = match.group(0).strip()
+        # Questions ("why do you ask if I fell?") aren't answers
+        if not sentence or sentence.endswith("?"):
+            continue
+        sentence = sentence.rstrip(".!").strip()
+        ok_score += _score(sentence, _OK)
+        not_ok_score += _score(sentence, _NOT_OK)
+
+    if ok_score == not_ok_score:
+        return "unclear", 0.0
+    intent = "ok" if ok_score > not_ok_score else "not_ok"
+    winner, loser = max(ok_score, not_ok_score), min(ok_score, not_ok_score)
+    confidence = (winner - loser) / (winner + loser) * min(1.0, winner / STRONG)
+    return intent, round(confidence, 3)
+
+
+def normalize_intent(reply):
+    """Map a model's label ("Not OK", "'unclear'", "ok.") to ok / not_ok / unclear; anything else is unclear"""
+    label = re.sub(r"[^a-z]+", "_", (reply or "").lower()).strip("_")
+    if label in ("not_ok", "notok", "not_okay"):
+        return "not_ok"
+    if label in ("ok", "okay"):
+        return "ok"
+    return "unclear"
+
+
+def is_confident(intent, confidence, threshold=CONFIDENT):
+    """True when a local result can be used without asking the LLM"""
+    return intent != "unclear" and confidence >= threshold
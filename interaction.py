@@ -0,0 +1,100 @@
+"""
+Pipelined scheduling for one fall check-in.
+
+While a prompt plays, the scheduler warms the HTTPS connections the rest of the interaction
+will need (OpenAI for Whisper/chat, the emergency outcall) and opens the microphone early.
+Frames are discarded until the prompt has finished playing plus an echo tail, so the
+resident's answer is captured from the first word without recording the prompt itself.
+Every stage is timestamped on the monotonic clock to show the critical path.
+"""
+import threading
+import time
+
+import emergency
+from playback import get_engine
+
+# Room reverb and output-device latency to wait out after the last prompt sample
+ECHO_TAIL_SECONDS = 0.2
+
+
+class MicGate:
+    """Opens once a clip has finished playing and the echo tail has passed"""
+    def __init__(self, clip, expected_duration, echo_tail=ECHO_TAIL_SECONDS):
+        self.clip = clip
+        self.echo_tail = echo_tail
+        # Fallback if the playback engine never reports completion
+        self.deadline = time.monotonic() + expected_duration + 1.0 + echo_tail
+        self.opened_at = None
+
+    def __call__(self):
+        if self.opened_at is not None:
+            return True
+        now = time.monotonic()
+        finished_at = self.clip.finished_at if self.clip.done.is_set() else None
+        if (finished_at is not None and now - finished_at >= self.echo_tail) or now >= self.deadline:
+            self.opened_at = now
+            return True
+        return False
+
+
+class InteractionScheduler:
+    def __init__(self, log=print):
+        self.log = log
+        self.start = time.monotonic()
+        self.stages = []
+        self.lock = threading.Lock()
+
+    def mark(self, stage, at=None):
+        """Record that a stage happened (now, or at a given monotonic time)"""
+        at = time.monotonic() if at is None else at
+        with self.lock:
+            self.stages.append((stage, at))
+
+    def play_and_arm(self, audio_file, name="prompt"):
+        """Queue a clip and return a MicGate that opens when it (and its echo) has finished"""
+        engine = get_engine()
+        clip = engine.play(audio_file)
+        duration = clip.duration
+        self.mark(f"{name}_queued")
+        self.log(f"Playing {name} ({duration:.2f}s), microphone armed for its end")
+
+        def track():
+            clip.wait()
+            self.mark(f"{name}_end", clip.finished_at)
+
+        threading.Thread(target=track, daemon=True).start()
+        return MicGate(clip, duration)
+
+    def prewarm(self, openai_module):
+        """Open HTTPS connections to OpenAI and the outcall endpoint in the background"""
+        def warm_openai():
+            try:
+                # Any cheap authenticated call opens the pooled connection that Whisper and chat reuse
+                openai_module.models.list()
+                self.mark("prewarm_openai_done")
+            except Exception as e:
+                self.log(f"OpenAI pre-warm failed: {e}")
+
+        def warm_outcall():
+            emergency.get_client().prewarm()
+            self.mark("prewarm_outcall_done")
+
+        threading.Thread(target=warm_openai, daemon=True).start()
+        threading.Thread(target=warm_outcall, daemon=True).start()
+        emergency.get_client().start_keepalive()
+
+    def stage_records(self):
+        """Stages in time order with their offset from interaction start and step from the previous stage, in ms"""
+        with self.lock:
+            stages = sorted(self.stages, key=lambda s: s[1])
+        records = []
+        previous = self.start
+        for stage, at in stages:
+            records.append({"stage": stage, "offset_ms": round((at - self.start) * 1000, 1),
+                            "step_ms": round((at - previous) * 1000, 1)})
+            previous = at
+        return records
+
+    def summary(self):
+        """Human-readable stage_records()"""
+        return [f"{r['stage']}: +{r['offset_ms']:.0f} ms (step {r['step_ms']:.0f} ms)" for r in self.stage_records()]
@@ -0,0 +1,321 @@
+"""
+Long-lived in-process audio output shared by every entry point.
+
+One PortAudio output stream stays open for the life of the process and a callback pulls PCM
+from a queue of clips, so back-to-back prompts don't pay a process spawn or a device open and
+never overlap. Clips can be WAV paths (decoded once and kept in memory), int16 arrays, or
+streams that are still being written (e.g. TTS audio arriving from the network).
+"""
+import collections
+import os
+import re
+import threading
+import time
+import types
+
+import numpy as np
+
+import tracing
+from audio_utils import read_wav, resample
+
+# ALSA-style names are resolved to a PortAudio device by resolve_device(). plughw converts rate
+# and channels for codecs that are stereo or 48 kHz only; set AUDIO_OUTPUT_DEVICE=hw:3,0 to skip
+# the conversion on a codec known to take mono 44.1 kHz
+DEFAULT_DEVICE = os.getenv("AUDIO_OUTPUT_DEVICE", "plughw:3,0" if os.name == 'posix' else None)
+if str(DEFAULT_DEVICE).startswith("plughw:"):
+    os.environ.setdefault("PA_ALSA_PLUGHW", "1")  # before anything imports sounddevice
+DEFAULT_RATE = 44100
+MAX_DECODED_CLIPS = 32
+
+
+class Clip:
+    """A queued piece of audio; wait() blocks until it finished or was interrupted"""
+    def __init__(self, name, rate):
+        self.name = name
+        self.rate = rate
+        self.chunks = collections.deque()
+        self.closed = False
+        self.interrupted = False
+        self.duration = 0.0       # seconds, known up front for complete clips
+        self.started_at = None    # monotonic time the first sample was handed to the device
+        self.finished_at = None   # monotonic time the last sample was handed to the device
+        self.done = threading.Event()
+        self._odd_byte = b""
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+
+class ClipWriter:
+    """Sink for audio that is still arriving; write() raw 16-bit mono PCM, then close()"""
+    def __init__(self, engine, clip, src_rate):
+        self.engine = engine
+        self.clip = clip
+        self.src_rate = src_rate
+
+    def write(self, data):
+        data = self.clip._odd_byte + data
+        if len(data) % 2:
+            self.clip._odd_byte, data = data[-1:], data[:-1]
+        else:
+            self.clip._odd_byte = b""
+        if data:
+            samples = np.frombuffer(data, dtype=np.int16)
+            self.engine._append(self.clip, resample(samples, self.src_rate, self.engine.rate))
+
+    def finish(self):
+        """Mark the stream finished without waiting for it to play out"""
+        self.clip.closed = True
+        return self.clip
+
+    def close(self):
+        """Mark the stream finished and block until it has played out"""
+        self.finish().wait()
+
+
+class NullOutputStream:
+    """
+    Stand-in for the PortAudio stream that plays into nothing: a thread pulls blocks through
+    the engine callback at the device's pace (or speed times faster), so clip timing behaves
+    as on real hardware. Used by benchmarks and machines without an audio device.
+    """
+    def __init__(self, samplerate, blocksize, callback, speed=1.0):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.callback = callback
+        self.speed = speed
+        self.running = threading.Event()
+        self.thread = None
+
+    def _run(self):
+        status = types.SimpleNamespace(output_underflow=False)
+        buffer = bytearray(self.blocksize * 2)
+        period = self.blocksize / self.samplerate / self.speed
+        deadline = time.monotonic()
+        while self.running.is_set():
+            self.callback(buffer, self.blocksize, None, status)
+            deadline += period
+            time.sleep(max(0.0, deadline - time.monotonic()))
+
+    def start(self):
+        self.running.set()
+        self.thread = threading.Thread(target=self._run, name="null-output", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running.clear()
+        if self.thread:
+            self.thread.join()
+
+    def close(self):
+        self.stop()
+
+
+def resolve_device(device):
+    """
+    Turn an output device setting into something sounddevice accepts.
+    PortAudio lists ALSA cards as e.g. "USB Audio: - (hw:3,0)", so "hw:3,0" and "plughw:3,0" are
+    looked up by that suffix and returned as a device index. plughw sets PA_ALSA_PLUGHW=1, which
+    makes PortAudio open the card through ALSA's plug layer; it has to be set before sounddevice
+    is first imported, so it applies to the whole process. Other names and indexes pass through.
+    Raises:
+        ValueError: no output device matches
+    """
+    match = re.fullmatch(r"(plug)?hw:(\d+)(?:,(\d+))?", str(device or ""))
+    if match is None:
+        return device
+    if match.group(1):
+        os.environ.setdefault("PA_ALSA_PLUGHW", "1")
+    import sounddevice as sd
+
+    suffix = f"(hw:{match.group(2)},{match.group(3) or 0})"
+    devices = sd.query_devices()
+    for index, info in enumerate(devices):
+        if info["max_output_channels"] > 0 and info["name"].endswith(suffix):
+            return index
+    outputs = ", ".join(f"{i}: {info['name']}" for i, info in enumerate(devices) if info["max_output_channels"] > 0)
+    raise ValueError(f"No output device matching {device} ({suffix}); available: {outputs or 'none'}")
+
+
+class PlaybackEngine:
+    def __init__(self, device=DEFAULT_DEVICE, rate=DEFAULT_RATE, blocksize=1024, stream_factory=None):
+        """
+        Args:
+            stream_factory: Optional callable(samplerate, blocksize, callback) returning the output
+                stream (e.g. NullOutputStream); defaults to a PortAudio stream on the device
+        """
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.queue = collections.deque()
+        self.decoded = {}  # (path, mtime) -> samples at engine rate
+        self.underruns = 0       # device underflows reported by PortAudio
+        self.starved_blocks = 0  # blocks padded with silence while a stream waited for data
+        self.clips_played = 0
+        self.recent_starts = collections.deque(maxlen=64)  # started_at of the latest clips
+        if stream_factory is not None:
+            self.stream = stream_factory(rate, blocksize, self._callback)
+        else:
+            device = resolve_device(device)
+            import sounddevice as sd
+
+            self.stream = sd.RawOutputStream(
+                samplerate=rate,
+                blocksize=blocksize,
+                device=device,
+                channels=1,
+                dtype="int16",
+                latency="low",
+                callback=self._callback
+            )
+        self.stream.start()
+
+    def _callback(self, outdata, frames, time_info, status):
+        if status.output_underflow:
+            self.underruns += 1
+        out = np.zeros(frames, dtype=np.int16)
+        filled = 0
+        with self.lock:
+            while filled < frames and self.queue:
+                clip = self.queue[0]
+                if not clip.chunks:
+                    if clip.closed:
+                        self.queue.popleft()
+                        self.clips_played += 1
+                        clip.finished_at = time.monotonic()
+                        clip.done.set()
+                        continue
+                    self.starved_blocks += 1
+                    break  # streaming clip waiting for more data: pad with silence
+                if clip.started_at is None:
+                    clip.started_at = time.monotonic()
+                    self.recent_starts.append(clip.started_at)
+                chunk = clip.chunks[0]
+                take = min(frames - filled, len(chunk))
+                out[filled:filled + take] = chunk[:take]
+                filled += take
+                if take == len(chunk):
+                    clip.chunks.popleft()
+                else:
+                    clip.chunks[0] = chunk[take:]
+        outdata[:] = out.tobytes()
+
+    def _append(self, clip, samples):
+        with self.lock:
+            clip.chunks.append(samples)
+
+    def _load(self, path):
+        key = (str(path), os.path.getmtime(path))
+        samples = self.decoded.get(key)
+        if samples is None:
+            samples, rate = read_wav(path)
+            samples = resample(samples, rate, self.rate)
+            if len(self.decoded) >= MAX_DECODED_CLIPS:
+                self.decoded.pop(next(iter(self.decoded)))
+            self.decoded[key] = samples
+        return samples
+
+    def play(self, source, rate=None):
+        """
+        Queue audio and return its Clip immediately.
+        Args:
+            source: WAV path, int16 array or raw 16-bit mono PCM bytes
+            rate: Sample rate of an array/bytes source (defaults to the engine rate)
+        """
+        if isinstance(source, (str, os.PathLike)):
+            samples, name = self._load(source), str(source)
+        else:
+            if isinstance(source, (bytes, bytearray)):
+                source = np.frombuffer(source, dtype=np.int16)
+            samples, name = resample(source, rate or self.rate, self.rate), "buffer"
+        clip = Clip(name, self.rate)
+        clip.chunks.append(samples)
+        clip.duration = len(samples) / self.rate
+        clip.closed = True
+        with self.lock:
+            self.queue.append(clip)
+        return clip
+
+    def play_and_wait(self, source, rate=None, timeout=None):
+        """Queue audio and block until it has played; returns False if it was interrupted"""
+        clip = self.play(source, rate)
+        clip.wait(timeout)
+        return not clip.interrupted
+
+    def open_stream(self, rate, name="stream"):
+        """Queue a clip whose audio is written incrementally; returns its ClipWriter"""
+        clip = Clip(name, self.rate)
+        with self.lock:
+            self.queue.append(clip)
+        return ClipWriter(self, clip, rate)
+
+    def interrupt(self):
+        """Stop the current clip and drop everything queued behind it"""
+        with self.lock:
+            clips = list(self.queue)
+            self.queue.clear()
+        for clip in clips:
+            clip.interrupted = True
+            clip.closed = True
+            clip.finished_at = time.monotonic()
+            clip.done.set()
+
+    def drain(self, timeout=None):
+        """Block until everything queued so far has played"""
+        with self.lock:
+            clips = list(self.queue)
+        for clip in clips:
+            clip.wait(timeout)
+
+    def first_audio_since(self, since):
+        """Monotonic time the first clip started playing at or after since, or None"""
+        with self.lock:
+            return next((t for t in self.recent_starts if t >= since), None)
+
+    def is_playing(self):
+        with self.lock:
+            return bool(self.queue)
+
+    def queued_seconds(self):
+        """Audio still waiting to be played, in seconds"""
+        with self.lock:
+            return sum(len(chunk) for clip in self.queue for chunk in clip.chunks) / self.rate
+
+    def stats(self):
+        return {
+            "underruns": self.underruns,
+            "starved_blocks": self.starved_blocks,
+            "clips_played": self.clips_played,
+            "queued": len(self.queue),
+        }
+
+    def close(self):
+        self.interrupt()
+        self.stream.stop()
+        self.stream.close()
+
+
+_engines = {}
+_engine_lock = threading.Lock()
+
+
+def get_engine(device=None):
+    """Process-wide playback engine for an output device (default AUDIO_OUTPUT_DEVICE), opened on first use"""
+    device = device or DEFAULT_DEVICE
+    with _engine_lock:
+        engine = _engines.get(device)
+        if engine is None:
+            engine = _engines[device] = PlaybackEngine(device)
+            _register_metrics(engine, device)
+        return engine
+
+
+def _register_metrics(engine, device):
+    tracing.add_collector(lambda: {f'playback_{name}{{device="{device}"}}': value
+                                   for name, value in engine.stats().items()})
+
+
+def set_engine(engine, device=None):
+    """Use an already opened engine for an output device (e.g. one on a NullOutputStream)"""
+    with _engine_lock:
+        _engines[device or DEFAULT_DEVICE] = engine
+    _register_metrics(engine, device or DEFAULT_DEVICE)
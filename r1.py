@@ -1,18 +1,23 @@
+import asyncio
 import paho.mqtt.client as mqtt
 import json
 import time
 import signal
 import sys
-from datetime import datetime, timedelta
-from gtts import gTTS
-import subprocess
-import pyaudio
-import wave
 import speech_recognition as sr
-import requests
-import simpleaudio as sa
+import emergency
+import tracing
 import os
 from dotenv import load_dotenv
+from capture import get_capture
+from tts_cache import get_cache
+from fall_events import FallEventQueue
+from intent_fastpath import classify_local, is_confident
+from run_logger import close_run_logger, create_run_folder, get_run_logger
+from run_archive import start_archiver
+from playback import get_engine
+from runtime import StageTimeout, get_runtime, play, stage
+from stt_backends import get_stt
 
 # Load environment variables
 load_dotenv()
@@ -29,9 +34,10 @@ client.username_pw_set(ACCESS_TOKEN)
 client.connect(thingsboard_host, 1883, 60)
 
 # Debounce configuration
-DEBOUNCE_PERIOD = timedelta(seconds=30)
-last_fall_event_time = datetime.min
-fall_detection_in_progress = False
+DEBOUNCE_PERIOD_SECONDS = 30
+FALL_QUEUE_SIZE = 4
+# Seconds a recording stage may overrun its recording length, and the limit on transcription
+STAGE_TIMEOUT_MARGIN = 10
 
 # Define callbacks
 def on_connect(client, userdata, flags, rc):
@@ -43,192 +49,131 @@ def on_connect(client, userdata, flags, rc):
         print(f'Failed to connect, return code {rc}')
 
 def on_message(client, userdata, msg):
-    global last_fall_event_time, fall_detection_in_progress
+    # Runs on the paho network thread: never block here, hand the check-in to the fall worker
     print(f'Received message on topic {msg.topic}')
     print(f'Message: {msg.payload.decode()}')
     message = json.loads(msg.payload.decode())
 
-    current_time = datetime.now()
-
     if message.get('method') == 'fallEvent' and message.get('params') == True:
         print("Fall event detected")
-        if not fall_detection_in_progress and (current_time - last_fall_event_time >= DEBOUNCE_PERIOD):
-            last_fall_event_time = current_time
-            fall_detection_in_progress = True
-            handle_fall_detection()
+        outcome = fall_queue.submit(message)
+        if outcome == "queued":
             response = {"msg": {"params": True, "method": "fallEvent"}, "metadata": {}, "msgType": "RPC message"}
             client.publish('v1/devices/me/rpc/response/' + msg.topic.split('/')[-1], json.dumps(response))
         else:
-            print("Fall event ignored due to debounce period or in-progress detection")
+            print(f"Fall event ignored ({outcome})")
+        publish_metrics()
     else:
         print("Non-fall event or invalid message received")
 
-def handle_fall_detection():
-    global fall_detection_in_progress
+def publish_metrics():
+    """Report fall queue depth, time-in-queue and outcome counters as device telemetry"""
+    client.publish('v1/devices/me/telemetry', json.dumps(fall_queue.metrics()))
+
+def run_fall_checkin(key, event):
+    run_folder = create_run_folder()
+    run_log = get_run_logger(run_folder)
+    run_log.log("=== Starting new interaction ===", kind="fall_checkin", device=key)
     try:
-        # Generate the greeting sound
-        tts_greeting = gTTS(text="Yoo-hoo! Hello!", lang='en')
-        tts_greeting.save("greeting.mp3")
-        subprocess.run(["ffmpeg", "-y", "-i", "greeting.mp3", "-af", "volume=1.5", "greeting.wav"], check=True)
-        print("Generated greeting sound")
+        # The fall worker thread blocks here while the check-in runs on the shared event loop
+        get_runtime().run(tracing.traced(run_folder, handle_fall_detection(run_log)))
+    finally:
+        run_log.log("=== Interaction complete ===")
+        close_run_logger(run_folder)
+    publish_metrics()
 
-        # Play the greeting sound
-        greeting_wave_obj = sa.WaveObject.from_wave_file("greeting.wav")
-        greeting_play_obj = greeting_wave_obj.play()
-        greeting_play_obj.wait_done()
-        print("Played greeting.wav")
+fall_queue = FallEventQueue(run_fall_checkin, maxsize=FALL_QUEUE_SIZE, debounce_seconds=DEBOUNCE_PERIOD_SECONDS)
 
-        # Generate the combined speech
-        tts1 = gTTS(text="Hey Ayaan! Did you fall? Say YES if you need help or NO if you are okay.", lang='en')
-        tts1.save("combined_message.mp3")
-        print("TTS generated and saved as combined_message.mp3")
+async def play_phrase(text):
+    """Play a phrase at 150% volume, rendering it with gTTS only if it isn't in the TTS cache yet"""
+    clip = await asyncio.to_thread(get_cache().get, text, voice="en", model="gtts", sample_rate=44100, gain=1.5)
+    await stage("play", play(clip))
 
-        # Convert mp3 to wav using ffmpeg and adjust volume to 150%
-        subprocess.run(["ffmpeg", "-y", "-i", "combined_message.mp3", "-af", "volume=1.5", "combined_message.wav"], check=True)
-        print("Converted combined_message.mp3 to combined_message.wav at 150% volume")
+async def handle_fall_detection(run_log):
+    try:
+        # Play the greeting sound
+        await play_phrase("Yoo-hoo! Hello!")
+        print("Played greeting")
 
         # Play the combined speech
-        wave_obj1 = sa.WaveObject.from_wave_file("combined_message.wav")
-        play_obj1 = wave_obj1.play()
-        play_obj1.wait_done()
-        print("Played combined_message.wav")
+        await play_phrase("Hey Ayaan! Did you fall? Say YES if you need help or NO if you are okay.")
+        print("Played combined message")
 
         # Record audio for 7 seconds
-        if not record_and_analyze_response(7):
+        if not await record_and_analyze_response(7, run_log):
             # No significant input detected, play the second message
-            tts_repeat = gTTS(text="Hey Ayaan! I didn't hear you. Say YES if you need help or NO if you're okay.", lang='en')
-            tts_repeat.save("did_not_hear_you.mp3")
-            subprocess.run(["ffmpeg", "-y", "-i", "did_not_hear_you.mp3", "-af", "volume=1.5", "did_not_hear_you.wav"], check=True)
-            print("Converted did_not_hear_you.mp3 to did_not_hear_you.wav at 150% volume")
-
-            wave_obj2 = sa.WaveObject.from_wave_file("did_not_hear_you.wav")
-            play_obj2 = wave_obj2.play()
-            play_obj2.wait_done()
-            print("Played did_not_hear_you.wav")
+            await play_phrase("Hey Ayaan! I didn't hear you. Say YES if you need help or NO if you're okay.")
+            print("Played did_not_hear_you message")
 
             # Record audio again for 7 seconds, call for help if no response
-            if not record_and_analyze_response(7):
-                call_for_help()
+            if not await record_and_analyze_response(7, run_log):
+                run_log.emergency("Action: No response after two prompts - Escalating to emergency")
+                await call_for_help(run_log)
 
     except Exception as e:
         print(f"Error in handle_fall_detection: {e}")
-    finally:
-        fall_detection_in_progress = False
-
-def record_and_analyze_response(record_seconds):
+        run_log.log(f"Error in handle_fall_detection: {e}")
+
+def record_response(record_seconds):
+    """Endpoint the resident's answer on the always-open capture ring (blocking); returns the samples"""
+    capture = get_capture()
+    print(f"Listening for up to {record_seconds} seconds...")
+    samples, result = capture.record_until_silence(max_duration=record_seconds)
+    print(f"Captured {result['captured_seconds']:.2f}s ({result['stop_reason']})")
+    if not result["speech_detected"]:
+        raise sr.UnknownValueError("No speech detected")
+    return samples
+
+async def record_and_analyze_response(record_seconds, run_log):
     try:
-        CHUNK = 1024
-        FORMAT = pyaudio.paInt16
-        CHANNELS = 1
-        RATE = 44100
-        WAVE_OUTPUT_FILENAME = "output.wav"
-
-        p = pyaudio.PyAudio()
-
-        stream = p.open(format=FORMAT,
-                        channels=CHANNELS,
-                        rate=RATE,
-                        input=True,
-                        frames_per_buffer=CHUNK)
-
-        print(f"Recording audio for {record_seconds} seconds...")
-
-        frames = []
-
-        for i in range(0, int(RATE / CHUNK * record_seconds)):
-            data = stream.read(CHUNK)
-            frames.append(data)
-
-        print("Finished recording")
-
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
-
-        wf = wave.open(WAVE_OUTPUT_FILENAME, 'wb')
-        wf.setnchannels(CHANNELS)
-        wf.setsampwidth(p.get_sample_size(FORMAT))
-        wf.setframerate(RATE)
-        wf.writeframes(b''.join(frames))
-        wf.close()
-
-        print("Audio recorded and saved as output.wav")
-
-        # Use speech recognition to convert audio to text
-        recognizer = sr.Recognizer()
-        with sr.AudioFile(WAVE_OUTPUT_FILENAME) as source:
-            audio = recognizer.record(source)
-
         try:
-            text = recognizer.recognize_google(audio).lower()
-            print(f"Transcription: {text}")
-
-            # Define variations of "yes" and "no"
-            yes_variations = [
-                "yes", "i fell", "help", "i need help", "assistance", "i'm down", "i have fallen",
-                "i can't get up", "emergency", "fallen", "down", "not okay", "hurt", "injured",
-                "accident", "help me", "can't stand", "need assistance", "urgent", "please help",
-                "i'm on the ground", "can't move", "in pain", "i need aid", "assist me", "i'm stuck",
-                "need help", "please assist", "get help", "i'm in trouble", "i need support", "i'm hurt",
-                "please hurry", "i'm in distress", "medical emergency"
-            ]
-
-            no_variations = [
-                "no", "i'm okay", "fine", "all good", "no fall", "didn't fall", "okay", "all right",
-                "no help", "no issue", "no problem", "nothing happened", "i'm fine", "no need",
-                "no assistance", "safe", "unharmed", "good", "all clear", "no thanks",
-                "i'm alright", "everything's fine", "not hurt", "not injured", "no damage", "no worries",
-                "i'm good", "don't need help", "no concern", "all is well", "not necessary", "no need for help",
-                "not required", "no harm", "everything's okay"
-            ]
-
-            # Check if "yes" or "no" appears more frequently and prioritize
-            yes_count = sum(text.count(word) for word in yes_variations)
-            no_count = sum(text.count(word) for word in no_variations)
-
-            if no_count > yes_count:
+            # Waiting on the capture ring blocks, so it runs off the event loop
+            samples = await stage("record", asyncio.to_thread(record_response, record_seconds),
+                                  timeout=record_seconds + STAGE_TIMEOUT_MARGIN)
+            # Google Speech Recognition straight from memory, hedged by the local engine
+            transcript = await stage("transcribe", get_stt("google").transcribe(samples, get_capture().fs),
+                                     timeout=STAGE_TIMEOUT_MARGIN)
+            text = transcript.text.lower()
+            print(f"Transcription: {text} ({transcript.engine})")
+            run_log.log(f"Transcription: {text}", engine=transcript.engine)
+
+            # Classify with the shared precompiled yes/no matcher
+            intent, confidence = classify_local(text)
+            # There is no LLM fallback here, so a weak "ok" is asked again rather than trusted;
+            # a "not ok" always escalates, since a second prompt only delays the nurse
+            if intent == "ok" and not is_confident(intent, confidence):
+                intent = "unclear"
+            print(f"Local intent: {intent} (confidence {confidence:.2f})")
+            run_log.log(f"Detected intent: {intent}", confidence=round(confidence, 2))
+
+            if intent == "ok":
                 print("No emergency, user confirmed they are okay.")
-                tts = gTTS(text="Okay, sorry to disturb you. Enjoy the rest of your day.", lang='en')
-                tts.save("no_emergency.mp3")
-                subprocess.run(["ffmpeg", "-y", "-i", "no_emergency.mp3", "-af", "volume=1.5", "no_emergency.wav"], check=True)
-                wave_obj = sa.WaveObject.from_wave_file("no_emergency.wav")
-                play_obj = wave_obj.play()
-                play_obj.wait_done()
+                run_log.log("Action: False alarm - No action needed")
+                await play_phrase("Okay, sorry to disturb you. Enjoy the rest of your day.")
                 return True
-            elif yes_count > no_count:
-                call_for_help()
+            elif intent == "not_ok":
+                run_log.emergency("Action: Emergency confirmed - Help needed")
+                await call_for_help(run_log)
                 return True
             else:
                 raise sr.UnknownValueError("Unrecognized response")
 
         except sr.UnknownValueError:
             print("No or minimal input detected.")
-            return False
-        except sr.RequestError as e:
-            print(f"Could not request results from Google Speech Recognition service; {e}")
+            run_log.log("Could not understand audio")
             return False
 
     except Exception as e:
         print(f"Error in record_and_analyze_response: {e}")
         return False
 
-def call_for_help():
-    url = "https://724cu8r3wk.execute-api.ca-central-1.amazonaws.com/Prod/outcall"
-    headers = {'Content-Type': 'application/json'}
-    data = {
-        "emergencyPhoneNumber": EMERGENCYNUMBER,
-        "emergencyFirstname": "SRR",
-        "userFirstName": "Clay",
-        "userLastName": ""
-    }
-    response = requests.post(url, json=data, headers=headers)
-    print(f"Emergency request sent, response status code: {response.status_code}")
-    tts = gTTS(text="Ok don't worry, the nurse is coming to help you. Please remain calm.", lang='en')
-    tts.save("emergency.mp3")
-    subprocess.run(["ffmpeg", "-y", "-i", "emergency.mp3", "-af", "volume=1.5", "emergency.wav"], check=True)
-    wave_obj = sa.WaveObject.from_wave_file("emergency.wav")
-    play_obj = wave_obj.play()
-    play_obj.wait_done()
+async def call_for_help(run_log):
+    try:
+        status_code = await stage("outcall", asyncio.to_thread(emergency.call_for_help, EMERGENCYNUMBER, user_first_name="Clay"))
+    except StageTimeout:
+        status_code = None
+    run_log.emergency(f"Emergency call initiated with status code: {status_code}", status_code=status_code)
+    await play_phrase("Ok don't worry, the nurse is coming to help you. Please remain calm.")
 
 # Catches Ctrl+C event
 def signal_handler(sig, frame):
@@ -244,6 +189,23 @@ client.on_connect = on_connect
 client.on_message = on_message
 client.loop_start()
 
+# Spans, counters and fall queue gauges on /metrics when TRACING=1
+tracing.add_collector(fall_queue.metrics)
+tracing.start()
+
+# Open the speaker and keep the microphone open now, so a wrong device fails at startup and a
+# check-in's answer is read from memory, not a fresh device open
+get_engine()
+get_capture().start()
+# Load the local speech engine now rather than on the first fall
+get_stt("google")
+
+# Keep a warm connection to the outcall endpoint for the whole session
+emergency.get_client().start_keepalive()
+
+# Pack finished runs into compressed segments in the background (RUNS_ARCHIVE=1)
+start_archiver()
+
 # Keeping the script running
 while True:
     time.sleep(1)  # Reduced to only sleep, no more memory logging
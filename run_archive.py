@@ -0,0 +1,370 @@
+"""
+Compaction and retention for the runs/ directory.
+
+Completed run folders are packed into segment files under runs_archive/: one zip per batch
+of runs, with recordings re-encoded as FLAC (or Opus) and logs converted to JSON lines.
+A zip's central directory lets a single member be read without unpacking the segment, and
+index.json maps every archived run to its segment. Source folders are deleted only after
+their segment has been written and verified. Retention then drops the oldest segments
+until the archive is within its size and age limits.
+
+Archiving is opt-in: the entry points only start it with RUNS_ARCHIVE=1, and retention is off
+unless RUNS_ARCHIVE_MAX_MB or RUNS_ARCHIVE_MAX_DAYS is set. Only runs started after the first
+compaction (recorded in runs_archive/since) are ever packed, and never a folder git tracks, so
+the recorded corpus the benches read is left alone.
+
+r1.py, hub.py and the wake word listener may all archive the same runs/ folder, so compaction
+and retention hold an flock on runs_archive/.lock and re-read index.json under it.
+
+The flac profile is lossless: 16-bit recordings keep their rate and channel count, and
+anything else is stored as the original WAV. The opus profile is lossy and downmixes to
+16 kHz mono.
+
+Usage:
+    python run_archive.py compact            # pack completed runs, then apply retention
+    python run_archive.py list
+    python run_archive.py show run_20250520_083651
+"""
+import argparse
+import contextlib
+import fcntl
+import io
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+import zipfile
+from datetime import datetime
+
+from run_logger import LOG_FILENAME, read_run_log
+
+RUNS_DIR = os.getenv("RUNS_DIR", "runs")
+ARCHIVE_DIR = os.getenv("RUNS_ARCHIVE_DIR", "runs_archive")
+
+PROFILES = {
+    # name: (soundfile format, soundfile subtype, file extension, sample rate or None to keep)
+    "flac": ("FLAC", "PCM_16", "flac", None),
+    "opus": ("OGG", "OPUS", "ogg", 16000),
+}
+
+
+def run_started(name):
+    """Start time encoded in a run_YYYYmmdd_HHMMSS[_n] folder name, or None"""
+    try:
+        return datetime.strptime(name[len("run_"):len("run_YYYYmmdd_HHMMSS")], "%Y%m%d_%H%M%S")
+    except ValueError:
+        return None
+
+
+def encode_audio(path, profile):
+    import soundfile as sf
+    from audio_utils import read_wav, resample
+
+    fmt, subtype, ext, rate = PROFILES[profile]
+    if rate:
+        samples, src_rate = read_wav(path)  # mono
+        samples = resample(samples, src_rate, rate)
+    else:
+        if sf.info(path).subtype != "PCM_16":
+            raise ValueError("not 16-bit PCM")
+        samples, src_rate = sf.read(path, dtype="int16")  # every channel, bit for bit
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, rate or src_rate, format=fmt, subtype=subtype)
+    return ext, buffer.getvalue()
+
+
+class ArchivedRun:
+    """Read-only view of one run inside a segment"""
+    def __init__(self, archive, name, entry):
+        self.archive = archive
+        self.name = name
+        self.segment = entry["segment"]
+        self.files = entry["files"]
+
+    def read(self, filename):
+        with zipfile.ZipFile(os.path.join(self.archive.archive_dir, self.segment)) as zf:
+            return zf.read(f"{self.name}/{filename}")
+
+    def log(self):
+        """Log records, as returned by run_logger.read_run_log()"""
+        if LOG_FILENAME not in self.files:
+            return []
+        lines = self.read(LOG_FILENAME).decode("utf-8").splitlines()
+        return [json.loads(line) for line in lines if line]
+
+    def audio(self, name):
+        """
+        Decode an archived recording, e.g. audio("wake_word").
+        Returns:
+            (int16 samples, shaped (frames, channels) for multi-channel recordings, sample_rate)
+        """
+        import soundfile as sf
+
+        filename = next((f for f in self.files if os.path.splitext(f)[0] == name), None)
+        if filename is None:
+            raise KeyError(f"{self.name} has no recording named {name}")
+        samples, rate = sf.read(io.BytesIO(self.read(filename)), dtype="int16")
+        return samples, rate
+
+
+class RunArchive:
+    def __init__(self, archive_dir=ARCHIVE_DIR, runs_dir=RUNS_DIR, profile=None, segment_runs=250,
+                 min_age=600, max_bytes=None, max_age_days=None):
+        self.archive_dir = archive_dir
+        self.runs_dir = runs_dir
+        self.profile = profile or os.getenv("RUNS_ARCHIVE_FORMAT", "flac")
+        self.segment_runs = segment_runs
+        self.min_age = min_age  # seconds a folder must be untouched before it counts as complete
+        # No limit (None) unless configured
+        if max_bytes is None and os.getenv("RUNS_ARCHIVE_MAX_MB"):
+            max_bytes = int(float(os.getenv("RUNS_ARCHIVE_MAX_MB")) * 1024 * 1024)
+        if max_age_days is None and os.getenv("RUNS_ARCHIVE_MAX_DAYS"):
+            max_age_days = float(os.getenv("RUNS_ARCHIVE_MAX_DAYS"))
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.index_path = os.path.join(archive_dir, "index.json")
+        self.since_path = os.path.join(archive_dir, "since")
+        self.lock_path = os.path.join(archive_dir, ".lock")
+        self.lock = threading.Lock()
+        os.makedirs(archive_dir, exist_ok=True)
+        self.index = self._load_index()
+        self._thread = None
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_index(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.index_path)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Exclusive across threads and processes; the index is re-read since another process may have changed it"""
+        with self.lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self.index = self._load_index()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # Reader API
+
+    def runs(self):
+        """Archived run names, oldest first"""
+        return sorted(self.index)
+
+    def get(self, name):
+        entry = self.index.get(name)
+        return ArchivedRun(self, name, entry) if entry else None
+
+    # Compaction
+
+    def since(self):
+        """Start of the first compaction ("YYYYmmdd_HHMMSS"); runs started earlier are never packed"""
+        if not os.path.exists(self.since_path):
+            with open(self.since_path, "w", encoding="utf-8") as f:
+                f.write(datetime.now().strftime("%Y%m%d_%H%M%S"))
+        with open(self.since_path, encoding="utf-8") as f:
+            return f.read().strip()
+
+    def tracked_runs(self):
+        """Run folders with files under git version control (empty outside a checkout)"""
+        try:
+            out = subprocess.run(["git", "-C", self.runs_dir, "ls-files", "-z", "."], capture_output=True,
+                                 check=True, timeout=60).stdout.decode("utf-8", errors="ignore")
+        except (OSError, subprocess.SubprocessError):
+            return set()
+        return {path.split("/", 1)[0] for path in out.split("\0") if path}
+
+    def completed_runs(self):
+        """Run folders old enough that nothing is still writing to them, oldest first"""
+        if not os.path.isdir(self.runs_dir):
+            return []
+        now = time.time()
+        completed = []
+        for name in sorted(os.listdir(self.runs_dir)):
+            path = os.path.join(self.runs_dir, name)
+            if not os.path.isdir(path) or run_started(name) is None:
+                continue
+            newest = max([os.path.getmtime(path)] + [os.path.getmtime(os.path.join(path, f)) for f in os.listdir(path)])
+            if now - newest >= self.min_age:
+                completed.append(name)
+        return completed
+
+    def _pack_run(self, zf, name):
+        path = os.path.join(self.runs_dir, name)
+        files = {}
+        records = read_run_log(path)
+        if records:
+            data = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+            zf.writestr(f"{name}/{LOG_FILENAME}", data, compress_type=zipfile.ZIP_DEFLATED)
+            files[LOG_FILENAME] = len(data)
+        for filename in sorted(os.listdir(path)):
+            source = os.path.join(path, filename)
+            if filename.startswith("interaction_log.") or not os.path.isfile(source):
+                continue
+            if filename.endswith(".wav"):
+                try:
+                    ext, data = encode_audio(source, self.profile)
+                except (ValueError, EOFError, RuntimeError) as e:
+                    print(f"Archiving {source} as-is: {e}")
+                else:
+                    # Already compressed, so store rather than deflate
+                    member = f"{os.path.splitext(filename)[0]}.{ext}"
+                    zf.writestr(f"{name}/{member}", data, compress_type=zipfile.ZIP_STORED)
+                    files[member] = len(data)
+                    continue
+            with open(source, "rb") as f:
+                data = f.read()
+            zf.writestr(f"{name}/{filename}", data, compress_type=zipfile.ZIP_DEFLATED)
+            files[filename] = len(data)
+        return files
+
+    def compact(self, limit=None):
+        """
+        Pack completed runs into new segments and delete the source folders.
+        Returns:
+            dict with runs archived, segments written and bytes before/after
+        """
+        with self._locked():
+            since, tracked = self.since(), self.tracked_runs()
+            pending = [name for name in self.completed_runs()
+                       if name not in self.index and name not in tracked and name[len("run_"):] >= since]
+            if limit:
+                pending = pending[:limit]
+            stats = {"runs": 0, "segments": 0, "source_bytes": 0, "archive_bytes": 0}
+            for i in range(0, len(pending), self.segment_runs):
+                batch = pending[i:i + self.segment_runs]
+                segment = f"segment_{batch[0][len('run_'):]}_{batch[-1][len('run_'):]}.zip"
+                segment_path = os.path.join(self.archive_dir, segment)
+                tmp = segment_path + ".tmp"
+                entries = {}
+                with zipfile.ZipFile(tmp, "w") as zf:
+                    for name in batch:
+                        entries[name] = {"segment": segment, "files": self._pack_run(zf, name)}
+                with zipfile.ZipFile(tmp) as zf:
+                    bad = zf.testzip()
+                if bad:
+                    os.remove(tmp)
+                    raise IOError(f"Segment {segment} failed verification at {bad}")
+                with open(tmp, "rb") as f:
+                    os.fsync(f.fileno())
+                os.replace(tmp, segment_path)
+                self.index.update(entries)
+                self._save_index()
+
+                for name in batch:
+                    source = os.path.join(self.runs_dir, name)
+                    stats["source_bytes"] += sum(os.path.getsize(os.path.join(source, f)) for f in os.listdir(source))
+                    shutil.rmtree(source)
+                stats["runs"] += len(batch)
+                stats["segments"] += 1
+                stats["archive_bytes"] += os.path.getsize(segment_path)
+            return stats
+
+    # Retention
+
+    def segments(self):
+        """(segment, size in bytes, newest run start) for every segment, oldest first"""
+        newest = {}
+        for name, entry in self.index.items():
+            newest[entry["segment"]] = max(newest.get(entry["segment"], name), name)
+        return [(segment, os.path.getsize(os.path.join(self.archive_dir, segment)), run_started(last))
+                for segment, last in sorted(newest.items(), key=lambda item: item[1])
+                if os.path.exists(os.path.join(self.archive_dir, segment))]
+
+    def apply_retention(self):
+        """Drop the oldest segments beyond the age limit or until the archive fits max_bytes"""
+        with self._locked():
+            segments = self.segments()
+            total = sum(size for _, size, _ in segments)
+            cutoff = time.time() - self.max_age_days * 86400 if self.max_age_days is not None else None
+            removed = []
+            for segment, size, newest in segments:
+                too_old = cutoff is not None and newest is not None and newest.timestamp() < cutoff
+                if not too_old and (self.max_bytes is None or total <= self.max_bytes):
+                    break
+                os.remove(os.path.join(self.archive_dir, segment))
+                total -= size
+                removed.append(segment)
+            if removed:
+                self.index = {name: entry for name, entry in self.index.items() if entry["segment"] not in removed}
+                self._save_index()
+            return removed
+
+    def start(self, interval=3600):
+        """Compact and apply retention periodically on a background thread"""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    stats = self.compact()
+                    removed = self.apply_retention()
+                    if stats["runs"] or removed:
+                        print(f"Run archive: packed {stats['runs']} runs, removed {len(removed)} old segments")
+                except Exception as e:
+                    print(f"Run archive error: {e}")
+                time.sleep(interval)
+
+        self._thread = threading.Thread(target=loop, name="run-archiver", daemon=True)
+        self._thread.start()
+
+
+def start_archiver(interval=3600):
+    """Start background archiving if RUNS_ARCHIVE=1 (off by default); returns the RunArchive or None"""
+    if os.getenv("RUNS_ARCHIVE", "0") != "1":
+        return None
+    archive = RunArchive()
+    archive.start(interval)
+    return archive
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact, prune and read archived runs")
+    parser.add_argument("command", choices=["compact", "list", "show"])
+    parser.add_argument("run", nargs="?", help="Run name for show")
+    parser.add_argument("--runs-dir", default=RUNS_DIR)
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--format", choices=list(PROFILES), help="Audio format (default: RUNS_ARCHIVE_FORMAT or flac)")
+    parser.add_argument("--min-age", type=float, default=600, help="Seconds since last write before a run is packed")
+    parser.add_argument("--limit", type=int, help="Pack at most this many runs")
+    args = parser.parse_args()
+
+    archive = RunArchive(args.archive_dir, args.runs_dir, profile=args.format, min_age=args.min_age)
+    if args.command == "compact":
+        start = time.monotonic()
+        stats = archive.compact(limit=args.limit)
+        removed = archive.apply_retention()
+        ratio = stats["archive_bytes"] / stats["source_bytes"] if stats["source_bytes"] else 0
+        print(f"Packed {stats['runs']} runs into {stats['segments']} segments in {time.monotonic() - start:.1f}s: "
+              f"{stats['source_bytes'] / 1e6:.1f} MB -> {stats['archive_bytes'] / 1e6:.1f} MB ({ratio:.0%})")
+        print(f"Retention removed {len(removed)} segments")
+    elif args.command == "list":
+        for segment, size, newest in archive.segments():
+            print(f"{segment}  {size / 1e6:.1f} MB  newest run {newest}")
+        print(f"{len(archive.runs())} archived runs")
+    else:
+        run = archive.get(args.run)
+        if run is None:
+            print(f"{args.run} is not archived")
+            return 1
+        print(f"{run.name} in {run.segment}: {', '.join(run.files)}")
+        for record in run.log():
+            print(f"[{record['ts']}] {record['msg']}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,292 @@
+"""
+Incremental SQLite index over run logs for latency and outcome analytics.
+
+Each run (live folder in runs/ or packed in runs_archive/) is parsed once into a row of
+runs plus its stage latencies in stages; later updates only re-parse runs whose log
+changed. Rows for runs removed by archive retention are kept, so history outlives the
+audio. Queries read the index and never walk the run folders.
+
+Usage:
+    python run_index.py update
+    python run_index.py outcomes --since 2025-05-01
+    python run_index.py latency --stage prompt_to_intent
+    python run_index.py series --bucket day
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from run_archive import ARCHIVE_DIR, RUNS_DIR, RunArchive, run_started
+from run_logger import LEGACY_LOG_FILENAME, LOG_FILENAME, read_run_log
+
+INDEX_PATH = os.getenv("RUNS_INDEX_PATH", "runs_index.sqlite")
+# Bumped whenever parse_run() changes, so the next update re-parses every run still on disk
+PARSER_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run TEXT PRIMARY KEY,
+    signature TEXT NOT NULL,
+    started TEXT,
+    kind TEXT,
+    outcome TEXT,
+    attempts INTEGER,
+    emergency_status INTEGER,
+    transcription TEXT,
+    duration_ms REAL
+);
+CREATE TABLE IF NOT EXISTS stages (
+    run TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    ms REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started);
+CREATE INDEX IF NOT EXISTS stages_stage ON stages (stage, run);
+"""
+
+# (stage, message prefix that starts it, message prefix that ends it)
+STAGE_MARKERS = [
+    ("record", "Starting audio recording", "Audio recording saved"),
+    ("transcribe", "Starting audio transcription", "Transcription:"),
+    ("classify", "Starting intent classification", "Detected intent:"),
+    ("outcall", "Action: Emergency confirmed", "Emergency call initiated"),
+    ("outcall", "Action: Maximum attempts reached", "Emergency call initiated"),
+    ("outcall", "Action: No response after two prompts", "Emergency call initiated"),
+]
+
+
+def record_time(record):
+    """Seconds for a record: monotonic clock when present, else the wall-clock timestamp"""
+    if "mono" in record:
+        return record["mono"]
+    return datetime.fromisoformat(record["ts"]).timestamp()
+
+
+def run_kind(records):
+    """fall_checkin, wake_word or other: the first record's kind, or its opening line for older logs"""
+    if "kind" in records[0]:
+        return records[0]["kind"]
+    messages = [r["msg"] for r in records]
+    if "Wake word detected!" in messages or any(m.startswith("Heard:") for m in messages):
+        return "wake_word"
+    if "=== Starting new interaction ===" in messages or any(m.startswith("Action:") for m in messages):
+        return "fall_checkin"
+    if "Could not understand audio" in messages:
+        return "wake_word"  # the listener's runs where nothing was heard
+    return "other"
+
+
+def parse_run(records):
+    """
+    Summarise one run's log records.
+    Returns:
+        (row dict for the runs table, list of (stage, ms))
+    """
+    messages = [r["msg"] for r in records]
+    times = [record_time(r) for r in records]
+    start = times[0]
+    kind = run_kind(records)
+    checkin = kind == "fall_checkin"
+
+    def first(prefix, after=0):
+        return next((i for i in range(after, len(messages)) if messages[i].startswith(prefix)), None)
+
+    stages = []
+    for stage, begin, end in STAGE_MARKERS:
+        i = first(begin)
+        while i is not None:
+            j = first(end, i + 1)
+            if j is None:
+                break
+            stages.append((stage, (times[j] - times[i]) * 1000))
+            i = first(begin, j + 1)
+    # The wake word listener logs router intents too; only a check-in's count here
+    intent_at = first("Detected intent:") if checkin else None
+    if intent_at is not None:
+        stages.append(("prompt_to_intent", (times[intent_at] - start) * 1000))
+    for record in records:
+        # Scheduler stage offsets logged by voiceassistant at the end of an interaction
+        for stage in record.get("stages", []):
+            stages.append((stage["stage"], stage["step_ms"]))
+
+    intents = [m.split(":", 1)[1].strip() for m in messages if checkin and m.startswith("Detected intent:")]
+    status = next((m.rsplit(":", 1)[1].strip() for m in messages if m.startswith("Emergency call initiated")), None)
+    if any(m.startswith(("Action: Maximum attempts reached", "Action: No response after two prompts")) for m in messages):
+        outcome = "escalated"
+    elif any(m.startswith("Action: Emergency confirmed") for m in messages):
+        outcome = "not_ok"
+    elif any(m.startswith("Action: False alarm") for m in messages):
+        outcome = "ok"
+    elif intents:
+        outcome = intents[-1]
+    elif "Wake word detected!" in messages:
+        outcome = "wake"
+    elif any(m.startswith("Heard:") for m in messages):
+        outcome = "heard"
+    elif "Could not understand audio" in messages:
+        outcome = "no_speech"
+    else:
+        outcome = "unknown"
+
+    row = {
+        "started": datetime.fromisoformat(records[0]["ts"]).isoformat(sep=" ", timespec="seconds"),
+        "kind": kind,
+        "outcome": outcome,
+        "attempts": len(intents),
+        "emergency_status": int(status) if status and status.isdigit() else None,
+        "transcription": next((m.split(":", 1)[1].strip() for m in messages if m.startswith("Transcription:")), None),
+        "duration_ms": (times[-1] - start) * 1000,
+    }
+    return row, stages
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+class RunIndex:
+    def __init__(self, path=INDEX_PATH, runs_dir=RUNS_DIR, archive_dir=ARCHIVE_DIR):
+        self.runs_dir = runs_dir
+        self.archive_dir = archive_dir
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != PARSER_VERSION:
+            # Rows of pruned runs stay as they are; everything else is parsed again
+            with self.db:
+                self.db.execute("UPDATE runs SET signature = ''")
+            self.db.execute(f"PRAGMA user_version = {PARSER_VERSION}")
+
+    def _sources(self):
+        """(run name, signature, loader) for every live and archived run"""
+        if os.path.isdir(self.runs_dir):
+            for entry in os.scandir(self.runs_dir):
+                if not entry.is_dir() or run_started(entry.name) is None:
+                    continue
+                for filename in (LOG_FILENAME, LEGACY_LOG_FILENAME):
+                    log_path = os.path.join(entry.path, filename)
+                    if os.path.exists(log_path):
+                        st = os.stat(log_path)
+                        yield entry.name, f"{filename}:{st.st_mtime_ns}:{st.st_size}", lambda path=entry.path: read_run_log(path)
+                        break
+        if os.path.exists(os.path.join(self.archive_dir, "index.json")):
+            archive = RunArchive(self.archive_dir, self.runs_dir)
+            for name in archive.runs():
+                run = archive.get(name)
+                yield name, f"archive:{run.segment}", run.log
+
+    def update(self):
+        """Index new and changed runs; returns (runs parsed, runs skipped)"""
+        known = dict(self.db.execute("SELECT run, signature FROM runs"))
+        parsed = skipped = 0
+        for name, signature, load in self._sources():
+            previous = known.get(name)
+            # A run packed into the archive has the same log it had as a folder
+            if previous == signature or (previous and signature.startswith("archive:")):
+                skipped += 1
+                continue
+            records = load()
+            if not records:
+                continue
+            row, stages = parse_run(records)
+            with self.db:
+                self.db.execute("DELETE FROM stages WHERE run = ?", (name,))
+                self.db.execute(
+                    "INSERT OR REPLACE INTO runs VALUES (:run, :signature, :started, :kind, :outcome, :attempts, "
+                    ":emergency_status, :transcription, :duration_ms)",
+                    {"run": name, "signature": signature, **row})
+                self.db.executemany("INSERT INTO stages VALUES (?, ?, ?)", [(name, s, ms) for s, ms in stages])
+            parsed += 1
+        return parsed, skipped
+
+    @staticmethod
+    def _window(since, until, column="started"):
+        clauses, params = [], []
+        if since:
+            clauses.append(f"{column} >= ?")
+            params.append(since)
+        if until:
+            clauses.append(f"{column} < ?")
+            params.append(until)
+        return (" AND " + " AND ".join(clauses) if clauses else ""), params
+
+    def outcomes(self, since=None, until=None):
+        """[(kind, outcome, count)]"""
+        where, params = self._window(since, until)
+        return self.db.execute(
+            f"SELECT kind, outcome, COUNT(*) FROM runs WHERE 1{where} GROUP BY kind, outcome ORDER BY kind, COUNT(*) DESC",
+            params).fetchall()
+
+    def latency(self, stage=None, since=None, until=None):
+        """{stage: {count, mean, p50, p95, p99, max}} in milliseconds"""
+        where, params = self._window(since, until, "runs.started")
+        if stage:
+            where += " AND stages.stage = ?"
+            params.append(stage)
+        values = {}
+        for name, ms in self.db.execute(
+                f"SELECT stages.stage, stages.ms FROM stages JOIN runs USING (run) WHERE 1{where} ORDER BY stages.ms",
+                params):
+            values.setdefault(name, []).append(ms)
+        return {name: {"count": len(v), "mean": sum(v) / len(v), "p50": percentile(v, 50), "p95": percentile(v, 95),
+                       "p99": percentile(v, 99), "max": v[-1]}
+                for name, v in sorted(values.items())}
+
+    def series(self, bucket="day", outcome=None, since=None, until=None):
+        """[(bucket start, runs, escalations, median duration ms)] per hour or day"""
+        width = {"hour": 13, "day": 10}[bucket]
+        where, params = self._window(since, until)
+        if outcome:
+            where += " AND outcome = ?"
+            params.append(outcome)
+        rows = {}
+        for started, run_outcome, duration in self.db.execute(
+                f"SELECT started, outcome, duration_ms FROM runs WHERE 1{where} ORDER BY started", params):
+            rows.setdefault(started[:width], []).append((run_outcome, duration))
+        return [(key, len(v), sum(1 for o, _ in v if o == "escalated"), percentile(sorted(d for _, d in v), 50))
+                for key, v in rows.items()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query latency and outcome history across runs")
+    parser.add_argument("command", choices=["update", "outcomes", "latency", "series"])
+    parser.add_argument("--index", default=INDEX_PATH, help="SQLite index path")
+    parser.add_argument("--runs-dir", default=RUNS_DIR)
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--since", help="Only runs started at or after this date/time (YYYY-MM-DD[ HH:MM:SS])")
+    parser.add_argument("--until", help="Only runs started before this date/time")
+    parser.add_argument("--stage", help="Latency for a single stage")
+    parser.add_argument("--outcome", help="Series for a single outcome")
+    parser.add_argument("--bucket", choices=["hour", "day"], default="day")
+    parser.add_argument("--no-update", action="store_true", help="Query the index as-is")
+    args = parser.parse_args()
+
+    index = RunIndex(args.index, args.runs_dir, args.archive_dir)
+    if args.command == "update" or not args.no_update:
+        start = time.monotonic()
+        parsed, skipped = index.update()
+        print(f"Indexed {parsed} runs ({skipped} unchanged) in {(time.monotonic() - start) * 1000:.0f} ms")
+
+    if args.command == "outcomes":
+        for kind, outcome, count in index.outcomes(args.since, args.until):
+            print(f"{kind:<14} {outcome:<10} {count:>6}")
+    elif args.command == "latency":
+        print(f"{'Stage':<28} {'Count':>6} {'Mean':>9} {'P50':>9} {'P95':>9} {'P99':>9} {'Max':>9}  (ms)")
+        for stage, s in index.latency(args.stage, args.since, args.until).items():
+            print(f"{stage:<28} {s['count']:>6} {s['mean']:>9.0f} {s['p50']:>9.0f} {s['p95']:>9.0f} "
+                  f"{s['p99']:>9.0f} {s['max']:>9.0f}")
+    elif args.command == "series":
+        print(f"{'Bucket':<14} {'Runs':>6} {'Escalated':>10} {'Median ms':>10}")
+        for key, runs, escalated, median in index.series(args.bucket, args.outcome, args.since, args.until):
+            print(f"{key:<14} {runs:>6} {escalated:>10} {median:>10.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,160 @@
+"""
+Buffered, structured run logging.
+
+log() only appends to an in-memory buffer; a background thread writes the buffer to the run's
+interaction_log.jsonl every flush interval. Each record carries the wall-clock time, a
+monotonic timestamp and any extra fields (e.g. stage durations). The file is fsynced only
+when the interaction ends or an emergency is logged. Even then the fsync happens on the flush
+thread, so an SD-card stall never delays the nurse outcall.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+LOG_FILENAME = "interaction_log.jsonl"
+LEGACY_LOG_FILENAME = "interaction_log.txt"
+
+
+def create_run_folder(root=None):
+    """Create runs/run_<timestamp> (run_<timestamp>_2, ... if runs start in the same second) and return its path"""
+    root = root or os.getenv("RUNS_DIR", "runs")
+    os.makedirs(root, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    folder_path = os.path.join(root, f"run_{timestamp}")
+    n = 1
+    while True:
+        try:
+            os.makedirs(folder_path)
+            return folder_path
+        except FileExistsError:
+            n += 1
+            folder_path = os.path.join(root, f"run_{timestamp}_{n}")
+
+
+def read_run_log(run_folder):
+    """
+    Records of a run, from interaction_log.jsonl or the older "[timestamp] message" text log.
+    Returns:
+        list of dicts with at least "ts" and "msg"; empty if the run has no log
+    """
+    path = os.path.join(run_folder, LOG_FILENAME)
+    if os.path.exists(path):
+        records = []
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # torn final line after a power cut
+        return records
+
+    path = os.path.join(run_folder, LEGACY_LOG_FILENAME)
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith("[") and "] " in line:
+                ts, message = line[1:].split("] ", 1)
+                records.append({"ts": ts, "msg": message})
+            elif line and records:
+                records[-1]["msg"] += "\n" + line  # multi-line GPT responses
+    return records
+
+
+class RunLogger:
+    def __init__(self, run_folder, flush_interval=0.5):
+        self.path = os.path.join(run_folder, LOG_FILENAME)
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.buffer_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.closed = threading.Event()
+        self.wake = threading.Event()
+        self.sync_requested = False
+        self.thread = threading.Thread(target=self._run, name="run-logger", daemon=True)
+        self.thread.start()
+
+    def log(self, message, **fields):
+        """Buffer one record; never touches the disk on the caller's thread"""
+        record = {
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "mono": round(time.monotonic(), 6),
+            "msg": message,
+        }
+        record.update(fields)
+        with self.buffer_lock:
+            self.buffer.append(record)
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """Time a block and log its duration as a stage record"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.log(f"Stage {name} finished", stage=name,
+                     duration_ms=round((time.monotonic() - start) * 1000, 1), **fields)
+
+    def emergency(self, message, **fields):
+        """Log an emergency record and have the flush thread write and fsync it right away"""
+        self.log(message, level="emergency", **fields)
+        with self.buffer_lock:
+            self.sync_requested = True
+        self.wake.set()
+
+    def flush(self, sync=False):
+        with self.buffer_lock:
+            records, self.buffer = self.buffer, []
+            # Taken with the records, so a pending emergency request can't be cleared without an fsync
+            sync, self.sync_requested = sync or self.sync_requested, False
+        with self.write_lock:
+            if self.file.closed:
+                return
+            if records:
+                self.file.write("".join(json.dumps(record) + "\n" for record in records))
+                self.file.flush()
+            if sync:
+                os.fsync(self.file.fileno())
+
+    def _run(self):
+        while not self.closed.is_set():
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+
+    def close(self):
+        """Flush everything, fsync and stop the background thread"""
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        self.wake.set()
+        self.thread.join()
+        self.flush(sync=True)
+        with self.write_lock:
+            self.file.close()
+
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+def get_run_logger(run_folder):
+    """The RunLogger for a run folder, created on first use"""
+    with _loggers_lock:
+        logger = _loggers.get(run_folder)
+        if logger is None:
+            logger = _loggers[run_folder] = RunLogger(run_folder)
+        return logger
+
+
+def close_run_logger(run_folder):
+    with _loggers_lock:
+        logger = _loggers.pop(run_folder, None)
+    if logger:
+        logger.close()
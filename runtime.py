@@ -0,0 +1,296 @@
+"""
+Shared asyncio runtime for the voice assistant entry points.
+
+One event loop runs on a background thread for the life of the process. Entry points hand
+it their flows as coroutines (run() blocks the calling thread, submit() does not), so MQTT
+callbacks and worker threads can drive the same loop. On top of it:
+    - capture_until_silence(): microphone capture from an arecord subprocess read with
+      non-blocking pipes and endpointed frame by frame
+    - play() / speak(): playback on the shared engine and streaming OpenAI TTS; cancelling
+      either interrupts the audio immediately
+    - speak_interruptible(): barge-in, the resident talking over a reply cancels it
+    - transcribe(): Whisper upload through the async OpenAI client
+    - stage(): per-stage timeouts (STAGE_TIMEOUTS, overridable with STAGE_TIMEOUT_<NAME>)
+Blocking libraries (speech_recognition, spotipy, the outcall client) are awaited through
+asyncio.to_thread() so they no longer stall everything else.
+"""
+import asyncio
+import os
+import threading
+import time
+
+import tracing
+from playback import get_engine
+from vad import Endpointer, arecord_command, save_capture
+
+STAGE_TIMEOUTS = {
+    "record": 15.0,
+    "transcribe": 20.0,
+    "classify": 15.0,
+    "route": 30.0,
+    "tts": 60.0,   # synthesis and playback of a whole reply
+    "play": 60.0,
+    "outcall": 20.0,
+    "listen": 30.0,
+}
+
+
+_stage_listeners = []
+
+
+def add_stage_listener(listener):
+    """Call listener(name, seconds, error) after every stage; error is None on success"""
+    _stage_listeners.append(listener)
+
+
+class StageTimeout(Exception):
+    def __init__(self, name, seconds):
+        super().__init__(f"{name} timed out after {seconds:.1f}s")
+        self.name = name
+        self.seconds = seconds
+
+
+def stage_timeout(name):
+    return float(os.getenv(f"STAGE_TIMEOUT_{name.upper()}", STAGE_TIMEOUTS.get(name, 30.0)))
+
+
+async def stage(name, awaitable, timeout=None):
+    """Await one pipeline stage, raising StageTimeout if it overruns its budget"""
+    timeout = stage_timeout(name) if timeout is None else timeout
+    start = time.monotonic()
+    error = None
+    try:
+        with tracing.span(name):
+            return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        print(f"Stage {name} timed out after {timeout:.1f}s")
+        error = StageTimeout(name, timeout)
+        raise error from None
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        for listener in _stage_listeners:
+            listener(name, time.monotonic() - start, error)
+
+
+class Runtime:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="asyncio-runtime", daemon=True)
+        self.thread.start()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the runtime loop; returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the runtime loop and block the calling thread for its result"""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+_async_openai = None
+
+
+def get_runtime():
+    """Process-wide runtime, started on first use"""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = Runtime()
+        return _runtime
+
+
+def get_async_openai():
+    """AsyncOpenAI client for use on the runtime loop; pools its connections across requests"""
+    global _async_openai
+    if _async_openai is None:
+        from openai import AsyncOpenAI
+
+        _async_openai = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    return _async_openai
+
+
+async def capture_until_silence(output_path, max_duration=10.0, device="plughw:3,0", fs=44100,
+                                leading_silence=3.0, trailing_silence=0.8, gate=None):
+    """
+    Async vad.record_until_silence(): same arguments and result, but the loop stays free while
+    waiting for audio and cancelling the task stops arecord immediately.
+    """
+    endpointer = Endpointer(fs=fs, leading_silence=min(leading_silence, max_duration),
+                            trailing_silence=trailing_silence, max_duration=max_duration)
+    frame_bytes = endpointer.frame_samples * 2
+
+    start = time.monotonic()
+    process = await asyncio.create_subprocess_exec(*arecord_command(device, fs), stdout=asyncio.subprocess.PIPE)
+    frames = []
+    gated_frames = 0
+    try:
+        while True:
+            try:
+                frame = await process.stdout.readexactly(frame_bytes)
+            except asyncio.IncompleteReadError as e:
+                endpointer.stop_reason = endpointer.stop_reason or "device_closed"
+                if e.partial:
+                    frames.append(e.partial)
+                break
+            if gate is not None and not gate():
+                gated_frames += 1
+                continue
+            frames.append(frame)
+            if endpointer.process(frame):
+                break
+    finally:
+        if process.returncode is None:
+            process.terminate()
+        await process.wait()
+
+    return save_capture(output_path, frames, fs, endpointer, max_duration, start, gated_frames)
+
+
+async def wait_for_speech(device="plughw:3,0", fs=16000, threshold_ratio=6.0, min_speech_ms=300, calibrated=None):
+    """
+    Return once someone starts talking; used to detect barge-in while a reply is playing.
+    Args:
+        calibrated: Optional asyncio.Event, set once the noise floor has been measured
+    """
+    endpointer = Endpointer(fs=fs, leading_silence=float("inf"), max_duration=float("inf"),
+                            threshold_ratio=threshold_ratio, min_speech_ms=min_speech_ms)
+    frame_bytes = endpointer.frame_samples * 2
+    process = await asyncio.create_subprocess_exec(*arecord_command(device, fs), stdout=asyncio.subprocess.PIPE)
+    try:
+        while not endpointer.speech_started:
+            endpointer.process(await process.stdout.readexactly(frame_bytes))
+            if calibrated is not None and endpointer.frames_seen >= endpointer.calibration_frames:
+                calibrated.set()
+    finally:
+        if process.returncode is None:
+            process.terminate()
+        await process.wait()
+
+
+async def wait_clip(clip, device=None):
+    """Await a playback Clip; cancelling interrupts playback"""
+    try:
+        await asyncio.to_thread(clip.wait)
+    except asyncio.CancelledError:
+        get_engine(device).interrupt()
+        raise
+    return not clip.interrupted
+
+
+async def play(source, rate=None, device=None):
+    """Play a WAV path, array or PCM bytes on the shared engine and await the end of playback"""
+    return await wait_clip(get_engine(device).play(source, rate), device)
+
+
+async def drain(device=None):
+    """Await everything queued on the playback engine so far"""
+    await asyncio.to_thread(get_engine(device).drain)
+
+
+async def speak(text, voice="onyx", model="tts-1", client=None, tee=None, device=None):
+    """
+    Stream OpenAI TTS into the playback engine and await the end of playback.
+    Args:
+        tee: Optional list that receives a copy of every PCM chunk (e.g. to fill the TTS cache)
+        device: Output device, default AUDIO_OUTPUT_DEVICE
+    Returns:
+        Seconds to first audio chunk, or None if nothing arrived
+    """
+    from tts_stream import open_sink
+
+    client = client or get_async_openai()
+    start = time.monotonic()
+    first_audio = None
+    received = 0
+    writer = open_sink(device)
+    tracing.count("api_calls", api="tts")
+    try:
+        async with client.audio.speech.with_streaming_response.create(
+            model=model,
+            voice=voice,
+            input=text,
+            response_format="pcm"
+        ) as response:
+            async for chunk in response.iter_bytes(4096):
+                if not chunk:
+                    continue
+                if first_audio is None:
+                    first_audio = time.monotonic() - start
+                received += len(chunk)
+                if tee is not None:
+                    tee.append(chunk)
+                writer.write(chunk)
+    except asyncio.CancelledError:
+        get_engine(device).interrupt()
+        raise
+    finally:
+        clip = writer.finish()
+        tracing.record("tts_stream", start, time.monotonic(), model=model, bytes=received,
+                       first_audio_ms=round(first_audio * 1000, 1) if first_audio is not None else None)
+    await wait_clip(clip, device)
+    return first_audio
+
+
+async def speak_interruptible(speech, device="plughw:3,0", threshold_ratio=12.0):
+    """
+    Await a speech coroutine (e.g. speak(...) or play(...)) unless the resident starts talking.
+    There is no echo reference, so the mic hears the reply too: the noise floor is measured
+    before playback starts (delaying it by about 0.3 s), and speech has to be threshold_ratio
+    times louder than the floor, twice the capture default. Loud speakers close to the mic can
+    still cut replies short; use a headset or a mic with echo cancellation there.
+    Returns:
+        True if it played to the end, False if it was cut off by barge-in
+    """
+    calibrated = asyncio.Event()
+    listening = asyncio.ensure_future(wait_for_speech(device, threshold_ratio=threshold_ratio, calibrated=calibrated))
+    calibrating = asyncio.ensure_future(calibrated.wait())
+    await asyncio.wait({listening, calibrating}, timeout=1.0, return_when=asyncio.FIRST_COMPLETED)
+    calibrating.cancel()
+    if listening.done() or not calibrated.is_set():
+        # The mic isn't usable (or is too slow to start): play without barge-in
+        print("Barge-in unavailable, playing the reply uninterrupted")
+        listening.cancel()
+        await speech
+        return True
+    speaking = asyncio.ensure_future(speech)
+    try:
+        done, _ = await asyncio.wait({speaking, listening}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (speaking, listening):
+            if not task.done():
+                task.cancel()
+    if speaking in done:
+        speaking.result()
+        return True
+    print("Barge-in: reply interrupted")
+    return False
+
+
+async def transcribe(audio_path, profile=None, model="whisper-1", client=None):
+    """Async stt_upload.transcribe(): returns (text, stats)"""
+    from stt_upload import encode_for_upload, upload_profile
+
+    client = client or get_async_openai()
+    start = time.monotonic()
+    filename, data = await asyncio.to_thread(encode_for_upload, audio_path, profile)
+    encoded = time.monotonic()
+    tracing.count("api_calls", api="whisper")
+    transcript = await client.audio.transcriptions.create(model=model, file=(filename, data))
+    done = time.monotonic()
+    tracing.record("whisper", encoded, done, bytes=len(data))
+    return transcript.text, {
+        "profile": profile or upload_profile(),
+        "bytes": len(data),
+        "original_bytes": os.path.getsize(audio_path),
+        "encode_ms": (encoded - start) * 1000,
+        "request_ms": (done - encoded) * 1000,
+    }
@@ -0,0 +1,276 @@
+"""
+Pluggable speech-to-text for the fall check-in, with an offline engine and a race/hedge policy.
+
+Backends share one small async interface:
+    name, local                      -- local backends need no network
+    await transcribe(samples, rate)  -- text of a mono int16 recording ("" if nothing was heard)
+Available backends:
+    whisper  -- OpenAI whisper-1 through the shared async client
+    google   -- speech_recognition's Google Web Speech endpoint
+    sphinx   -- PocketSphinx on the CPU, decoding against a small grammar of check-in answers
+                (pip install pocketsphinx; the English model ships with the package)
+
+SpeechToText runs a cloud and a local backend under the policy named by STT_POLICY:
+    cloud  -- cloud only, the old behaviour (default)
+    local  -- local only
+    race   -- start both, take the first result whose intent is confident enough
+    hedge  -- start both, prefer the cloud answer; a local "not ok" is accepted once the cloud
+              has failed or missed STT_CLOUD_DEADLINE seconds
+The grammar forces every sound, noise included, onto some answer, so the local engine has no
+usable confidence. Its transcript is only ever used to escalate: anything else it hears comes
+back empty (unclear), and the check-in waits for the cloud or asks again. A slow network can
+make help come sooner, but it can never turn a fall into a false alarm.
+"""
+import asyncio
+import os
+import threading
+import time
+
+import numpy as np
+
+import tracing
+from audio_utils import read_wav, resample
+from intent_fastpath import CONFIDENT, classify_local, is_confident
+
+POLICIES = ("cloud", "local", "race", "hedge")
+DEFAULT_POLICY = "cloud"
+CLOUD_DEADLINE = 3.0
+SPHINX_SAMPLE_RATE = 16000
+
+# What residents actually answer, plus the prompt itself in case the speaker bleeds into the recording
+CHECKIN_GRAMMAR = """#JSGF V1.0;
+grammar checkin;
+public <utterance> = [<prompt>] <answer> [<answer>];
+<prompt> = [hi | hello | hey] [resident name] did you fall [down];
+<answer> = yes | yeah | yep | yup | no | nope | nah
+         | i did | i did not | i didn't | i didn't fall | i fell | i have fallen
+         | help | help me | please help | i need help | call for help
+         | i'm okay | i'm ok | i'm fine | i'm alright | i'm good | i'm hurt | i can't get up
+         | what;
+"""
+PROMPT_ENDINGS = ("did you fall down", "did you fall")
+# The only intents a local transcript may decide; an "ok" from the grammar is never trusted
+LOCAL_INTENTS = ("not_ok",)
+
+
+class Transcript:
+    """One backend's answer, scored with the local intent matcher; heard is a withheld local transcript"""
+    def __init__(self, text, engine, seconds, error=None, heard=None):
+        self.text = text or ""
+        self.engine = engine
+        self.seconds = seconds
+        self.error = error
+        self.heard = heard
+        self.intent, self.confidence = classify_local(self.text)
+
+    def confident(self, threshold=CONFIDENT):
+        return self.error is None and is_confident(self.intent, self.confidence, threshold)
+
+
+class WhisperBackend:
+    name = "whisper"
+    local = False
+
+    def __init__(self, model="whisper-1", client=None):
+        self.model = model
+        self.client = client
+
+    async def transcribe(self, samples, rate):
+        from runtime import get_async_openai
+        from stt_upload import encode_samples
+
+        filename, data = await asyncio.to_thread(encode_samples, samples, rate)
+        tracing.count("api_calls", api="whisper")
+        transcript = await (self.client or get_async_openai()).audio.transcriptions.create(
+            model=self.model, file=(filename, data))
+        return transcript.text
+
+
+class GoogleBackend:
+    name = "google"
+    local = False
+
+    async def transcribe(self, samples, rate):
+        import speech_recognition as sr
+
+        audio = sr.AudioData(np.asarray(samples, dtype=np.int16).tobytes(), rate, 2)
+        tracing.count("api_calls", api="google")
+        try:
+            return await asyncio.to_thread(sr.Recognizer().recognize_google, audio)
+        except sr.UnknownValueError:
+            return ""
+
+
+class SphinxBackend:
+    """
+    PocketSphinx restricted to CHECKIN_GRAMMAR, entirely on the CPU.
+    Args:
+        grammar: JSGF grammar of what the resident may say
+        bestpath: Rescore the lattice at the end of the utterance; slightly more accurate, but one
+            call that holds the CPU (and the GIL) for seconds on long recordings
+    """
+    name = "sphinx"
+    local = True
+    block = SPHINX_SAMPLE_RATE // 5  # samples per decoder call: short GIL holds, and a chance to stop
+
+    def __init__(self, grammar=CHECKIN_GRAMMAR, bestpath=False):
+        from pocketsphinx import Decoder
+
+        self.decoder = Decoder(samprate=SPHINX_SAMPLE_RATE, lm=None, loglevel="FATAL", bestpath=bestpath)
+        self.decoder.add_jsgf_string("checkin", grammar)
+        self.decoder.activate_search("checkin")
+        self.lock = threading.Lock()  # one decoder, one utterance at a time
+
+    def decode(self, samples, rate, cancelled=None):
+        pcm = resample(np.asarray(samples, dtype=np.int16), rate, SPHINX_SAMPLE_RATE)
+        with self.lock:
+            self.decoder.start_utt()
+            for i in range(0, len(pcm), self.block):
+                if cancelled is not None and cancelled.is_set():
+                    break
+                self.decoder.process_raw(pcm[i:i + self.block].tobytes())
+            self.decoder.end_utt()
+            hypothesis = None if cancelled is not None and cancelled.is_set() else self.decoder.hyp()
+        # Alternative pronunciations come back as "word(2)"
+        words = [word.split("(")[0] for word in hypothesis.hypstr.split()] if hypothesis else []
+        return punctuate(" ".join(words))
+
+    async def transcribe(self, samples, rate):
+        cancelled = threading.Event()
+        try:
+            return await asyncio.to_thread(self.decode, samples, rate, cancelled)
+        except asyncio.CancelledError:
+            cancelled.set()  # the worker thread can't be interrupted, but it stops at the next block
+            raise
+
+
+def punctuate(text):
+    """Mark an echoed prompt as a question, which classify_local skips: "...did you fall? no" """
+    for ending in PROMPT_ENDINGS:
+        head, found, tail = text.partition(ending)
+        if found:
+            return f"{head}{ending}?{tail}".strip()
+    return text
+
+
+BACKENDS = {"whisper": WhisperBackend, "google": GoogleBackend, "sphinx": SphinxBackend}
+
+
+class SpeechToText:
+    """
+    A cloud and a local backend combined under a policy.
+    Args:
+        cloud, local: Backends (either may be None)
+        policy: One of POLICIES (default STT_POLICY)
+        deadline: Seconds hedge waits for the cloud before it accepts a local "not ok"
+        min_confidence: Intent confidence a result needs to win a race or replace the cloud
+    """
+    def __init__(self, cloud, local=None, policy=None, deadline=None, min_confidence=CONFIDENT):
+        self.cloud = cloud
+        self.local = local
+        self.policy = policy or os.getenv("STT_POLICY", DEFAULT_POLICY)
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown STT policy {self.policy}, expected one of {POLICIES}")
+        if self.local is None:
+            self.policy = "cloud"
+        elif self.cloud is None:
+            self.policy = "local"
+        self.deadline = float(deadline if deadline is not None else os.getenv("STT_CLOUD_DEADLINE", CLOUD_DEADLINE))
+        self.min_confidence = min_confidence
+        self.wins = {}
+        self.errors = {}
+
+    async def _run(self, backend, samples, rate):
+        start = time.monotonic()
+        with tracing.span("stt", engine=backend.name) as span:
+            try:
+                text = await backend.transcribe(samples, rate)
+            except Exception as e:
+                print(f"{backend.name} transcription failed: {e}")
+                self.errors[backend.name] = self.errors.get(backend.name, 0) + 1
+                span.set(error=type(e).__name__)
+                return Transcript("", backend.name, time.monotonic() - start, error=e)
+        result = Transcript(text, backend.name, time.monotonic() - start)
+        if backend.local and result.intent not in LOCAL_INTENTS:
+            # Keep what was heard for the log, but don't let it decide the check-in
+            return Transcript("", backend.name, result.seconds, heard=result.text)
+        return result
+
+    async def transcribe(self, samples, rate):
+        """Transcribe a mono int16 recording (e.g. a capture ring view) under the policy"""
+        if self.policy == "cloud":
+            result = await self._run(self.cloud, samples, rate)
+        elif self.policy == "local":
+            result = await self._run(self.local, samples, rate)
+        else:
+            cloud = asyncio.ensure_future(self._run(self.cloud, samples, rate))
+            local = asyncio.ensure_future(self._run(self.local, samples, rate))
+            try:
+                if self.policy == "race":
+                    result = await self._race(cloud, local)
+                else:
+                    result = await self._hedge(cloud, local)
+            finally:
+                for task in (cloud, local):
+                    if not task.done():
+                        task.cancel()
+        self.wins[result.engine] = self.wins.get(result.engine, 0) + 1
+        tracing.count("stt_results", engine=result.engine)
+        return result
+
+    async def transcribe_file(self, path):
+        samples, rate = await asyncio.to_thread(read_wav, path)
+        return await self.transcribe(samples, rate)
+
+    async def _race(self, cloud, local):
+        for next_done in asyncio.as_completed((cloud, local)):
+            result = await next_done
+            if result.confident(self.min_confidence):
+                return result
+        # Nobody was confident: a working cloud transcript is still the better one
+        return cloud.result() if cloud.result().error is None else local.result()
+
+    async def _hedge(self, cloud, local):
+        await asyncio.wait({cloud}, timeout=self.deadline)
+        if cloud.done() and cloud.result().error is None:
+            return cloud.result()
+        # The cloud failed or is late: a local "not ok" ends the wait, anything else waits for the cloud
+        result = await local
+        if result.confident(self.min_confidence):
+            return result
+        cloud_result = await cloud
+        return cloud_result if cloud_result.error is None else result
+
+    def stats(self):
+        cloud = self.cloud.name if self.cloud is not None else "none"
+        stats = {f'stt_wins{{cloud="{cloud}",engine="{name}"}}': count for name, count in self.wins.items()}
+        stats.update({f'stt_errors{{cloud="{cloud}",engine="{name}"}}': count for name, count in self.errors.items()})
+        return stats
+
+
+def create_backend(name):
+    """Build a backend by name; None (with a message) if its engine is unavailable"""
+    if not name or name == "none":
+        return None
+    try:
+        return BACKENDS[name]()
+    except Exception as e:
+        print(f"STT backend {name} unavailable ({e})")
+        return None
+
+
+_stt = {}
+_stt_lock = threading.Lock()
+
+
+def get_stt(cloud="whisper"):
+    """Process-wide SpeechToText for a cloud backend, with the local engine named by STT_LOCAL_ENGINE"""
+    with _stt_lock:
+        stt = _stt.get(cloud)
+        if stt is None:
+            policy = os.getenv("STT_POLICY", DEFAULT_POLICY)
+            # The local engine is only loaded for a policy that uses it
+            local = create_backend(os.getenv("STT_LOCAL_ENGINE", "sphinx")) if policy != "cloud" else None
+            stt = _stt[cloud] = SpeechToText(create_backend(cloud), local, policy=policy)
+            tracing.add_collector(stt.stats)
+        return stt
@@ -0,0 +1,111 @@
+"""
+Compact encoding of recordings before they are uploaded for transcription.
+
+Speech only needs 16 kHz mono, so recordings are resampled in-process and encoded with the
+profile named by STT_UPLOAD_FORMAT (default flac):
+    wav   -- 16 kHz mono 16-bit WAV
+    flac  -- 16 kHz mono FLAC (lossless, roughly half the size of wav)
+    opus  -- 16 kHz mono Ogg/Opus (lossy, smallest)
+    raw   -- the original file untouched
+"""
+import io
+import os
+import time
+
+import tracing
+from audio_utils import read_wav, resample
+
+UPLOAD_SAMPLE_RATE = 16000
+
+PROFILES = {
+    # name: (soundfile format, soundfile subtype, file extension)
+    "wav": ("WAV", "PCM_16", "wav"),
+    "flac": ("FLAC", "PCM_16", "flac"),
+    "opus": ("OGG", "OPUS", "ogg"),
+}
+
+
+def upload_profile():
+    return os.getenv("STT_UPLOAD_FORMAT", "flac")
+
+
+def encode_for_upload(audio_path, profile=None, sample_rate=UPLOAD_SAMPLE_RATE):
+    """
+    Resample and encode a WAV recording for upload.
+    Args:
+        audio_path: Recorded WAV file
+        profile: One of PROFILES or "raw" (defaults to STT_UPLOAD_FORMAT)
+        sample_rate: Target sample rate
+    Returns:
+        (filename, encoded bytes) ready to pass as the file argument of an upload
+    """
+    profile = profile or upload_profile()
+    with tracing.span("encode", profile=profile) as span:
+        filename, data = _encode(audio_path, profile, sample_rate)
+        span.set(bytes=len(data))
+    tracing.count("upload_bytes", len(data), profile=profile)
+    return filename, data
+
+
+def encode_samples(samples, rate, profile=None, sample_rate=UPLOAD_SAMPLE_RATE, name="capture"):
+    """
+    encode_for_upload() for audio already in memory, e.g. a view of the capture ring.
+    The "raw" profile sends a WAV at the original rate.
+    Returns:
+        (filename, encoded bytes)
+    """
+    profile = profile or upload_profile()
+    with tracing.span("encode", profile=profile) as span:
+        if profile == "raw":
+            filename, data = _encode_samples(samples, rate, "wav", rate, name)
+        else:
+            filename, data = _encode_samples(samples, rate, profile, sample_rate, name)
+        span.set(bytes=len(data))
+    tracing.count("upload_bytes", len(data), profile=profile)
+    return filename, data
+
+
+def _encode(audio_path, profile, sample_rate):
+    if profile == "raw":
+        with open(audio_path, "rb") as f:
+            return os.path.basename(audio_path), f.read()
+    samples, rate = read_wav(audio_path)
+    return _encode_samples(samples, rate, profile, sample_rate, os.path.splitext(os.path.basename(audio_path))[0])
+
+
+def _encode_samples(samples, rate, profile, sample_rate, base):
+    import soundfile as sf
+
+    fmt, subtype, ext = PROFILES[profile]
+    samples = resample(samples, rate, sample_rate)
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, sample_rate, format=fmt, subtype=subtype)
+    return f"{base}.{ext}", buffer.getvalue()
+
+
+def transcribe(transcriptions, audio_path, profile=None, model="whisper-1"):
+    """
+    Encode a recording and send it to a Whisper transcriptions endpoint.
+    Args:
+        transcriptions: client.audio.transcriptions (or openai.audio.transcriptions)
+        audio_path: Recorded WAV file
+        profile: Upload profile (defaults to STT_UPLOAD_FORMAT)
+        model: Transcription model
+    Returns:
+        (text, stats) where stats has bytes on the wire and encode/request times in ms
+    """
+    start = time.monotonic()
+    filename, data = encode_for_upload(audio_path, profile)
+    encoded = time.monotonic()
+    tracing.count("api_calls", api="whisper")
+    transcript = transcriptions.create(model=model, file=(filename, data))
+    done = time.monotonic()
+    tracing.record("whisper", encoded, done, bytes=len(data))
+    stats = {
+        "profile": profile or upload_profile(),
+        "bytes": len(data),
+        "original_bytes": os.path.getsize(audio_path),
+        "encode_ms": (encoded - start) * 1000,
+        "request_ms": (done - encoded) * 1000,
+    }
+    return transcript.text, stats
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Microphone Capture Benchmark
+
+Compares the old r1.py recording path (open the device per call, append 1024-sample bytes
+chunks to a list, join them, write output.wav and read it back for recognition) with the
+persistent capture ring (one open device, consumers take views of the samples they need).
+A stand-in for arecord replays the runs/*/response.wav recordings at --speed times real
+time, and every mode then feeds the same consumers: the VAD endpointer over 30 ms frames,
+the last 3 s for the wake word, and a FLAC encode for the STT upload. Reports CPU time and
+Python memory per second of captured audio, disk traffic, device opens and the cost of
+getting the last few seconds as a view versus a copy.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import wave
+from pathlib import Path
+
+import numpy as np
+from prettytable import PrettyTable
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(REPO_ROOT))
+import capture
+from audio_utils import read_wav, resample
+from stt_upload import encode_samples
+from vad import Endpointer
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("CaptureBenchmark")
+
+MODES = ["frames", "ring"]
+CHUNK = 1024  # samples per read in the old PyAudio loop
+
+# Runs as the "arecord" process: loops the recordings at the requested pace until killed
+FEEDER = r'''
+import sys, time
+path, fs, speed = sys.argv[1], int(sys.argv[2]), float(sys.argv[3])
+with open(path, "rb") as f:
+    data = f.read()
+block = fs // 100 * 2
+out = sys.stdout.buffer
+period = 0.01 / speed
+deadline = time.monotonic()
+try:
+    while True:
+        for i in range(0, len(data) - block + 1, block):
+            out.write(data[i:i + block])
+            out.flush()
+            deadline += period
+            time.sleep(max(0.0, deadline - time.monotonic()))
+except (BrokenPipeError, KeyboardInterrupt):
+    pass
+'''
+
+
+def make_source(runs_dir, fs, path):
+    """Concatenate the recorded responses (or synthesize noise) as raw PCM at fs"""
+    parts = [resample(*read_wav(wav), fs) for wav in sorted(Path(runs_dir).glob("run_*/response.wav"))]
+    if not parts:
+        logger.warning(f"No recordings in {runs_dir}, using synthetic noise")
+        parts = [(np.random.default_rng(7).normal(0, 800, fs * 10)).astype(np.int16)]
+    with open(path, "wb") as f:
+        f.write(np.concatenate(parts).tobytes())
+
+
+def consume(samples, fs, wake_seconds):
+    """The work every consumer does with a capture, identical for both modes"""
+    endpointer = Endpointer(fs=fs, leading_silence=float("inf"), max_duration=float("inf"))
+    step = endpointer.frame_samples
+    for i in range(0, len(samples) - step + 1, step):
+        endpointer.process(samples[i:i + step])
+    samples[-int(wake_seconds * fs):].sum()  # touch the wake word window
+    encode_samples(samples, fs, profile="flac")
+
+
+def record_frames(command, seconds, fs, path):
+    """The old r1.py loop: fresh device, list of bytes chunks, output.wav written and read back"""
+    import subprocess
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    frames = []
+    for _ in range(int(fs / CHUNK * seconds)):
+        frames.append(process.stdout.read(CHUNK * 2))
+    process.terminate()
+    process.wait()
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(fs)
+        wf.writeframes(b"".join(frames))
+    with wave.open(path, "rb") as wf:
+        return np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+
+
+def record_ring(service, seconds):
+    start = service.position
+    end = start + int(seconds * service.fs)
+    if not service.wait(end, timeout=seconds + 5):
+        raise RuntimeError("capture stalled")
+    return service.view(start, end)
+
+
+def run_mode(mode, args, command, workdir, consumers=True, trace_memory=False):
+    output = os.path.join(workdir, "output.wav")
+    service = None
+    if mode == "ring":
+        capture.arecord_command = lambda device, fs: command
+        service = capture.CaptureService("bench", args.fs, ring_seconds=args.record_seconds + 5)
+        service.start()
+        service.wait(service.position + args.fs // 10, timeout=5)  # the device is open before the first check-in
+
+    if trace_memory:
+        tracemalloc.start()
+    cpu_start = time.process_time()
+    overheads = []
+    disk_bytes = 0
+    for _ in range(args.calls):
+        call_start = time.monotonic()
+        if mode == "frames":
+            samples = record_frames(command, args.record_seconds, args.fs, output)
+            disk_bytes += 2 * os.path.getsize(output)  # written, then read back
+        else:
+            samples = record_ring(service, args.record_seconds)
+        overheads.append((time.monotonic() - call_start) * 1000 - args.record_seconds * 1000 / args.speed)
+        if consumers:
+            consume(samples, args.fs, args.wake_seconds)
+    cpu = time.process_time() - cpu_start
+    peak = 0
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    if service is not None:
+        service.stop()
+
+    return {
+        "cpu_ms_per_s": cpu * 1000 / (args.calls * args.record_seconds),
+        "peak_mb": peak / 1e6,
+        "ring_mb": service.ring.buffer.nbytes / 1e6 if service is not None else 0.0,
+        "disk_kb_per_call": disk_bytes / 1024 / args.calls,
+        "opens": service.opens if service is not None else args.calls,
+        "overhead_ms": float(np.median(overheads)),
+    }
+
+
+def view_costs(args, command):
+    """Seconds to get the last wake_seconds of audio as a ring view versus a copy"""
+    capture.arecord_command = lambda device, fs: command
+    service = capture.CaptureService("bench", args.fs, ring_seconds=args.record_seconds + 5)
+    service.start()
+    service.wait(int((args.wake_seconds + 0.5) * args.fs), timeout=30)
+    service.stop()
+    repeats = 20000
+    start = time.perf_counter()
+    for _ in range(repeats):
+        service.latest(args.wake_seconds)
+    view = (time.perf_counter() - start) / repeats
+    start = time.perf_counter()
+    for _ in range(repeats):
+        service.latest(args.wake_seconds).copy()
+    copy = (time.perf_counter() - start) / repeats
+    return view, copy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark frames-list recording against the capture ring")
+    parser.add_argument("--runs-dir", type=str, default=os.path.join(REPO_ROOT, "runs"),
+                        help="Directory containing run_* folders with response.wav recordings")
+    parser.add_argument("--modes", type=str, nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--calls", type=int, default=8, help="Recordings per mode (default: 8)")
+    parser.add_argument("--record-seconds", type=float, default=7.0, help="Length of each recording (default: 7)")
+    parser.add_argument("--wake-seconds", type=float, default=3.0, help="Window the wake word consumer reads")
+    parser.add_argument("--fs", type=int, default=44100)
+    parser.add_argument("--speed", type=float, default=10.0,
+                        help="Feed audio this many times faster than real time (default: 10)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, "source.raw")
+        make_source(args.runs_dir, args.fs, source)
+        command = [sys.executable, "-c", FEEDER, source, str(args.fs), str(args.speed)]
+
+        results = {}
+        for mode in args.modes:
+            logger.info(f"{mode}: {args.calls} x {args.record_seconds:g}s at {args.speed:g}x")
+            # CPU is measured without tracemalloc, which would dominate it
+            capture_only = run_mode(mode, args, command, workdir, consumers=False)
+            with_consumers = run_mode(mode, args, command, workdir)
+            memory = run_mode(mode, args, command, workdir, trace_memory=True)
+            results[mode] = (capture_only, with_consumers, memory)
+        view, copy = view_costs(args, command)
+
+    table = PrettyTable()
+    table.field_names = ["Mode", "Capture CPU ms/s", "With consumers CPU ms/s", "Peak traced MB", "Ring MB",
+                         "Disk KB per call", "Device opens", "Per-call overhead ms"]
+    for mode, (capture_only, with_consumers, memory) in results.items():
+        table.add_row([mode, f"{capture_only['cpu_ms_per_s']:.1f}", f"{with_consumers['cpu_ms_per_s']:.1f}",
+                       f"{memory['peak_mb']:.2f}", f"{memory['ring_mb']:.2f}", f"{memory['disk_kb_per_call']:.0f}",
+                       capture_only["opens"], f"{capture_only['overhead_ms']:.1f}"])
+    print(f"{args.calls} recordings of {args.record_seconds:g}s per run, audio at {args.speed:g}x "
+          f"(CPU per second of captured audio)")
+    print(table.get_string())
+    print(f"Last {args.wake_seconds:g}s of audio: view {view * 1e6:.2f} us, copy {copy * 1e6:.2f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
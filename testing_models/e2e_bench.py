@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+End-to-End Fall Check-in Latency Benchmark
+
+Drives the real check-in coroutines (voiceassistant.interaction() and hub.fall_checkin(),
+the async equivalent of r1.handle_fall_detection()) with everything outside the process
+replaced:
+    - microphone: the runs/*/response.wav recordings, streamed at device pace through a
+      stand-in for arecord once the prompt has finished playing
+    - speaker: the shared playback engine on a NullOutputStream
+    - Whisper, chat, TTS and the emergency outcall: one local stub server whose latencies
+      follow log-normal distributions with configurable medians
+Every runtime stage is timed, and the report gives per-stage, time-to-decision and total
+latency percentiles for each flow. Audio runs --speed times faster than real time so the
+whole suite finishes in a minute or two.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from prettytable import PrettyTable
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(REPO_ROOT))
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("E2EBenchmark")
+logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per stub request otherwise
+
+FLOWS = ["voiceassistant", "hub"]
+SERVICES = ["whisper", "chat", "tts", "outcall"]
+
+# Runs as the "arecord" process: lead-in silence, the recording, then silence until killed
+FEEDER = r'''
+import sys, time
+path, fs, lead, speed = sys.argv[1], int(sys.argv[2]), float(sys.argv[3]), float(sys.argv[4])
+block = fs // 50 * 2
+with open(path, "rb") as f:
+    data = f.read()
+silence = bytes(block)
+
+def blocks():
+    for _ in range(int(lead * 50)):
+        yield silence
+    for i in range(0, len(data), block):
+        yield data[i:i + block]
+    while True:
+        yield silence
+
+out = sys.stdout.buffer
+period = 0.02 / speed
+deadline = time.monotonic()
+try:
+    for chunk in blocks():
+        out.write(chunk)
+        out.flush()
+        deadline += period
+        time.sleep(max(0.0, deadline - time.monotonic()))
+except (BrokenPipeError, KeyboardInterrupt):
+    pass
+'''
+
+
+class StubState:
+    def __init__(self, medians_ms, sigma, seed):
+        self.medians_ms = medians_ms
+        self.sigma = sigma
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.transcript = ""
+        self.label = "unclear"
+        self.requests = {service: 0 for service in SERVICES}
+
+    def delay(self, service):
+        with self.lock:
+            self.requests[service] += 1
+            return self.medians_ms[service] * math.exp(self.rng.gauss(0.0, self.sigma)) / 1000
+
+
+def make_handler(state):
+    tone = b"".join(int(3000 * math.sin(2 * math.pi * 440 * i / 24000)).to_bytes(2, "little", signed=True)
+                    for i in range(24000))
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status, body=b"", content_type="application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_HEAD(self):
+            self._reply(200)
+
+        def do_GET(self):
+            self._reply(200, json.dumps({"object": "list", "data": []}).encode())
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path.endswith("/audio/transcriptions"):
+                time.sleep(state.delay("whisper"))
+                self._reply(200, json.dumps({"text": state.transcript}).encode())
+            elif self.path.endswith("/chat/completions"):
+                time.sleep(state.delay("chat"))
+                body = {"id": "stub", "object": "chat.completion", "created": 0, "model": "stub",
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": state.label}}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}
+                self._reply(200, json.dumps(body).encode())
+            elif self.path.endswith("/audio/speech"):
+                time.sleep(state.delay("tts"))
+                self._reply(200, tone, "audio/pcm")
+            else:
+                time.sleep(state.delay("outcall"))
+                self._reply(200, b'{"status": "ok"}')
+
+    return Handler
+
+
+def load_cases(runs_dir):
+    """(response.wav, logged transcription, logged intent) for every recorded response"""
+    from run_logger import read_run_log
+
+    cases = []
+    for wav in sorted(Path(runs_dir).glob("run_*/response.wav")):
+        messages = [r["msg"] for r in read_run_log(wav.parent)]
+        transcript = next((m[len("Transcription: "):] for m in messages if m.startswith("Transcription: ")), "")
+        label = next((m[len("Detected intent: "):] for m in messages if m.startswith("Detected intent: ")), "unclear")
+        cases.append((wav, transcript, label))
+    return cases
+
+
+class FakeMicrophone:
+    """Replaces runtime.arecord_command: each capture replays the current case's recording"""
+    def __init__(self, state, engine, workdir, speed, reply_delay):
+        self.state = state
+        self.engine = engine
+        self.workdir = workdir
+        self.speed = speed
+        self.reply_delay = reply_delay
+        self.case = None
+        self.raw = {}  # (wav, rate) -> raw PCM path
+
+    def _raw(self, wav, fs):
+        from audio_utils import read_wav, resample
+
+        path = self.raw.get((wav, fs))
+        if path is None:
+            samples, rate = read_wav(wav)
+            path = os.path.join(self.workdir, f"{len(self.raw)}.raw")
+            with open(path, "wb") as f:
+                f.write(resample(samples, rate, fs).tobytes())
+            self.raw[(wav, fs)] = path
+        return path
+
+    def command(self, device, fs):
+        from interaction import ECHO_TAIL_SECONDS
+
+        wav, transcript, label = self.case
+        self.state.transcript, self.state.label = transcript, label
+        # The resident starts answering once the prompt still in the speaker has played out
+        lead = self.engine.queued_seconds() + ECHO_TAIL_SECONDS + self.reply_delay
+        return [sys.executable, "-c", FEEDER, self._raw(wav, fs), str(fs), str(lead), str(self.speed)]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fall check-ins end to end against stub services")
+    parser.add_argument("--runs-dir", type=str, default=os.path.join(REPO_ROOT, "runs"),
+                        help="Directory containing run_* folders with response.wav recordings")
+    parser.add_argument("--flows", type=str, nargs="+", default=FLOWS, choices=FLOWS, help="Flows to drive")
+    parser.add_argument("--limit", type=int, default=None, help="Use only the first N recordings")
+    parser.add_argument("--speed", type=float, default=8.0,
+                        help="Play and record audio this many times faster than real time (default: 8)")
+    parser.add_argument("--reply-delay", type=float, default=0.4,
+                        help="Seconds the resident waits after the prompt before answering (default: 0.4)")
+    for service, median in zip(SERVICES, (450, 350, 250, 600)):
+        parser.add_argument(f"--{service}-ms", type=float, default=median,
+                            help=f"Median {service} latency in ms (default: {median})")
+    parser.add_argument("--sigma", type=float, default=0.35, help="Log-normal sigma of every service latency")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    state = StubState({service: getattr(args, f"{service}_ms") for service in SERVICES}, args.sigma, args.seed)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    workdir = tempfile.TemporaryDirectory()
+    # The repo modules read these at import time, so they are set before importing them
+    os.environ.update({
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": f"{stub_url}/v1",
+        "OUTCALL_URL": f"{stub_url}/outcall",
+        "TTS_CACHE_DIR": os.path.join(workdir.name, "tts_cache"),
+        "RUNS_DIR": os.path.join(workdir.name, "runs"),
+    })
+    os.chdir(REPO_ROOT)  # voiceassistant plays audiofiles/* by relative path
+
+    import hub
+    import playback
+    import runtime
+    import voiceassistant
+    from run_logger import close_run_logger, create_run_folder, get_run_logger, read_run_log
+
+    cases = load_cases(args.runs_dir)[:args.limit]
+    if not cases:
+        logger.error(f"No response.wav recordings found in {args.runs_dir}")
+        return 1
+
+    engine = playback.PlaybackEngine(stream_factory=lambda rate, blocksize, callback: playback.NullOutputStream(
+        rate, blocksize, callback, speed=args.speed))
+    playback.set_engine(engine)
+    microphone = FakeMicrophone(state, engine, workdir.name, args.speed, args.reply_delay)
+    runtime.arecord_command = microphone.command
+    # Check-in prompts go through OpenAI TTS (the stub) instead of gTTS
+    hub.PHRASE_VOICE = {"voice": "onyx", "model": "tts-1", "sample_rate": 24000, "gain": 1.5}
+    room = hub.Room("Bench Room", resident="Ayaan", caller_name="Clay")
+
+    current = []
+    runtime.add_stage_listener(lambda name, seconds, error: current.append((name, seconds, error)))
+
+    async def hub_flow():
+        run_folder = create_run_folder()
+        run_log = get_run_logger(run_folder)
+        try:
+            await hub.fall_checkin(room, run_folder, run_log)
+        finally:
+            close_run_logger(run_folder)
+        return run_folder
+
+    async def voiceassistant_flow():
+        before = set(os.listdir(os.environ["RUNS_DIR"])) if os.path.isdir(os.environ["RUNS_DIR"]) else set()
+        await voiceassistant.interaction()
+        return os.path.join(os.environ["RUNS_DIR"], (set(os.listdir(os.environ["RUNS_DIR"])) - before).pop())
+
+    results = {}
+    for flow in args.flows:
+        stages, totals, decisions, outcomes, timeouts = {}, [], [], {}, 0
+        logger.info(f"{flow}: {len(cases)} check-ins at {args.speed:g}x audio speed")
+        for case in cases:
+            microphone.case = case
+            current.clear()
+            start = time.monotonic()
+            run_folder = runtime.get_runtime().run(voiceassistant_flow() if flow == "voiceassistant" else hub_flow())
+            totals.append((time.monotonic() - start) * 1000)
+            records = read_run_log(run_folder)
+            action = next((r for r in records if r["msg"].startswith("Action:")), None)
+            if action is not None:
+                decisions.append((action["mono"] - start) * 1000)
+                outcome = action["msg"][len("Action: "):].split(" - ")[0]
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            for name, seconds, error in current:
+                stages.setdefault(name, []).append(seconds * 1000)
+                timeouts += isinstance(error, runtime.StageTimeout)
+        results[flow] = (stages, totals, decisions, outcomes, timeouts)
+
+    server.shutdown()
+    engine.close()
+
+    for flow, (stages, totals, decisions, outcomes, timeouts) in results.items():
+        table = PrettyTable()
+        table.field_names = ["Stage", "Count", "p50 ms", "p90 ms", "p99 ms", "Max ms"]
+        rows = sorted(stages.items()) + [("time to decision", decisions), ("total", totals)]
+        for name, values in rows:
+            table.add_row([name, len(values), f"{percentile(values, 50):.0f}", f"{percentile(values, 90):.0f}",
+                           f"{percentile(values, 99):.0f}", f"{max(values, default=0):.0f}"])
+        print(f"{flow} ({len(totals)} check-ins, audio at {args.speed:g}x, stage timeouts: {timeouts}):")
+        print(table.get_string())
+        print("Outcomes: " + ", ".join(f"{name}: {count}" for name, count in sorted(outcomes.items())))
+    print("Stub requests: " + ", ".join(f"{service}: {count}" for service, count in state.requests.items()))
+    workdir.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
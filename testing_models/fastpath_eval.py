@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Fast-Path Intent Classifier Evaluation
+
+Runs the local classifier from intent_fastpath.py over the labelled cases in
+modeltest.get_test_cases(). Every case it answers confidently must be correct (the accuracy
+gate); everything else counts as an escalation to the LLM. Reports the share of LLM calls the
+fast path avoids and, with --with-llm, the combined accuracy when escalations go to a model.
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+from prettytable import PrettyTable
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from intent_fastpath import CONFIDENT, classify_local, is_confident
+from modeltest import get_test_cases, interpret_intent
+
+logger = logging.getLogger("FastPathEval")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the local intent fast path against the labelled test cases")
+    parser.add_argument("--threshold", type=float, default=CONFIDENT,
+                        help=f"Confidence needed to skip the LLM (default: {CONFIDENT})")
+    parser.add_argument("--min-accuracy", type=float, default=100.0,
+                        help="Required accuracy (%%) on confidently answered cases (default: 100)")
+    parser.add_argument("--with-llm", type=str, metavar="MODEL",
+                        help="Send escalated cases to this model and report the combined accuracy")
+    args = parser.parse_args()
+
+    test_cases = get_test_cases()
+    per_label = {label: {"local_correct": 0, "local_wrong": 0, "escalated": 0} for label in ["ok", "not_ok", "unclear"]}
+    wrong = []
+    escalated = []
+    local_seconds = 0.0
+
+    for text, expected in test_cases:
+        start = time.perf_counter()
+        intent, confidence = classify_local(text)
+        local_seconds += time.perf_counter() - start
+        if is_confident(intent, confidence, args.threshold):
+            if intent == expected:
+                per_label[expected]["local_correct"] += 1
+            else:
+                per_label[expected]["local_wrong"] += 1
+                wrong.append((text, expected, intent, confidence))
+        else:
+            per_label[expected]["escalated"] += 1
+            escalated.append((text, expected))
+
+    table = PrettyTable()
+    table.field_names = ["Expected", "Local correct", "Local wrong", "Escalated to LLM"]
+    for label, counts in per_label.items():
+        table.add_row([label, counts["local_correct"], counts["local_wrong"], counts["escalated"]])
+    print(table.get_string())
+
+    answered = len(test_cases) - len(escalated)
+    local_accuracy = (answered - len(wrong)) / answered * 100 if answered else 100.0
+    print(f"Answered locally: {answered}/{len(test_cases)} ({answered / len(test_cases) * 100:.1f}% of LLM calls avoided)")
+    print(f"Local accuracy: {local_accuracy:.2f}% (gate: {args.min_accuracy:.2f}%)")
+    print(f"Local classification cost: {local_seconds / len(test_cases) * 1e6:.1f} us per transcript")
+    for text, expected, intent, confidence in wrong:
+        print(f"  WRONG: '{text}' expected {expected}, got {intent} ({confidence:.2f})")
+
+    if args.with_llm:
+        llm_correct = 0
+        for text, expected in escalated:
+            intent, _, _, _ = interpret_intent(text, args.with_llm)
+            llm_correct += intent == expected
+        combined = (answered - len(wrong) + llm_correct) / len(test_cases) * 100
+        print(f"Combined accuracy with {args.with_llm} on escalations: {combined:.2f}%")
+
+    return 0 if local_accuracy >= args.min_accuracy else 1
+
+
+if __name__ == "__main__":
+    exit(main())
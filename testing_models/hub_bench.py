@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Hub Mode Throughput Benchmark
+
+Starts a minimal in-process MQTT 3.1.1 broker that stands in for ThingsBoard (RPCs are pushed
+to the connection that authenticated with a device's access token, or to the gateway
+connection), connects hub.Hub to it with a stub check-in whose length follows a log-normal
+distribution, replays synthetic fall events (including sensor double-fires) across many
+rooms, and reports RPC acknowledgement latency, check-in throughput, time in queue and
+event outcomes for each concurrency limit.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import socket
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from prettytable import PrettyTable
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from hub import GATEWAY_RPC_TOPIC, Hub, Room
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("HubBenchmark")
+
+CONNECT, CONNACK, PUBLISH, PUBACK, SUBSCRIBE, SUBACK, PINGREQ, PINGRESP, DISCONNECT = 1, 2, 3, 4, 8, 9, 12, 13, 14
+
+
+def encode_length(n):
+    out = bytearray()
+    while True:
+        byte, n = n % 128, n // 128
+        out.append(byte | (0x80 if n else 0))
+        if not n:
+            return bytes(out)
+
+
+def encode_string(s):
+    data = s.encode()
+    return struct.pack("!H", len(data)) + data
+
+
+def read_string(data, offset):
+    (length,) = struct.unpack_from("!H", data, offset)
+    return data[offset + 2:offset + 2 + length].decode(), offset + 2 + length
+
+
+def topic_matches(pattern, topic):
+    pattern, topic = pattern.split("/"), topic.split("/")
+    for i, part in enumerate(pattern):
+        if part == "#":
+            return True
+        if i >= len(topic) or (part != "+" and part != topic[i]):
+            return False
+    return len(pattern) == len(topic)
+
+
+class StubBroker:
+    """Just enough MQTT for paho: CONNECT, SUBSCRIBE, QoS 0/1 PUBLISH, PINGREQ, DISCONNECT"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = {}  # access token -> (socket, write lock, subscriptions)
+        self.published = []    # (monotonic time, token, topic, payload) from clients
+        broker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                broker._serve(self.request)
+
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def _serve(self, sock):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        reader = sock.makefile("rb")
+        write_lock = threading.Lock()
+        token = None
+        subscriptions = []
+
+        def send(packet_type, body, flags=0):
+            with write_lock:
+                sock.sendall(bytes([packet_type << 4 | flags]) + encode_length(len(body)) + body)
+
+        while True:
+            header = reader.read(1)
+            if not header:
+                break
+            length, shift = 0, 0
+            while True:
+                byte = reader.read(1)[0]
+                length += (byte & 0x7F) << shift
+                shift += 7
+                if not byte & 0x80:
+                    break
+            body = reader.read(length)
+            packet_type, flags = header[0] >> 4, header[0] & 0x0F
+
+            if packet_type == CONNECT:
+                _, offset = read_string(body, 0)
+                connect_flags = body[offset + 1]
+                _, offset = read_string(body, offset + 4)  # client id
+                if connect_flags & 0x04:
+                    _, offset = read_string(body, offset)
+                    _, offset = read_string(body, offset)
+                if connect_flags & 0x80:
+                    token, offset = read_string(body, offset)
+                with self.lock:
+                    self.connections[token] = (sock, send, subscriptions)
+                send(CONNACK, b"\x00\x00")
+            elif packet_type == SUBSCRIBE:
+                (packet_id,) = struct.unpack_from("!H", body, 0)
+                offset, granted = 2, bytearray()
+                while offset < len(body):
+                    topic, offset = read_string(body, offset)
+                    granted.append(min(body[offset], 1))
+                    offset += 1
+                    subscriptions.append(topic)
+                send(SUBACK, struct.pack("!H", packet_id) + bytes(granted))
+            elif packet_type == PUBLISH:
+                topic, offset = read_string(body, 0)
+                qos = (flags >> 1) & 0x03
+                if qos:
+                    send(PUBACK, body[offset:offset + 2])
+                    offset += 2
+                with self.lock:
+                    self.published.append((time.monotonic(), token, topic, body[offset:]))
+            elif packet_type == PINGREQ:
+                send(PINGRESP, b"")
+            elif packet_type == DISCONNECT:
+                break
+        with self.lock:
+            if self.connections.get(token, (None,))[0] is sock:
+                del self.connections[token]
+
+    def subscribed(self, token):
+        with self.lock:
+            connection = self.connections.get(token)
+        return bool(connection and connection[2])
+
+    def inject(self, token, topic, payload):
+        """Push a server-side RPC to the connection of an access token; False if nobody is subscribed"""
+        with self.lock:
+            connection = self.connections.get(token)
+        if not connection or not any(topic_matches(s, topic) for s in connection[2]):
+            return False
+        connection[1](PUBLISH, encode_string(topic) + json.dumps(payload).encode())
+        return True
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def stub_checkin(rng, mean_seconds, sigma):
+    mu = -sigma ** 2 / 2  # log-normal with mean 1, scaled to mean_seconds
+
+    async def checkin(room, run_folder, run_log):
+        length = mean_seconds * rng.lognormvariate(mu, sigma)
+        room.set_state("prompting")
+        await asyncio.sleep(length * 0.4)
+        room.set_state("listening")
+        await asyncio.sleep(length * 0.6)
+        room.set_state("resolved")
+        run_log.log("Action: False alarm - No action needed")
+    return checkin
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def run_scenario(args, max_checkins, runs_root):
+    rng = random.Random(args.seed)
+    broker = StubBroker()
+    gateway_token = "gateway-token" if args.gateway else None
+    rooms = [Room(f"Room {i + 101}", token=f"token-{i}") for i in range(args.rooms)]
+    hub = Hub(rooms, "127.0.0.1", port=broker.port, gateway_token=gateway_token, max_checkins=max_checkins,
+              queue_size=args.queue_size, debounce_seconds=args.debounce,
+              checkin=stub_checkin(rng, args.checkin_seconds, args.checkin_sigma), runs_root=runs_root)
+    try:
+        hub.connect()
+        tokens = [gateway_token] if args.gateway else [room.token for room in rooms]
+        deadline = time.monotonic() + 10
+        while not all(broker.subscribed(token) for token in tokens):
+            if time.monotonic() > deadline:
+                raise RuntimeError("hub did not subscribe in time")
+            time.sleep(0.01)
+
+        sent = {}  # RPC id -> injection time
+        start = time.monotonic()
+        request_id = 0
+        for i in range(args.events):
+            time.sleep(max(0.0, start + i / args.rate - time.monotonic()))
+            room = rng.choice(rooms)
+            for _ in range(2 if rng.random() < args.duplicates else 1):
+                request_id += 1
+                rpc = {"id": request_id, "method": "fallEvent", "params": True}
+                if args.gateway:
+                    delivered = broker.inject(gateway_token, GATEWAY_RPC_TOPIC, {"device": room.name, "data": rpc})
+                else:
+                    delivered = broker.inject(room.token, f"v1/devices/me/rpc/request/{request_id}", rpc)
+                if delivered:
+                    sent[request_id] = time.monotonic()
+        replayed = time.monotonic() - start
+
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            metrics = hub.metrics()
+            if metrics["fall_queue_depth"] == 0 and metrics["fall_checkins_active"] == 0 \
+                    and metrics["fall_events_queued"] == metrics["fall_events_handled"] + metrics["fall_events_failed"]:
+                break
+            time.sleep(0.05)
+        elapsed = time.monotonic() - start
+        metrics = hub.metrics()
+    finally:
+        hub.close()
+        broker.close()
+
+    acks = []
+    with broker.lock:
+        published = list(broker.published)
+    for published_at, _, topic, payload in published:
+        if topic.startswith("v1/devices/me/rpc/response/"):
+            request = int(topic.rsplit("/", 1)[1])
+        elif topic == GATEWAY_RPC_TOPIC:
+            request = json.loads(payload).get("id")
+        else:
+            continue
+        if request in sent:
+            acks.append((published_at - sent[request]) * 1000)
+
+    return {
+        "max_checkins": max_checkins,
+        "rpcs": len(sent),
+        "replay_rate": len(sent) / replayed if replayed else 0.0,
+        "handled": metrics["fall_events_handled"],
+        "checkins_per_s": metrics["fall_events_handled"] / elapsed if elapsed else 0.0,
+        "ack_p50": percentile(acks, 50),
+        "ack_p95": percentile(acks, 95),
+        "queue_mean": metrics["fall_queue_time_mean_ms"],
+        "queue_max": metrics["fall_queue_time_max_ms"],
+        "peak": metrics["hub_checkins_peak"],
+        "outcomes": {name: metrics[f"fall_events_{name}"] for name in ("queued", "coalesced", "debounced", "dropped")},
+        "elapsed": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hub mode against a stub ThingsBoard MQTT broker")
+    parser.add_argument("--rooms", type=int, default=50, help="Number of rooms (default: 50)")
+    parser.add_argument("--events", type=int, default=400, help="Fall events to replay (default: 400)")
+    parser.add_argument("--rate", type=float, default=100.0, help="Fall events per second (default: 100)")
+    parser.add_argument("--duplicates", type=float, default=0.2,
+                        help="Fraction of events the sensor sends twice (default: 0.2)")
+    parser.add_argument("--checkin-seconds", type=float, default=0.5,
+                        help="Mean stub check-in length in seconds (default: 0.5)")
+    parser.add_argument("--checkin-sigma", type=float, default=0.5, help="Log-normal sigma of check-in length")
+    parser.add_argument("--max-checkins", type=int, nargs="+", default=[1, 4, 16],
+                        help="Concurrency limits to compare (default: 1 4 16)")
+    parser.add_argument("--queue-size", type=int, default=64, help="Hub queue size (default: 64)")
+    parser.add_argument("--debounce", type=float, default=2.0, help="Per-room debounce seconds (default: 2)")
+    parser.add_argument("--gateway", action="store_true", help="Use one gateway connection instead of one per room")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for check-ins to finish")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    logger.info(f"{args.rooms} rooms over {'one gateway connection' if args.gateway else 'one connection per room'}, "
+                f"{args.events} events at {args.rate:.0f}/s, mean check-in {args.checkin_seconds}s")
+    results = []
+    with tempfile.TemporaryDirectory() as runs_root:
+        for max_checkins in args.max_checkins:
+            result = run_scenario(args, max_checkins, runs_root)
+            logger.info(f"max_checkins={max_checkins}: {result['outcomes']} in {result['elapsed']:.1f}s")
+            results.append(result)
+
+    table = PrettyTable()
+    table.field_names = ["Max check-ins", "RPCs", "RPC/s", "Handled", "Check-ins/s", "Ack p50 ms", "Ack p95 ms",
+                         "Queue mean ms", "Queue max ms", "Peak running", "Coalesced", "Debounced", "Dropped"]
+    for r in results:
+        table.add_row([r["max_checkins"], r["rpcs"], f"{r['replay_rate']:.0f}", r["handled"],
+                       f"{r['checkins_per_s']:.1f}", f"{r['ack_p50']:.2f}", f"{r['ack_p95']:.2f}",
+                       f"{r['queue_mean']:.0f}", f"{r['queue_max']:.0f}", r["peak"], r["outcomes"]["coalesced"],
+                       r["outcomes"]["debounced"], r["outcomes"]["dropped"]])
+    print(table.get_string())
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
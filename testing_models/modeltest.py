@@ -13,7 +13,10 @@ import os
 import time
 import statistics
 import importlib
-from typing import Dict, List, Tuple, Literal, Any
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Literal, Any, Optional
 from datetime import datetime
 from prettytable import PrettyTable
 
@@ -64,8 +67,10 @@ MODELS_TO_TEST = [
 def interpret_intent(
     text: str,
     model: str,
-    api_key: str = OPENAI_API_KEY
-) -> Tuple[Literal['ok', 'not_ok', 'unclear'], float, bool, str]:
+    api_key: str = OPENAI_API_KEY,
+    raise_errors: bool = False,
+    client: Any = None
+) -> Tuple[Literal['ok', 'not_ok', 'unclear', 'error'], float, bool, str]:
     """
     Interpret the intent of the text using a specified OpenAI model.
     Returns the intent classification, the time taken for the API call,
@@ -75,10 +80,12 @@ def interpret_intent(
         text: The text to interpret, typically a response to "Did you fall?"
         model: The OpenAI model to use
         api_key: OpenAI API key
+        raise_errors: Re-raise API errors instead of returning them (used by the retrying runner)
+        client: OpenAI client to call (default: the openai module's client)
         
     Returns:
         Tuple of (intent, response_time, format_valid, raw_response) where:
-            - intent is one of: 'ok', 'not_ok', 'unclear'
+            - intent is one of: 'ok', 'not_ok', 'unclear', or 'error' if the call failed
             - response_time is the time taken for the API call in seconds
             - format_valid is a boolean indicating if the response format was valid
             - raw_response is the raw text response from the model
@@ -90,7 +97,7 @@ def interpret_intent(
         openai.api_key = os.environ.get("OPENAI_API_KEY")
     else:
         logger.error("OpenAI API key not set. Please provide via parameter or OPENAI_API_KEY env var")
-        return "unclear", 0.0, False, "No API key provided"
+        return "error", 0.0, False, "No API key provided"
     
     logger.debug(f"Interpreting intent for text: '{text}' using model: {model}")
     
@@ -120,7 +127,7 @@ def interpret_intent(
         """
         
         # Get the response with structured format
-        response = openai.chat.completions.create(
+        response = (client or openai).chat.completions.create(
             model=model,
             messages=[{"role": "user", "content": prompt}],
             temperature=0,
@@ -160,9 +167,11 @@ def interpret_intent(
         logger.debug(f"Detected intent: {intent} in {response_time:.2f}s, format valid: {format_valid}")
         return intent, response_time, format_valid, raw_response
     except Exception as e:
+        if raise_errors:
+            raise
         response_time = time.time() - start_time
         logger.error(f"Error interpreting intent with model {model}: {e}")
-        return "unclear", response_time, False, str(e)
+        return "error", response_time, False, str(e)
 
 class TestResult:
     """Class to store test results for reporting"""
@@ -173,6 +182,10 @@ class TestResult:
         self.response_times = []
         self.failures = []  # List to store details of failed tests
         self.format_errors = []  # List to store format compliance errors
+        self.errors = []  # Calls that failed outright; kept out of accuracy and latency
+        self.concurrency = 1  # Requests in flight per model while latencies were measured
+        self.concurrent = False  # Measured with every model running at once
+        self.retries = 0  # API calls retried after an error
         
     @property
     def accuracy(self) -> float:
@@ -221,6 +234,51 @@ class TestResult:
     def total_time(self) -> float:
         """Get total time taken for all tests"""
         return sum(self.response_times)
+    
+    def percentile(self, pct: float) -> float:
+        """Response time at the given percentile (linear interpolation between samples)"""
+        if not self.response_times:
+            return 0.0
+        ordered = sorted(self.response_times)
+        rank = (len(ordered) - 1) * pct / 100
+        lower = int(rank)
+        upper = min(lower + 1, len(ordered) - 1)
+        return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+    
+    @property
+    def p50_response_time(self) -> float:
+        return self.percentile(50)
+    
+    @property
+    def p95_response_time(self) -> float:
+        return self.percentile(95)
+    
+    @property
+    def p99_response_time(self) -> float:
+        return self.percentile(99)
+
+
+class TokenBucket:
+    """Token-bucket rate limiter: allows `rate` calls per second with bursts up to `capacity`"""
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self) -> None:
+        """Block until a token is available"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
 
 
 def get_test_cases() -> List[Tuple[str, Literal['ok', 'not_ok', 'unclear']]]:
@@ -339,13 +397,105 @@ def get_test_cases() -> List[Tuple[str, Literal['ok', 'not_ok', 'unclear']]]:
         ("Don't worry about me. Just let me be.", "unclear"),
     ]
 
-def run_model_comparison(models: List[str] = None, max_tests: int = None) -> Dict[str, TestResult]:
+def record_result(test_result: TestResult, text: str, expected: str, intent: str,
+                  response_time: float, format_valid: bool, raw_response: str) -> None:
+    """Add one test outcome to a model's TestResult"""
+    if intent == "error":
+        test_result.errors.append((text, raw_response, response_time))
+        logger.error(f"✗ API error after {response_time:.2f}s, not scored: {raw_response[:100]}")
+        return
+    test_result.response_times.append(response_time)
+    test_result.total_count += 1
+    
+    # Check format compliance
+    if not format_valid:
+        test_result.format_errors.append((text, raw_response, response_time))
+        logger.warning(f"⚠ Format error! Raw response: {raw_response[:100]}...")
+    
+    # Check result
+    if intent == expected:
+        test_result.correct_count += 1
+        if format_valid:
+            logger.info(f"✓ Test passed! Result: '{intent}' in {response_time:.2f}s")
+        else:
+            logger.info(f"△ Test passed with format error! Result: '{intent}' in {response_time:.2f}s")
+    else:
+        test_result.failures.append((text, expected, intent, response_time, format_valid, raw_response))
+        if format_valid:
+            logger.error(f"✗ Test failed! Got: '{intent}', Expected: '{expected}' in {response_time:.2f}s")
+        else:
+            logger.error(f"✗ Test failed with format error! Got: '{intent}', Expected: '{expected}' in {response_time:.2f}s")
+
+def interpret_intent_with_retry(text: str, model: str, limiter: Optional[TokenBucket],
+                                max_retries: int, client: Any = None) -> Tuple[str, float, bool, str, int]:
+    """
+    Call interpret_intent under the model's rate limiter, retrying API errors with
+    exponential backoff and jitter. Returns interpret_intent's tuple plus the retry count;
+    once retries are exhausted the intent is 'error' and the time is the total spent trying.
+    """
+    start_time = time.time()
+    for attempt in range(max_retries + 1):
+        if limiter:
+            limiter.acquire()
+        try:
+            return (*interpret_intent(text, model, raise_errors=True, client=client), attempt)
+        except Exception as e:
+            if attempt == max_retries:
+                logger.error(f"Error interpreting intent with model {model} after {attempt + 1} attempts: {e}")
+                return "error", time.time() - start_time, False, str(e), attempt
+            delay = min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random())
+            logger.warning(f"Retrying {model} in {delay:.1f}s after error: {e}")
+            time.sleep(delay)
+
+def run_model_comparison_concurrent(models: List[str], test_cases: List[Tuple[str, str]], concurrency: int,
+                                    rate_limit: Optional[float], max_retries: int) -> Dict[str, TestResult]:
+    """
+    Run all models at once on a thread pool, with at most `concurrency` requests in flight
+    and `rate_limit` requests/second per model. Results are recorded in test-case order,
+    so reports are identical in layout to a sequential run.
+    """
+    concurrency = max(1, concurrency)
+    limiters = {model: TokenBucket(rate_limit) if rate_limit else None for model in models}
+    # This runner retries on its own and times single calls; the SDK's built-in retries would multiply both
+    client = openai.OpenAI(api_key=OPENAI_API_KEY or os.environ.get("OPENAI_API_KEY"), max_retries=0)
+    slots = {model: threading.Semaphore(concurrency) for model in models}
+    
+    def run_case(model, text):
+        with slots[model]:
+            return interpret_intent_with_retry(text, model, limiters[model], max_retries, client)
+    
+    logger.info(f"Testing {len(models)} models concurrently ({concurrency} in flight per model"
+                f"{f', {rate_limit} req/s per model' if rate_limit else ''})")
+    with ThreadPoolExecutor(max_workers=concurrency * len(models)) as pool:
+        futures = {
+            model: [pool.submit(run_case, model, text) for text, _ in test_cases]
+            for model in models
+        }
+        results = {}
+        for model in models:
+            test_result = TestResult(model)
+            test_result.concurrency = concurrency
+            test_result.concurrent = True
+            results[model] = test_result
+            for i, ((text, expected), future) in enumerate(zip(test_cases, futures[model])):
+                intent, response_time, format_valid, raw_response, retries = future.result()
+                test_result.retries += retries
+                logger.info(f"[{model} {i+1}/{len(test_cases)}] '{text}' (Expected: {expected})")
+                record_result(test_result, text, expected, intent, response_time, format_valid, raw_response)
+    
+    return results
+
+def run_model_comparison(models: List[str] = None, max_tests: int = None, concurrency: int = 1,
+                         rate_limit: Optional[float] = None, max_retries: int = 3) -> Dict[str, TestResult]:
     """
     Run test cases against multiple models and collect performance data
     
     Args:
         models: List of model names to test (defaults to MODELS_TO_TEST)
         max_tests: Maximum number of tests to run per model (defaults to all)
+        concurrency: Requests in flight per model; above 1 runs models and cases on a thread pool
+        rate_limit: Maximum requests per second per model (token bucket), None for unlimited
+        max_retries: Retries per API call in concurrent mode
         
     Returns:
         Dictionary mapping model names to TestResult objects
@@ -357,6 +507,9 @@ def run_model_comparison(models: List[str] = None, max_tests: int = None) -> Dic
     if max_tests is not None:
         test_cases = test_cases[:max_tests]
     
+    if concurrency > 1 or rate_limit:
+        return run_model_comparison_concurrent(models, test_cases, concurrency, rate_limit, max_retries)
+    
     results = {}
     
     for model in models:
@@ -369,27 +522,7 @@ def run_model_comparison(models: List[str] = None, max_tests: int = None) -> Dic
             
             # Run the test
             intent, response_time, format_valid, raw_response = interpret_intent(text, model)
-            test_result.response_times.append(response_time)
-            test_result.total_count += 1
-            
-            # Check format compliance
-            if not format_valid:
-                test_result.format_errors.append((text, raw_response, response_time))
-                logger.warning(f"⚠ Format error! Raw response: {raw_response[:100]}...")
-            
-            # Check result
-            if intent == expected:
-                test_result.correct_count += 1
-                if format_valid:
-                    logger.info(f"✓ Test passed! Result: '{intent}' in {response_time:.2f}s")
-                else:
-                    logger.info(f"△ Test passed with format error! Result: '{intent}' in {response_time:.2f}s")
-            else:
-                test_result.failures.append((text, expected, intent, response_time, format_valid, raw_response))
-                if format_valid:
-                    logger.error(f"✗ Test failed! Got: '{intent}', Expected: '{expected}' in {response_time:.2f}s")
-                else:
-                    logger.error(f"✗ Test failed with format error! Got: '{intent}', Expected: '{expected}' in {response_time:.2f}s")
+            record_result(test_result, text, expected, intent, response_time, format_valid, raw_response)
     
     return results
 
@@ -415,8 +548,8 @@ def generate_report(results: Dict[str, TestResult]) -> str:
     # Create summary table
     summary_table = PrettyTable()
     summary_table.field_names = [
-        "Model", "Accuracy", "Format Compliance", "Avg Time (s)", "Median Time (s)",
-        "Min Time (s)", "Max Time (s)", "Total Time (s)"
+        "Model", "Accuracy", "Format Compliance", "API Errors", "Avg Time (s)", "Median Time (s)",
+        "P95 Time (s)", "P99 Time (s)", "Min Time (s)", "Max Time (s)", "Total Time (s)"
     ]
     
     # Sort models by accuracy (highest first)
@@ -428,8 +561,11 @@ def generate_report(results: Dict[str, TestResult]) -> str:
             model,
             f"{result.accuracy:.2f}%",
             f"{result.format_compliance:.2f}%",
+            len(result.errors),
             f"{result.avg_response_time:.2f}",
             f"{result.median_response_time:.2f}",
+            f"{result.p95_response_time:.2f}",
+            f"{result.p99_response_time:.2f}",
             f"{result.min_response_time:.2f}",
             f"{result.max_response_time:.2f}",
             f"{result.total_time:.2f}"
@@ -437,6 +573,17 @@ def generate_report(results: Dict[str, TestResult]) -> str:
     
     report.append("SUMMARY")
     report.append(summary_table.get_string())
+    concurrency = max(result.concurrency for result in results.values())
+    if any(result.concurrent for result in results.values()):
+        retries = sum(result.retries for result in results.values())
+        report.append(f"Note: latencies were measured under concurrency ({concurrency} requests in flight per model, "
+                      f"all models at once; {retries} retried calls). Times exclude rate-limiter waits but include "
+                      f"server-side queueing, so they are not directly comparable to a sequential run.")
+    else:
+        report.append("Note: latencies were measured sequentially (one request in flight).")
+    if any(result.errors for result in results.values()):
+        report.append("Note: accuracy, format compliance and times only count calls that returned; "
+                      "API errors are listed per model below.")
     report.append("")
     
     # Add failure details for each model
@@ -479,6 +626,18 @@ def generate_report(results: Dict[str, TestResult]) -> str:
             report.append(format_errors_table.get_string())
             report.append("")
     
+    for model in sorted_models:
+        result = results[model]
+        if result.errors:
+            report.append(f"API ERRORS: {model} ({len(result.errors)})")
+            errors_table = PrettyTable()
+            errors_table.field_names = ["Text", "Error", "Time (s)"]
+            errors_table.max_width["Error"] = 60
+            for text, error, time in result.errors:
+                errors_table.add_row([text, error, f"{time:.2f}"])
+            report.append(errors_table.get_string())
+            report.append("")
+    
     return "\n".join(report)
 
 def save_report_to_file(report: str, filename: str = "model_comparison_report3.txt") -> None:
@@ -500,6 +659,12 @@ def main():
                         help="OpenAI API key (overrides the hardcoded key)")
     parser.add_argument("--verbose", action="store_true",
                         help="Enable verbose logging")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Requests in flight per model; above 1 runs all models concurrently (default: 1)")
+    parser.add_argument("--rate-limit", type=float,
+                        help="Maximum requests per second per model (default: unlimited)")
+    parser.add_argument("--max-retries", type=int, default=3,
+                        help="Retries with backoff per API call in concurrent mode (default: 3)")
     
     args = parser.parse_args()
     
@@ -519,7 +684,8 @@ def main():
     
     # Run tests
     logger.info("Starting model comparison tests...")
-    results = run_model_comparison(models=args.models, max_tests=args.max_tests)
+    results = run_model_comparison(models=args.models, max_tests=args.max_tests, concurrency=args.concurrency,
+                                   rate_limit=args.rate_limit, max_retries=args.max_retries)
     
     # Generate and save report
     report = generate_report(results)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Emergency Outcall Stub Benchmark
+
+Starts a local stand-in for the API Gateway outcall endpoint with configurable latency,
+error and hang rates, then drives the shared EmergencyClient against it and reports
+dispatch latency, hedges, retries and whether every dispatch reached the server exactly
+once per idempotency key.
+"""
+
+import argparse
+import json
+import logging
+import random
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from emergency import EmergencyClient
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("OutcallStub")
+
+
+class StubState:
+    def __init__(self, latency_ms, jitter_ms, error_rate, hang_rate, hang_seconds):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.lock = threading.Lock()
+        self.keys = {}  # idempotency key -> number of successful deliveries
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like API Gateway
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status, body=b""):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_HEAD(self):
+            self._reply(200)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            key = self.headers.get("Idempotency-Key", "")
+            roll = random.random()
+            if roll < state.hang_rate:
+                time.sleep(state.hang_seconds)
+            elif roll < state.hang_rate + state.error_rate:
+                self._reply(503, b'{"error": "unavailable"}')
+                return
+            else:
+                time.sleep(max(0.0, random.gauss(state.latency_ms, state.jitter_ms)) / 1000)
+            with state.lock:
+                duplicate = key in state.keys
+                state.keys[key] = state.keys.get(key, 0) + 1
+            # A real idempotent endpoint answers a repeated key without placing a second call
+            self._reply(200, json.dumps({"duplicate": duplicate}).encode())
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the emergency outcall client against a local stub")
+    parser.add_argument("--dispatches", type=int, default=50, help="Number of outcalls to send (default: 50)")
+    parser.add_argument("--latency-ms", type=float, default=120.0, help="Mean stub latency (default: 120)")
+    parser.add_argument("--jitter-ms", type=float, default=40.0, help="Stub latency standard deviation (default: 40)")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Share of 503 responses (default: 0.05)")
+    parser.add_argument("--hang-rate", type=float, default=0.05, help="Share of requests that hang (default: 0.05)")
+    parser.add_argument("--hang-seconds", type=float, default=8.0, help="How long a hung request stalls (default: 8)")
+    parser.add_argument("--hedge-delay", type=float, default=0.5, help="Client hedge delay in seconds (default: 0.5)")
+    parser.add_argument("--idempotent", action="store_true",
+                        help="Let the client hedge and resend, as it does with OUTCALL_IDEMPOTENT=1 (the stub dedupes)")
+    args = parser.parse_args()
+
+    state = StubState(args.latency_ms, args.jitter_ms, args.error_rate, args.hang_rate, args.hang_seconds)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/Prod/outcall"
+    logger.info(f"Stub outcall endpoint listening on {url}")
+
+    client = EmergencyClient(url=url, connect_timeout=1.0, read_timeout=3.0, hedge_delay=args.hedge_delay,
+                             idempotent=args.idempotent)
+    client.prewarm()
+
+    latencies = []
+    failures = 0
+    for _ in range(args.dispatches):
+        start = time.monotonic()
+        status = client.dispatch({"emergencyPhoneNumber": "+10000000000", "emergencyFirstname": "SRR",
+                                  "userFirstName": "Stub", "userLastName": ""})
+        latencies.append((time.monotonic() - start) * 1000)
+        failures += status is None or status >= 400
+
+    server.shutdown()
+    ordered = sorted(latencies)
+    stats = client.stats()
+    print(f"Dispatches: {args.dispatches}, failed: {failures}")
+    print(f"Latency ms: p50 {statistics.median(ordered):.0f}, "
+          f"p95 {ordered[int(0.95 * (len(ordered) - 1))]:.0f}, max {ordered[-1]:.0f}")
+    print(f"Counters: {stats['counters']}")
+    print(f"Dispatch histogram: {stats['dispatch']['buckets']}")
+    print(f"Keys delivered more than once (deduplicated by key): {sum(1 for n in state.keys.values() if n > 1)}")
+    return 0 if failures == 0 else 1
+
+
+if __name__ == "__main__":
+    exit(main())
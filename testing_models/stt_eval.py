@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Speech-to-Text Backend and Policy Evaluation
+
+Scores the STT backends in stt_backends.py on the runs/*/response.wav recordings. The
+reference for each run is the intent its check-in logged; every transcript is classified with
+intent_fastpath.classify_local(), the same matcher the check-in uses.
+
+Engines: the local PocketSphinx decoder with and without best-path rescoring, the logged
+cloud transcript, and with --cloud a live Whisper or Google backend. Reports how many answers
+each gets right, confidently wrong and unclear, plus decode latency.
+
+Policies: the real SpeechToText runs every policy with the local engine and a replayed cloud
+backend that returns the logged transcript after a log-normal delay, in three network
+scenarios (online, slow and offline). Reports accuracy, latency to the answer and how often
+the local engine supplied it.
+
+Before any of that, a safety check runs every policy against a slow or failing cloud and a local
+engine that always hears the wrong answer: a local "ok" must never decide a check-in, and the
+script exits non-zero if one does.
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+from prettytable import PrettyTable
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(REPO_ROOT))
+from audio_utils import read_wav
+from intent_fastpath import classify_local, is_confident
+from stt_backends import POLICIES, SphinxBackend, SpeechToText, create_backend
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("STTEval")
+
+# Replayed cloud: median latency in ms, and whether every request fails
+SCENARIOS = {
+    "online": (1200, False),
+    "slow": (8000, False),
+    "offline": (100, True),
+}
+
+
+class Case:
+    def __init__(self, run, samples, rate, transcript, intent):
+        self.run = run
+        self.samples = samples
+        self.rate = rate
+        self.transcript = transcript
+        self.intent = intent
+
+
+def load_cases(runs_dir):
+    """Recordings whose check-in logged both a transcription and an intent"""
+    cases = []
+    for wav in sorted(Path(runs_dir).glob("run_*/response.wav")):
+        log = wav.parent / "interaction_log.txt"
+        if not log.exists():
+            continue
+        messages = [line.split("] ", 1)[-1].strip() for line in log.read_text(encoding="utf-8").splitlines()]
+        transcript = next((m[len("Transcription: "):] for m in messages if m.startswith("Transcription: ")), None)
+        intent = next((m[len("Detected intent: "):] for m in messages if m.startswith("Detected intent: ")), None)
+        if transcript is None or intent is None:
+            continue
+        samples, rate = read_wav(wav)
+        cases.append(Case(wav.parent.name, samples, rate, transcript, intent))
+    return cases
+
+
+def score(rows):
+    """rows of (expected, text) -> correct, confidently wrong, unclear"""
+    correct = wrong = unclear = 0
+    for expected, text in rows:
+        intent, confidence = classify_local(text)
+        if intent == expected:
+            correct += 1
+        elif is_confident(intent, confidence):
+            wrong += 1
+        else:
+            unclear += 1
+    return correct, wrong, unclear
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+class ReplayCloud:
+    """Cloud backend that answers with the logged transcript after a simulated network delay"""
+    name = "cloud"
+    local = False
+
+    def __init__(self, median_ms, sigma, fails, seed):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.fails = fails
+        self.random = random.Random(seed)
+        self.transcript = ""
+
+    async def transcribe(self, samples, rate):
+        await asyncio.sleep(self.random.lognormvariate(math.log(self.median_ms / 1000), self.sigma))
+        if self.fails:
+            raise ConnectionError("network unreachable")
+        return self.transcript
+
+
+class FixedLocal:
+    """Local backend that always hears the same thing"""
+    name = "fixed"
+    local = True
+
+    def __init__(self, text):
+        self.text = text
+        self.lock = threading.Lock()
+
+    async def transcribe(self, samples, rate):
+        await asyncio.sleep(0.01)
+        return self.text
+
+
+async def check_local_answers(policies):
+    """(policy, cloud, local, intent) for every check-in a local "ok" would have ended"""
+    failures = []
+    # Replayed cloud (fails, transcript) against a local engine that hears the opposite
+    cases = [
+        (False, "yes I fell", "no i'm fine"),
+        (True, "", "no i'm fine"),
+        (False, "", "i'm okay"),
+        (False, "I can't get up", "nope"),
+    ]
+    for policy in policies:
+        for fails, transcript, heard in cases:
+            cloud = ReplayCloud(600, 0.1, fails, seed=1)
+            cloud.transcript = transcript
+            result = await SpeechToText(cloud, FixedLocal(heard), policy=policy, deadline=0.2).transcribe([], 16000)
+            cloud_said = "failed" if fails else transcript
+            if result.intent == "ok" and (fails or classify_local(transcript)[0] != "ok"):
+                failures.append((policy, cloud_said, heard, result.intent))
+    return failures
+
+
+def evaluate_engines(cases, args):
+    engines = {"sphinx": SphinxBackend(), "sphinx (bestpath)": SphinxBackend(bestpath=True)}
+    if args.cloud:
+        engines[args.cloud] = create_backend(args.cloud)
+
+    table = PrettyTable()
+    table.field_names = ["Engine", "Correct", "Confidently wrong", "Unclear", "Median ms", "P95 ms", "Real-time factor"]
+    table.add_row(["logged cloud transcript", *score([(case.intent, case.transcript) for case in cases]),
+                   "-", "-", "-"])
+    audio_seconds = sum(len(case.samples) / case.rate for case in cases)
+    for name, backend in engines.items():
+        rows, latencies = [], []
+        for case in cases:
+            start = time.perf_counter()
+            text = asyncio.run(backend.transcribe(case.samples, case.rate))
+            latencies.append((time.perf_counter() - start) * 1000)
+            rows.append((case.intent, text))
+            logger.debug(f"{name} {case.run}: {text!r}")
+        if args.verbose:
+            for case, (_, text) in zip(cases, rows):
+                print(f"  {name:22} {case.run} {case.intent:8} {text!r}")
+        table.add_row([name, *score(rows), f"{statistics.median(latencies):.0f}", f"{percentile(latencies, 95):.0f}",
+                       f"{sum(latencies) / 1000 / audio_seconds:.3f}"])
+    print(f"Engines on {len(cases)} recorded answers ({audio_seconds:.0f}s of audio)")
+    print(table.get_string())
+    return engines["sphinx"]
+
+
+async def run_policy(stt, cloud, cases):
+    rows, latencies, local_wins = [], [], 0
+    for case in cases:
+        cloud.transcript = case.transcript
+        start = time.perf_counter()
+        result = await stt.transcribe(case.samples, case.rate)
+        latencies.append((time.perf_counter() - start) * 1000)
+        rows.append((case.intent, result.text))
+        local_wins += result.engine == stt.local.name
+        # A decode the policy walked away from still holds the decoder; let it finish before the next case
+        await asyncio.to_thread(lambda: stt.local.lock.acquire() and stt.local.lock.release())
+    return rows, latencies, local_wins
+
+
+def evaluate_policies(cases, local, args):
+    table = PrettyTable()
+    table.field_names = ["Scenario", "Policy", "Correct", "Confidently wrong", "Unclear", "Median ms", "P95 ms",
+                         "Local answers"]
+    for scenario in args.scenarios:
+        median_ms, fails = SCENARIOS[scenario]
+        for policy in args.policies:
+            cloud = ReplayCloud(median_ms, args.sigma, fails, args.seed)
+            stt = SpeechToText(cloud, local, policy=policy, deadline=args.deadline)
+            logger.info(f"{scenario}: {policy}")
+            rows, latencies, local_wins = asyncio.run(run_policy(stt, cloud, cases))
+            table.add_row([scenario, policy, *score(rows), f"{statistics.median(latencies):.0f}",
+                           f"{percentile(latencies, 95):.0f}", f"{local_wins}/{len(cases)}"])
+    print(f"Policies with a replayed cloud (sigma {args.sigma:g}, hedge deadline {args.deadline:g}s)")
+    print(table.get_string())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate STT backends and race/hedge policies on recorded answers")
+    parser.add_argument("--runs-dir", type=str, default=os.path.join(REPO_ROOT, "runs"),
+                        help="Directory containing run_* folders with response.wav recordings")
+    parser.add_argument("--cloud", type=str, choices=["whisper", "google"],
+                        help="Also transcribe every recording with this live cloud backend")
+    parser.add_argument("--policies", type=str, nargs="+", default=list(POLICIES), choices=POLICIES)
+    parser.add_argument("--scenarios", type=str, nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--deadline", type=float, default=3.0, help="Hedge deadline in seconds (default: 3)")
+    parser.add_argument("--sigma", type=float, default=0.4, help="Log-normal spread of the cloud latency")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--skip-policies", action="store_true", help="Only evaluate the engines")
+    parser.add_argument("--check-only", action="store_true", help="Only run the slow-cloud safety check")
+    parser.add_argument("--verbose", action="store_true", help="Print every transcript")
+    args = parser.parse_args()
+
+    failures = asyncio.run(check_local_answers(args.policies))
+    for policy, cloud, heard, intent in failures:
+        print(f"  UNSAFE: {policy} with cloud '{cloud}' and local '{heard}' decided {intent}")
+    print(f"Slow-cloud safety check: {'FAILED' if failures else 'passed'}")
+    if failures or args.check_only:
+        return 1 if failures else 0
+
+    cases = load_cases(args.runs_dir)
+    if not cases:
+        logger.error(f"No labelled recordings in {args.runs_dir}")
+        return 1
+    local = evaluate_engines(cases, args)
+    if not args.skip_policies:
+        evaluate_policies(cases, local, args)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
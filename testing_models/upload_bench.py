@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Transcription Upload Benchmark
+
+Compares upload profiles (raw recording vs. 16 kHz mono WAV/FLAC/Opus) over the
+runs/*/response.wav corpus: bytes on the wire, in-process encode time and, with
+--transcribe, end-to-end Whisper latency and whether the transcript matches the raw upload.
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from prettytable import PrettyTable
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from stt_upload import PROFILES, encode_for_upload
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("UploadBenchmark")
+
+ALL_PROFILES = ["raw"] + list(PROFILES)
+
+
+def normalize(text):
+    return " ".join("".join(c for c in text.lower() if c.isalnum() or c.isspace()).split())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Whisper upload profiles on recorded responses")
+    parser.add_argument("--runs-dir", type=str, default=os.path.join(Path(__file__).resolve().parent.parent, "runs"),
+                        help="Directory containing run_* folders")
+    parser.add_argument("--profiles", type=str, nargs="+", default=ALL_PROFILES, choices=ALL_PROFILES,
+                        help="Profiles to compare (default: all)")
+    parser.add_argument("--transcribe", action="store_true",
+                        help="Also send every encoding to whisper-1 and measure end-to-end latency")
+    args = parser.parse_args()
+
+    clips = sorted(Path(args.runs_dir).glob("run_*/response.wav"))
+    if not clips:
+        logger.error(f"No response.wav recordings found in {args.runs_dir}")
+        return 1
+    logger.info(f"Benchmarking {len(args.profiles)} profiles on {len(clips)} recordings")
+
+    transcriptions = None
+    if args.transcribe:
+        from openai import OpenAI
+        transcriptions = OpenAI(api_key=os.getenv("OPENAI_API_KEY")).audio.transcriptions
+
+    results = {profile: {"bytes": [], "encode_ms": [], "total_ms": [], "texts": []} for profile in args.profiles}
+    for clip in clips:
+        for profile in args.profiles:
+            start = time.perf_counter()
+            filename, data = encode_for_upload(str(clip), profile)
+            encoded = time.perf_counter()
+            results[profile]["bytes"].append(len(data))
+            results[profile]["encode_ms"].append((encoded - start) * 1000)
+            if transcriptions:
+                transcript = transcriptions.create(model="whisper-1", file=(filename, data))
+                results[profile]["total_ms"].append((time.perf_counter() - start) * 1000)
+                results[profile]["texts"].append(normalize(transcript.text))
+
+    baseline = results.get("raw")
+    table = PrettyTable()
+    table.field_names = ["Profile", "Total KB", "Mean KB/clip", "vs raw", "Encode ms (mean)",
+                         "E2E ms (median)", "E2E ms (max)", "Same text as raw"]
+    for profile, data in results.items():
+        total = sum(data["bytes"])
+        ratio = f"{total / sum(baseline['bytes']) * 100:.1f}%" if baseline else "n/a"
+        e2e_median = f"{statistics.median(data['total_ms']):.0f}" if data["total_ms"] else "n/a"
+        e2e_max = f"{max(data['total_ms']):.0f}" if data["total_ms"] else "n/a"
+        if baseline and data["texts"] and baseline["texts"]:
+            same = sum(a == b for a, b in zip(data["texts"], baseline["texts"]))
+            agreement = f"{same}/{len(data['texts'])}"
+        else:
+            agreement = "n/a"
+        table.add_row([
+            profile,
+            f"{total / 1024:.1f}",
+            f"{total / len(clips) / 1024:.1f}",
+            ratio,
+            f"{statistics.mean(data['encode_ms']):.1f}",
+            e2e_median,
+            e2e_max,
+            agreement,
+        ])
+    print(table.get_string())
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Wake-Word Text Matcher Benchmark
+
+Scores the transcripts behind the runs/run_*/wake_word.wav captures (the run's first
+"Heard:" line, labelled positive when the pipeline logged "Wake word detected!"; the
+corpus wake word is "melon") with wake_match.WakeWordMatcher at a range of thresholds,
+and reports precision, recall and time per call. A second, hand-written set of "woolly"
+near-misses compares the matcher with the substring scan the listener used before. That set
+was used to tune the matcher, so a third set of near-misses written afterwards (other names
+starting with "w", "woolly" inside everyday sentences) gives the false-accept rate on
+phrasing it has not seen.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+from prettytable import PrettyTable
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from run_logger import read_run_log
+from wake_match import WakeWordMatcher
+
+logger = logging.getLogger("WakeMatchBenchmark")
+
+# (transcript, should wake) for the listener's own wake word
+WOOLLY_CASES = [
+    ("woolly", True), ("hey woolly", True), ("Hey, Woolly!", True), ("hey wooly what time is it", True),
+    ("hey wool", True), ("hey woolie", True), ("wooley are you there", True), ("hey wally", True),
+    ("olly", True),
+    ("hey will", False), ("jolly good", False), ("what a lovely holly bush", False), ("molly is coming to visit", False),
+    ("well i think so", False), ("tell me a joke", False), ("what's the weather like today", False),
+    ("i need my wool sweater", False), ("the wolf is at the door", False), ("follow me", False),
+    ("hello how can i help you", False),
+]
+
+# Written after the matcher was tuned and never adjusted against; nothing here should wake it
+UNTUNED_NEAR_MISSES = [
+    "hey willow", "hey wendy", "hey walter", "hey wanda", "hey winnie", "hey warren", "hey wolfie",
+    "hey william are you coming", "hey holly", "hey polly", "hey dolly", "hey molly",
+    "my wooly socks are in the top drawer", "she knitted me a woolly hat", "the woolly mammoth show is on",
+    "can you find my wooly jumper", "it's a bit woolly in here", "that sounds woolly to me",
+    "hey where is the remote", "oh well never mind", "will you turn the light off", "wally world was fun",
+]
+
+
+def legacy_detect(text):
+    """The substring scan detect_wake_word() did before the compiled matcher"""
+    if not text:
+        return False
+    text = text.lower().replace('.', '').replace(',', '').replace('!', '').replace('?', '')
+    wake_words = ["woolly", "wolly", "wooly", "willy", "willie", "wally", "olly", "wollie", "wolli", "woli", "woll"]
+    wake_words += [f"hey {w}" for w in wake_words]
+    return any(wake_word in text for wake_word in wake_words)
+
+
+def load_transcripts(runs_dir):
+    """(first "Heard:" transcript, wake word detected) for every run that heard something"""
+    cases = []
+    for run in sorted(Path(runs_dir).glob("run_*")):
+        messages = [r["msg"] for r in read_run_log(run)]
+        heard = next((m[len("Heard: "):] for m in messages if m.startswith("Heard: ")), None)
+        if heard is not None:
+            cases.append((heard, "Wake word detected!" in messages))
+    return cases
+
+
+def evaluate(predict, cases, repeat=20):
+    """(precision, recall, false positives, false negatives, microseconds per call, misclassified)"""
+    tp = fp = fn = 0
+    missed = []
+    predictions = [predict(text) for text, _ in cases]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text, _ in cases:
+            predict(text)
+    elapsed = (time.perf_counter() - start) / repeat
+    for (text, expected), predicted in zip(cases, predictions):
+        tp += predicted and expected
+        fp += predicted and not expected
+        fn += expected and not predicted
+        if predicted != expected:
+            missed.append(text)
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    return precision, recall, fp, fn, elapsed / len(cases) * 1e6, missed
+
+
+def report(title, rows):
+    table = PrettyTable()
+    table.field_names = ["Matcher", "Precision", "Recall", "False +", "False -", "us/call"]
+    for name, (precision, recall, fp, fn, us, _) in rows:
+        table.add_row([name, f"{precision:.3f}", f"{recall:.3f}", fp, fn, f"{us:.1f}"])
+    print(title)
+    print(table.get_string())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the wake-word text matcher on run transcripts")
+    parser.add_argument("--runs-dir", type=str, default=os.path.join(Path(__file__).resolve().parent.parent, "runs"),
+                        help="Directory containing run_* folders")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.7, 0.8, 0.85, 0.9],
+                        help="Matcher thresholds to compare (default: 0.7 0.8 0.85 0.9)")
+    parser.add_argument("--show-errors", action="store_true", help="Print misclassified transcripts")
+    args = parser.parse_args()
+
+    cases = load_transcripts(args.runs_dir)
+    positives = sum(1 for _, expected in cases if expected)
+    logger.info(f"{len(cases)} transcripts, {positives} labelled as wake word")
+
+    rows = []
+    for threshold in args.thresholds:
+        matcher = WakeWordMatcher(words=("melon",), variants=(), prefixes=("hey", "hello", "hi"), threshold=threshold)
+        rows.append((f"matcher @ {threshold}", evaluate(matcher.matches, cases)))
+    report(f"Runs corpus ('melon', {len(cases)} transcripts):", rows)
+
+    rows = [("legacy substring scan", evaluate(legacy_detect, WOOLLY_CASES))]
+    for threshold in args.thresholds:
+        matcher = WakeWordMatcher(threshold=threshold)
+        rows.append((f"matcher @ {threshold}", evaluate(matcher.matches, WOOLLY_CASES)))
+    report(f"'woolly' near-miss set ({len(WOOLLY_CASES)} transcripts):", rows)
+
+    untuned = [(text, False) for text in UNTUNED_NEAR_MISSES]
+    untuned_rows = [("legacy substring scan", evaluate(legacy_detect, untuned))]
+    for threshold in args.thresholds:
+        matcher = WakeWordMatcher(threshold=threshold)
+        untuned_rows.append((f"matcher @ {threshold}", evaluate(matcher.matches, untuned)))
+    table = PrettyTable()
+    table.field_names = ["Matcher", "False accepts", "False-accept rate"]
+    for name, (_, _, fp, _, _, _) in untuned_rows:
+        table.add_row([name, fp, f"{fp / len(untuned):.1%}"])
+    print(f"Untuned near-miss set ({len(untuned)} transcripts, none should wake):")
+    print(table.get_string())
+
+    if args.show_errors:
+        for name, result in rows + untuned_rows:
+            print(f"{name}: {result[5]}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    exit(main())
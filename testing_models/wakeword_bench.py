@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Wake Word Detector Benchmark
+
+Replays the runs/run_*/wake_word.wav captures through a local wake-word detector and
+compares its hits against what the cloud pipeline decided for the same clip (the run's
+run log contains "Wake word detected!" for positives).
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+from prettytable import PrettyTable
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from audio_utils import read_wav, resample
+from run_logger import read_run_log
+from wakeword import create_detector
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("WakeWordBenchmark")
+
+
+def load_corpus(runs_dir):
+    """Return (wav_path, is_positive) for every wake_word.wav capture that has a log"""
+    corpus = []
+    for run in sorted(Path(runs_dir).glob("run_*")):
+        wav_path = run / "wake_word.wav"
+        records = read_run_log(run)
+        if not wav_path.exists() or not records:
+            continue
+        corpus.append((wav_path, any(r["msg"] == "Wake word detected!" for r in records)))
+    return corpus
+
+
+def run_clip(detector, samples):
+    """Feed a clip through the detector frame by frame; returns (hit, seconds spent, frames processed)"""
+    detector.reset()
+    n = detector.frame_length
+    hit = False
+    processed = 0
+    start = time.perf_counter()
+    for offset in range(0, len(samples) - n + 1, n):
+        processed += 1
+        if detector.process(samples[offset:offset + n]):
+            hit = True
+            break
+    return hit, time.perf_counter() - start, processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a local wake-word detector on recorded captures")
+    parser.add_argument("--runs-dir", type=str, default=os.path.join(Path(__file__).resolve().parent.parent, "runs"),
+                        help="Directory containing run_* folders")
+    parser.add_argument("--engine", type=str, default="burst", choices=["burst", "porcupine"],
+                        help="Detector to benchmark (default: burst)")
+    parser.add_argument("--max-clips", type=int, help="Only use the first N clips")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.runs_dir)
+    if args.max_clips:
+        corpus = corpus[:args.max_clips]
+    if not corpus:
+        logger.error(f"No labelled wake_word.wav captures found in {args.runs_dir}")
+        return 1
+
+    detector = create_detector(args.engine)
+    logger.info(f"Benchmarking {type(detector).__name__} on {len(corpus)} clips")
+
+    tp = fp = tn = fn = 0
+    audio_seconds = 0.0
+    processing_seconds = 0.0
+    frames = 0
+    for wav_path, positive in corpus:
+        samples, rate = read_wav(wav_path)
+        samples = resample(samples, rate, detector.sample_rate)
+        audio_seconds += len(samples) / detector.sample_rate
+        hit, spent, processed = run_clip(detector, samples)
+        processing_seconds += spent
+        frames += processed
+        if hit and positive:
+            tp += 1
+        elif hit:
+            fp += 1
+        elif positive:
+            fn += 1
+            logger.debug(f"Missed positive: {wav_path}")
+        else:
+            tn += 1
+
+    total = tp + fp + tn + fn
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+
+    table = PrettyTable()
+    table.field_names = ["Metric", "Value"]
+    table.add_row(["Clips (positive / negative)", f"{tp + fn} / {fp + tn}"])
+    table.add_row(["Precision", f"{precision * 100:.2f}%"])
+    table.add_row(["Recall", f"{recall * 100:.2f}%"])
+    table.add_row(["Clips sent to cloud", f"{tp + fp} ({(tp + fp) / total * 100:.1f}%)"])
+    table.add_row(["Cloud transcriptions avoided", f"{tn + fn} ({(tn + fn) / total * 100:.1f}%)"])
+    table.add_row(["Audio processed (s)", f"{audio_seconds:.1f}"])
+    table.add_row(["Real-time factor", f"{processing_seconds / audio_seconds:.5f}" if audio_seconds else "n/a"])
+    table.add_row(["Per-frame cost (us)", f"{processing_seconds / max(frames, 1) * 1e6:.1f}"])
+    print(table.get_string())
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,350 @@
+"""
+Lightweight tracing for the hot path: monotonic-clock spans, counters and gauges.
+
+Enabled with TRACING=1. Spans (record, vad, encode, transcribe, classify, route, tts, play,
+outcall, ...) feed per-name latency histograms and, inside a run(run_folder) block, the
+run's own trace, which is written to <run folder>/trace.json when the block ends. Counters
+(API calls, bytes uploaded, TTS cache hits, ...) are kept process-wide and per run. start()
+serves everything, plus gauges from registered collectors, in the Prometheus text format on
+http://127.0.0.1:METRICS_PORT/metrics.
+
+When tracing is disabled span() hands back one shared no-op context manager and count()
+returns after a single flag check, so the calls can stay in the hot path on production
+devices.
+
+    python tracing.py show runs/run_20250522_101502     # waterfall of a run's trace.json
+    python tracing.py overhead                          # cost per call, disabled and enabled
+"""
+import argparse
+import contextlib
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRACE_FILENAME = "trace.json"
+METRICS_PREFIX = "assistant"
+
+_enabled = os.getenv("TRACING", "0") == "1"
+
+
+class LatencyHistogram:
+    """Cumulative latency buckets in milliseconds, Prometheus style"""
+    BOUNDS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+    def __init__(self, bounds_ms=None):
+        self.bounds_ms = bounds_ms or self.BOUNDS_MS
+        self.lock = threading.Lock()
+        self.counts = [0] * len(self.bounds_ms)
+        self.total_ms = 0.0
+        self.samples = 0
+
+    def observe(self, ms):
+        with self.lock:
+            for i, bound in enumerate(self.bounds_ms):
+                if ms <= bound:
+                    self.counts[i] += 1
+            self.total_ms += ms
+            self.samples += 1
+
+    def snapshot(self):
+        with self.lock:
+            buckets = {("+Inf" if b == float("inf") else str(b)): c for b, c in zip(self.bounds_ms, self.counts)}
+            return {"buckets": buckets, "count": self.samples, "sum_ms": round(self.total_ms, 1)}
+
+
+# Spans range from a few ms of VAD to a minute of playback
+SPAN_BOUNDS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float("inf"))
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.id = next(_span_ids)
+        self.parent = None
+        self.start = None
+        self._token = None
+
+    def set(self, **attrs):
+        """Attach attributes (e.g. bytes, model, cache hit) to the span"""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent = parent.id if parent is not None else None
+        self._token = _current_span.set(self)
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.monotonic()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _record(self.name, self.start, end, self.attrs, self.id, self.parent)
+        return False
+
+
+class RunTrace:
+    def __init__(self, run_folder):
+        self.run_folder = run_folder
+        self.start = time.monotonic()
+        self.lock = threading.Lock()
+        self.spans = []
+        self.counters = {}
+
+    def to_json(self):
+        with self.lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self.counters.items())]
+        return {"run": os.path.basename(self.run_folder), "spans": spans, "counters": counters}
+
+
+_span_ids = itertools.count(1)
+_current_span = contextvars.ContextVar("span", default=None)
+_current_run = contextvars.ContextVar("run", default=None)
+_lock = threading.Lock()
+_histograms = {}  # span name -> LatencyHistogram
+_counters = {}    # (name, labels) -> value
+_collectors = []  # callables returning {gauge name: value}
+_server = None
+
+
+def enabled():
+    return _enabled
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+
+def span(name, **attrs):
+    """Time a block: with span("transcribe", model="whisper-1") as s: ..."""
+    if not _enabled:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def record(name, start, end, **attrs):
+    """Add a span that was timed elsewhere (monotonic start and end)"""
+    if _enabled:
+        parent = _current_span.get()
+        _record(name, start, end, attrs, next(_span_ids), parent.id if parent is not None else None)
+
+
+def _record(name, start, end, attrs, span_id, parent):
+    ms = (end - start) * 1000
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _lock:
+            histogram = _histograms.setdefault(name, LatencyHistogram(SPAN_BOUNDS_MS))
+    histogram.observe(ms)
+    run = _current_run.get()
+    if run is not None:
+        entry = {"id": span_id, "parent": parent, "name": name, "start_ms": round((start - run.start) * 1000, 3),
+                 "duration_ms": round(ms, 3)}
+        if attrs:
+            entry["attrs"] = attrs
+        with run.lock:
+            run.spans.append(entry)
+
+
+def count(name, n=1, **labels):
+    """Add to a counter, e.g. count("api_calls", api="whisper") or count("upload_bytes", len(data))"""
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+    run = _current_run.get()
+    if run is not None:
+        with run.lock:
+            run.counters[key] = run.counters.get(key, 0) + n
+
+
+def add_collector(collector):
+    """Register a callable returning {gauge name: number}, read on every scrape"""
+    _collectors.append(collector)
+
+
+@contextlib.contextmanager
+def run(run_folder):
+    """Collect the spans and counters of one interaction and write them to its trace.json"""
+    if not _enabled:
+        yield None
+        return
+    trace = RunTrace(run_folder)
+    token = _current_run.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_run.reset(token)
+        try:
+            with open(os.path.join(run_folder, TRACE_FILENAME), 'w') as f:
+                json.dump(trace.to_json(), f, indent=1)
+        except OSError as e:
+            print(f"Could not write trace for {run_folder}: {e}")
+
+
+async def traced(run_folder, awaitable):
+    """Await a coroutine inside run(run_folder); for flows handed to the runtime from another thread"""
+    with run(run_folder):
+        return await awaitable
+
+
+def _label_string(labels):
+    return ",".join(f'{key}="{value}"' for key, value in labels)
+
+
+def render_metrics():
+    """Everything collected so far in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        histograms = dict(_histograms)
+        counters = dict(_counters)
+    if histograms:
+        metric = f"{METRICS_PREFIX}_span_duration_ms"
+        lines.append(f"# TYPE {metric} histogram")
+        for name, histogram in sorted(histograms.items()):
+            snapshot = histogram.snapshot()
+            for bound, value in snapshot["buckets"].items():
+                lines.append(f'{metric}_bucket{{span="{name}",le="{bound}"}} {value}')
+            lines.append(f'{metric}_sum{{span="{name}"}} {snapshot["sum_ms"]}')
+            lines.append(f'{metric}_count{{span="{name}"}} {snapshot["count"]}')
+    for name in sorted({name for name, _ in counters}):
+        metric = f"{METRICS_PREFIX}_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for (counter, labels), value in sorted(counters.items()):
+            if counter == name:
+                lines.append(f"{metric}{{{_label_string(labels)}}} {value}" if labels else f"{metric} {value}")
+    # Collectors may share gauge names (one per device): group them so each family is typed once
+    families = {}
+    for collector in list(_collectors):
+        try:
+            gauges = collector()
+        except Exception as e:
+            print(f"Metrics collector failed: {e}")
+            continue
+        for name, value in gauges.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                # A gauge name may carry labels, e.g. 'playback_underruns{device="hw:3,0"}'
+                families.setdefault(name.split("{")[0], {})[name] = value
+    for base, series in sorted(families.items()):
+        lines.append(f"# TYPE {METRICS_PREFIX}_{base} gauge")
+        for name, value in sorted(series.items()):
+            lines.append(f"{METRICS_PREFIX}_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start(port=None, host=None):
+    """Serve /metrics in the background if tracing is enabled; safe to call more than once"""
+    global _server
+    with _lock:
+        if not _enabled or _server is not None:
+            return _server
+        port = int(port or os.getenv("METRICS_PORT", "9464"))
+        host = host or os.getenv("METRICS_HOST", "127.0.0.1")
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            print(f"Metrics endpoint not started on {host}:{port}: {e}")
+            return None
+        _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"Metrics on http://{host}:{port}/metrics")
+    return _server
+
+
+def show(run_folder):
+    with open(os.path.join(run_folder, TRACE_FILENAME), 'r') as f:
+        trace = json.load(f)
+    depth = {}
+    for entry in trace["spans"]:
+        depth[entry["id"]] = depth.get(entry["parent"], -1) + 1
+        attrs = " ".join(f"{key}={value}" for key, value in entry.get("attrs", {}).items())
+        print(f"{entry['start_ms']:9.1f} ms {'  ' * depth[entry['id']]}{entry['name']:<14} "
+              f"{entry['duration_ms']:9.1f} ms  {attrs}")
+    for counter in trace["counters"]:
+        labels = ",".join(f"{key}={value}" for key, value in counter["labels"].items())
+        print(f"{counter['name']}{'{' + labels + '}' if labels else ''} = {counter['value']}")
+
+
+def overhead(calls=200000):
+    """Seconds per span()/count() call with tracing disabled and enabled"""
+    was_enabled = _enabled
+    results = {}
+    try:
+        for on in (False, True):
+            enable(on)
+            start = time.perf_counter()
+            for _ in range(calls):
+                with span("overhead"):
+                    pass
+            span_cost = (time.perf_counter() - start) / calls
+            start = time.perf_counter()
+            for _ in range(calls):
+                count("overhead_calls")
+            results["enabled" if on else "disabled"] = (span_cost, (time.perf_counter() - start) / calls)
+    finally:
+        enable(was_enabled)
+        with _lock:
+            _histograms.pop("overhead", None)
+            _counters.pop(("overhead_calls", ()), None)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect run traces and measure tracing overhead")
+    parser.add_argument("command", choices=["show", "overhead"])
+    parser.add_argument("run", nargs="?", help="Run folder for show")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        if not args.run or not os.path.exists(os.path.join(args.run, TRACE_FILENAME)):
+            print(f"No {TRACE_FILENAME} in {args.run}")
+            return 1
+        show(args.run)
+    else:
+        for mode, (span_cost, count_cost) in overhead().items():
+            print(f"{mode:>8}: span {span_cost * 1e9:.0f} ns, count {count_cost * 1e9:.0f} ns per call")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
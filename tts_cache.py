@@ -0,0 +1,147 @@
+"""
+Content-addressed cache of rendered TTS phrases.
+
+Each entry is a ready-to-play mono 16-bit WAV keyed by (text, voice, model, sample rate, gain),
+so a repeated phrase costs no network call and no ffmpeg spawn. Entries are evicted least
+recently used first once the cache grows past its byte budget; a hit refreshes the file's
+mtime, which doubles as the LRU clock.
+"""
+import hashlib
+import json
+import os
+import subprocess
+import threading
+from pathlib import Path
+
+import numpy as np
+
+import tracing
+from audio_utils import resample, write_wav
+
+OPENAI_PCM_RATE = 24000
+
+
+def apply_gain(samples, gain):
+    """Scale int16 samples, clipping instead of wrapping"""
+    if gain == 1.0:
+        return samples
+    scaled = samples.astype(np.float32) * gain
+    return np.clip(scaled, -32768, 32767).astype(np.int16)
+
+
+def synthesize_openai(text, voice, model, sample_rate, gain):
+    """Render text with OpenAI TTS as raw PCM, then resample and apply gain in-process"""
+    from openai import OpenAI
+
+    client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    response = client.audio.speech.create(
+        model=model,
+        voice=voice,
+        input=text,
+        response_format="pcm"
+    )
+    samples = np.frombuffer(response.content, dtype=np.int16)
+    return apply_gain(resample(samples, OPENAI_PCM_RATE, sample_rate), gain)
+
+
+def synthesize_gtts(text, voice, model, sample_rate, gain):
+    """Render text with gTTS (voice is the language code); one ffmpeg decode per cache fill"""
+    from io import BytesIO
+    from gtts import gTTS
+
+    mp3 = BytesIO()
+    gTTS(text=text, lang=voice).write_to_fp(mp3)
+    result = subprocess.run([
+        "ffmpeg", "-loglevel", "error",
+        "-i", "pipe:0",
+        "-f", "s16le",
+        "-ac", "1",
+        "-ar", str(sample_rate),
+        "pipe:1"
+    ], input=mp3.getvalue(), capture_output=True, check=True)
+    return apply_gain(np.frombuffer(result.stdout, dtype=np.int16), gain)
+
+
+SYNTHESIZERS = {
+    "gtts": synthesize_gtts,
+}
+
+
+def synthesizer_for(model):
+    return SYNTHESIZERS.get(model, synthesize_openai)
+
+
+class TTSCache:
+    """Size-bounded LRU store of rendered phrases on disk"""
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = Path(cache_dir or os.getenv("TTS_CACHE_DIR", "tts_cache"))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("TTS_CACHE_MAX_MB", "64")) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text, voice, model, sample_rate, gain):
+        params = json.dumps([text, voice, model, int(sample_rate), round(float(gain), 3)])
+        return hashlib.sha256(params.encode("utf-8")).hexdigest()
+
+    def path_for(self, key):
+        return self.cache_dir / f"{key}.wav"
+
+    def lookup(self, text, voice, model, sample_rate, gain=1.0):
+        """Path of the cached clip, or None on a miss"""
+        path = self.path_for(self.key(text, voice, model, sample_rate, gain))
+        with self.lock:
+            if path.exists():
+                os.utime(path)
+                self.hits += 1
+                tracing.count("tts_cache_hits")
+                return str(path)
+            self.misses += 1
+        tracing.count("tts_cache_misses")
+        return None
+
+    def store(self, text, voice, model, sample_rate, gain, samples):
+        """Save rendered int16 samples (array or raw PCM bytes) and return the clip path"""
+        if isinstance(samples, (bytes, bytearray)):
+            samples = np.frombuffer(samples, dtype=np.int16)
+        path = self.path_for(self.key(text, voice, model, sample_rate, gain))
+        tmp_path = path.with_suffix(".tmp")
+        write_wav(tmp_path, samples, sample_rate)
+        with self.lock:
+            os.replace(tmp_path, path)
+            self._evict()
+        return str(path)
+
+    def get(self, text, voice="shimmer", model="tts-1-hd", sample_rate=44100, gain=1.0):
+        """Path of a ready-to-play clip, synthesizing and storing it on a miss"""
+        path = self.lookup(text, voice, model, sample_rate, gain)
+        if path:
+            return path
+        tracing.count("api_calls", api="gtts" if model == "gtts" else "tts")
+        with tracing.span("tts_synthesis", model=model, chars=len(text)):
+            samples = synthesizer_for(model)(text, voice, model, sample_rate, gain)
+        return self.store(text, voice, model, sample_rate, gain, samples)
+
+    def _evict(self):
+        entries = [(p.stat().st_mtime, p.stat().st_size, p) for p in self.cache_dir.glob("*.wav")]
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+_default_cache = None
+
+
+def get_cache():
+    """Process-wide cache shared by every entry point"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = TTSCache()
+    return _default_cache
@@ -0,0 +1,180 @@
+"""
+Streaming text-to-speech: start playing OpenAI TTS audio while it is still downloading.
+
+speak_text_stream() goes one step further for LLM answers: text deltas are split into
+sentences as they arrive and each sentence is synthesized and queued for playback while
+the model is still generating the rest.
+"""
+import queue
+import re
+import threading
+import time
+
+import tracing
+from playback import get_engine
+
+# OpenAI returns headerless 24kHz, 16-bit, mono little-endian samples for response_format="pcm"
+PCM_SAMPLE_RATE = 24000
+PCM_SAMPLE_WIDTH = 2
+PCM_CHANNELS = 1
+
+
+class TeeSink:
+    """Passes chunks through to another sink while keeping a copy of the PCM"""
+    def __init__(self, sink):
+        self.sink = sink
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+        self.sink.write(data)
+
+    def close(self):
+        self.sink.close()
+
+    def pcm(self):
+        return b"".join(self.chunks)
+
+
+# Sentence end: terminal punctuation (plus closing quotes/brackets) followed by whitespace, or a line break
+SENTENCE_BOUNDARY = re.compile(r"[.!?]+[\"')\]]*\s+|\n+")
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "vs", "etc", "e.g", "i.e", "a.m", "p.m"}
+
+
+class SentenceSplitter:
+    """Accumulates streamed text and hands back complete sentences"""
+    def __init__(self, min_chars=16):
+        self.min_chars = min_chars  # shorter fragments are merged into the next sentence
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_BOUNDARY.finditer(self.buffer):
+            candidate = self.buffer[start:match.end()].strip()
+            words = candidate.rstrip(".!?\"')]").split()
+            if not words or words[-1].lower() in ABBREVIATIONS or len(candidate) < self.min_chars:
+                continue
+            sentences.append(candidate)
+            start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        rest, self.buffer = self.buffer.strip(), ""
+        return [rest] if rest else []
+
+
+def open_sink(device=None):
+    """Open a streaming clip on the shared playback engine (of an output device)"""
+    return get_engine(device).open_stream(PCM_SAMPLE_RATE, name="tts")
+
+
+def stream_speech(client, text, voice="onyx", model="tts-1", sink=None, chunk_size=4096):
+    """
+    Synthesize text with OpenAI TTS and feed the PCM chunks to a playback sink as they arrive.
+    Args:
+        client: OpenAI client
+        text: Text to speak
+        voice: OpenAI TTS voice
+        model: OpenAI TTS model
+        sink: Object with write(bytes)/close(); a playback engine stream is opened (and closed) if None
+        chunk_size: Bytes per chunk read from the HTTP response
+    Returns:
+        Time to first audio in seconds (None if no audio was received)
+    """
+    start = time.monotonic()
+    owns_sink = sink is None
+    if owns_sink:
+        sink = open_sink()
+
+    time_to_first_audio = None
+    tracing.count("api_calls", api="tts")
+    try:
+        with client.audio.speech.with_streaming_response.create(
+            model=model,
+            voice=voice,
+            input=text,
+            response_format="pcm"
+        ) as response:
+            for chunk in response.iter_bytes(chunk_size):
+                if not chunk:
+                    continue
+                if time_to_first_audio is None:
+                    time_to_first_audio = time.monotonic() - start
+                    print(f"Time to first audio: {time_to_first_audio * 1000:.0f} ms")
+                sink.write(chunk)
+    finally:
+        if owns_sink:
+            sink.close()
+
+    end = time.monotonic()
+    total = end - start
+    tracing.record("tts_stream", start, end, model=model,
+                   first_audio_ms=round(time_to_first_audio * 1000, 1) if time_to_first_audio is not None else None)
+    print(f"Speech finished in {total * 1000:.0f} ms")
+    return time_to_first_audio
+
+
+def speak_text_stream(client, deltas, voice="onyx", model="tts-1"):
+    """
+    Speak text that is still being generated, one sentence at a time.
+    Args:
+        client: OpenAI client
+        deltas: Iterable of text fragments, e.g. the content deltas of a streamed chat completion
+        voice: OpenAI TTS voice
+        model: OpenAI TTS model
+    Returns:
+        dict with the full text, sentence count and monotonic times of the first sentence,
+        the first audible sample and the end of playback
+    """
+    sentences = queue.Queue()
+    clips = []
+
+    def synthesize():
+        # Downloads run ahead of playback, so sentence n+1 is fetched while sentence n plays
+        while True:
+            sentence = sentences.get()
+            if sentence is None:
+                return
+            writer = open_sink()
+            try:
+                stream_speech(client, sentence, voice=voice, model=model, sink=writer)
+            except Exception as e:
+                print(f"Error in text-to-speech: {e}")
+            clips.append(writer.finish())
+
+    worker = threading.Thread(target=synthesize, name="tts-sentences", daemon=True)
+    worker.start()
+
+    splitter = SentenceSplitter()
+    parts = []
+    count = 0
+    first_sentence_at = None
+    try:
+        for delta in deltas:
+            parts.append(delta)
+            for sentence in splitter.feed(delta):
+                if first_sentence_at is None:
+                    first_sentence_at = time.monotonic()
+                sentences.put(sentence)
+                count += 1
+    finally:
+        for sentence in splitter.flush():
+            if first_sentence_at is None:
+                first_sentence_at = time.monotonic()
+            sentences.put(sentence)
+            count += 1
+        sentences.put(None)
+        worker.join()
+        for clip in clips:
+            clip.wait()
+
+    return {
+        "text": "".join(parts),
+        "sentences": count,
+        "first_sentence_at": first_sentence_at,
+        "first_audio_at": clips[0].started_at if clips else None,
+        "finished_at": clips[-1].finished_at if clips else None,
+    }
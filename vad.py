@@ -0,0 +1,174 @@
+"""Energy-based voice activity endpointing for microphone captures."""
+import subprocess
+import time
+import wave
+
+import numpy as np
+
+import tracing
+from audio_utils import frame_rms
+
+
+class Endpointer:
+    """
+    Decide when a capture should stop, one fixed-size frame at a time.
+
+    The first calibration_ms of audio sets the noise floor; a frame counts as speech when
+    its RMS is threshold_ratio times above it (and above min_rms). Capture stops when:
+        - no_speech: nothing was said within leading_silence seconds
+        - end_of_speech: trailing_silence seconds of silence followed speech
+        - max_duration: the hard cap was reached
+    """
+    def __init__(self, fs=44100, frame_ms=30, leading_silence=3.0, trailing_silence=0.8,
+                 max_duration=10.0, threshold_ratio=3.0, min_rms=300.0, calibration_ms=300,
+                 min_speech_ms=120):
+        self.fs = fs
+        self.frame_ms = frame_ms
+        self.frame_samples = int(fs * frame_ms / 1000)
+        self.leading_silence = leading_silence
+        self.trailing_silence = trailing_silence
+        self.max_duration = max_duration
+        self.threshold_ratio = threshold_ratio
+        self.min_rms = min_rms
+        self.calibration_frames = max(1, calibration_ms // frame_ms)
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+
+        self.noise_floor = None
+        self._calibration = []
+        self.frames_seen = 0
+        self.voiced_run = 0
+        self.silence_run = 0
+        self.speech_started = False
+        self.speech_start_time = None
+        self.last_speech_time = None
+        self.stop_reason = None
+        self.processing_seconds = 0.0  # CPU time spent deciding, for tracing
+
+    @property
+    def elapsed(self):
+        """Seconds of audio processed so far"""
+        return self.frames_seen * self.frame_ms / 1000
+
+    @property
+    def threshold(self):
+        if self.noise_floor is None:
+            return self.min_rms
+        return max(self.min_rms, self.noise_floor * self.threshold_ratio)
+
+    def process(self, frame):
+        """Feed one frame of 16-bit mono PCM; returns True once the capture should stop"""
+        start = time.perf_counter()
+        stop = self._process(frame)
+        self.processing_seconds += time.perf_counter() - start
+        return stop
+
+    def _process(self, frame):
+        rms = frame_rms(np.frombuffer(frame, dtype=np.int16))
+        self.frames_seen += 1
+
+        if self.frames_seen <= self.calibration_frames and not self.speech_started:
+            self._calibration.append(rms)
+            self.noise_floor = float(np.median(self._calibration))
+
+        voiced = rms >= self.threshold
+        if voiced:
+            self.voiced_run += 1
+            self.silence_run = 0
+            if not self.speech_started and self.voiced_run >= self.min_speech_frames:
+                self.speech_started = True
+                self.speech_start_time = self.elapsed - self.voiced_run * self.frame_ms / 1000
+            if self.speech_started:
+                self.last_speech_time = self.elapsed
+        else:
+            self.voiced_run = 0
+            self.silence_run += 1
+            # Let the noise floor follow slow changes in room noise between words
+            if self.noise_floor is not None and self.frames_seen > self.calibration_frames:
+                self.noise_floor = 0.95 * self.noise_floor + 0.05 * rms
+
+        if self.elapsed >= self.max_duration:
+            self.stop_reason = "max_duration"
+        elif not self.speech_started and self.elapsed >= self.leading_silence:
+            self.stop_reason = "no_speech"
+        elif self.speech_started and self.silence_run * self.frame_ms / 1000 >= self.trailing_silence:
+            self.stop_reason = "end_of_speech"
+        return self.stop_reason is not None
+
+
+def arecord_command(device, fs):
+    """arecord invocation that streams raw mono 16-bit PCM to stdout"""
+    return ["arecord", "-q", "-D", device, "-t", "raw", "-f", "S16_LE", "-r", str(fs), "-c", "1"]
+
+
+def capture_summary(endpointer, max_duration, start, gated_frames=0):
+    """Summary of a finished capture: stop reason, captured, wall and saved seconds"""
+    end = time.monotonic()
+    # The VAD span is the summed per-frame decision time, placed at the end of the capture
+    tracing.record("vad", end - endpointer.processing_seconds, end, frames=endpointer.frames_seen,
+                   stop_reason=endpointer.stop_reason)
+    captured = endpointer.elapsed
+    return {
+        "stop_reason": endpointer.stop_reason,
+        "speech_detected": endpointer.speech_started,
+        "captured_seconds": captured,
+        "wall_seconds": end - start,
+        "gated_seconds": gated_frames * endpointer.frame_ms / 1000,
+        "saved_seconds": max(0.0, max_duration - captured),
+    }
+
+
+def save_capture(output_path, frames, fs, endpointer, max_duration, start, gated_frames):
+    """Write the captured frames as a WAV and return the capture summary"""
+    summary = capture_summary(endpointer, max_duration, start, gated_frames)
+    with wave.open(output_path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(fs)
+        wf.writeframes(b"".join(frames))
+    return {"path": output_path, **summary}
+
+
+def record_until_silence(output_path, max_duration=10.0, device="plughw:3,0", fs=44100,
+                         leading_silence=3.0, trailing_silence=0.8, gate=None):
+    """
+    Record from the microphone until the speaker stops talking (or the cap is hit).
+    Args:
+        output_path: Where to write the mono 16-bit WAV
+        max_duration: Hard cap in seconds, the old fixed recording length
+        device: ALSA capture device
+        fs: Sample rate
+        leading_silence: Give up if no speech starts within this many seconds
+        trailing_silence: Stop after this much silence following speech
+        gate: Optional callable; frames are discarded until it returns True (e.g. while a prompt
+              is still playing), so the device can be opened early without recording the prompt
+    Returns:
+        Dict with the stop reason, captured seconds, wall time and seconds saved versus max_duration
+    """
+    endpointer = Endpointer(fs=fs, leading_silence=min(leading_silence, max_duration),
+                            trailing_silence=trailing_silence, max_duration=max_duration)
+    frame_bytes = endpointer.frame_samples * 2
+
+    start = time.monotonic()
+    process = subprocess.Popen(arecord_command(device, fs), stdout=subprocess.PIPE)
+
+    frames = []
+    gated_frames = 0
+    try:
+        while True:
+            frame = process.stdout.read(frame_bytes)
+            if gate is not None and len(frame) == frame_bytes and not gate():
+                gated_frames += 1
+                continue
+            if len(frame) < frame_bytes:
+                endpointer.stop_reason = endpointer.stop_reason or "device_closed"
+                if frame:
+                    frames.append(frame)
+                break
+            frames.append(frame)
+            if endpointer.process(frame):
+                break
+    finally:
+        process.terminate()
+        process.wait()
+
+    return save_capture(output_path, frames, fs, endpointer, max_duration, start, gated_frames)
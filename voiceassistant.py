@@ -1,88 +1,87 @@
 import openai
 import os
-import time
-import threading
-from datetime import datetime
-import requests
+import asyncio
+import emergency
+import tracing
 from dotenv import load_dotenv
-import subprocess
+from playback import get_engine
+from runtime import StageTimeout, capture_until_silence, drain, get_async_openai, get_runtime, stage
+from stt_backends import get_stt
+from intent_fastpath import classify_local, is_confident, normalize_intent
+from interaction import InteractionScheduler
+from run_logger import close_run_logger, create_run_folder, get_run_logger
 
 load_dotenv() 
 EMERGENCYNUMBER = "+14166299094"
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-def create_run_folder():
-    # Create runs directory if it doesn't exist
-    os.makedirs("runs", exist_ok=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    folder_name = f"run_{timestamp}"
-    folder_path = os.path.join("runs", folder_name)
-    os.makedirs(folder_path, exist_ok=True)
-    return folder_path
-
-def log_interaction(message, run_folder):
-    log_file = os.path.join(run_folder, "interaction_log.txt")
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(log_file, "a") as f:
-        f.write(f"[{timestamp}] {message}\n")
+def log_interaction(message, run_folder, **fields):
+    # Buffered; written to interaction_log.jsonl by the run logger's flush thread
+    get_run_logger(run_folder).log(message, **fields)
+
+def log_emergency(message, run_folder, **fields):
+    # Returns at once; the flush thread writes and fsyncs the record, so the outcall isn't held up
+    get_run_logger(run_folder).emergency(message, **fields)
 
 def play_audio_file(output_file):
-    def play_audio():
-        if os.name == 'posix':
-            # Use aplay with specific device output for Orange Pi
-            subprocess.run(["aplay", "-D", "plughw:3,0", output_file])
-        else:
-            os.system(f"start {output_file}")
-    
-    threading.Thread(target=play_audio).start()
+    # Queued on the shared playback engine; returns without waiting for playback
+    return get_engine().play(output_file)
 
 def play_prompt(output_file="audiofiles/prompt.wav"):
-    play_audio_file(output_file)
+    return play_audio_file(output_file)
+
+RESPONSE_AUDIO = {
+    "ok": "audiofiles/false_alarm.wav",
+    "not_ok": "audiofiles/emergency.wav",
+    "unclear": "audiofiles/unclear_response.wav",
+}
 
 def play_response_audio(intent):
-    if intent == "ok":
-        play_audio_file("audiofiles/false_alarm.wav")
-    elif intent == "not_ok":
-        play_audio_file("audiofiles/emergency.wav")
-    elif intent == "unclear":
-        play_audio_file("audiofiles/unclear_response.wav")
+    if intent in RESPONSE_AUDIO:
+        return play_audio_file(RESPONSE_AUDIO[intent])
 
 # Record the response from the user
-def record_audio(run_folder, filename="response.wav", duration=10, fs=44100):
+async def record_audio(run_folder, filename="response.wav", duration=10, fs=44100, gate=None):
     log_interaction("Starting audio recording", run_folder)
     print("Recording response...")
-    
-    # Use arecord with specific device for Orange Pi
+
     output_path = os.path.join(run_folder, filename)
-    subprocess.run([
-        "arecord",
-        "-D", "plughw:3,0",
-        "-f", "cd",
-        "-d", str(duration),
-        output_path
-    ])
-    
+    # Stop as soon as the speaker finishes; duration is only the upper bound
+    result = await stage("record", capture_until_silence(output_path, max_duration=duration, fs=fs, gate=gate),
+                         timeout=duration + 5)
+    log_interaction(
+        f"Endpointed recording: {result['captured_seconds']:.2f}s captured of {duration}s max "
+        f"({result['stop_reason']}), latency saved: {result['saved_seconds']:.2f}s",
+        run_folder
+    )
     log_interaction(f"Audio recording saved to {output_path}", run_folder)
     print("Recording complete.")
     return output_path
 
-# Using Whisper to transcribe the audio
-def transcribe_audio(audio_path, run_folder):
+# Whisper transcribes the audio, hedged by the local engine when the network is slow or down
+async def transcribe_audio(audio_path, run_folder):
     log_interaction("Starting audio transcription", run_folder)
     print("Transcribing...")
-    with open(audio_path, "rb") as f:
-        transcript = openai.audio.transcriptions.create(
-            model="whisper-1",
-            file=f
-        )
-    log_interaction(f"Transcription: {transcript.text}", run_folder)
-    print("Transcription:", transcript.text)
-    return transcript.text
+    result = await stage("transcribe", get_stt().transcribe_file(audio_path))
+    log_interaction(f"Transcribed by {result.engine} in {result.seconds * 1000:.0f} ms", run_folder,
+                    engine=result.engine)
+    log_interaction(f"Transcription: {result.text}", run_folder)
+    print("Transcription:", result.text)
+    return result.text
 
 # Interpret the text using GPT to ensure that we get an accurate classification
-def interpret_intent(text, run_folder):
+async def interpret_intent(text, run_folder):
     log_interaction("Starting intent classification", run_folder)
+
+    # Obvious answers are classified locally; only ambiguous ones are sent to the LLM
+    local_intent, confidence = classify_local(text)
+    if is_confident(local_intent, confidence):
+        log_interaction(f"Fast-path intent: {local_intent} (confidence {confidence:.2f})", run_folder)
+        log_interaction(f"Detected intent: {local_intent}", run_folder)
+        print("Detected intent (local):", local_intent)
+        return local_intent
+    log_interaction(f"Fast-path escalated to LLM (local guess {local_intent}, confidence {confidence:.2f})", run_folder)
+
     prompt = f"""
 An elderly person was asked: "Did you fall?".
 They responded: "{text}"
@@ -105,50 +104,57 @@ Only return one of: ok, not_ok, unclear.
 """
 
     print("Classifying intent...")
-    response = openai.chat.completions.create(
+    response = await stage("classify", get_async_openai().chat.completions.create(
         model="gpt-3.5-turbo",
         messages=[{"role": "user", "content": prompt}],
         temperature=0
-    )
-    intent = response.choices[0].message.content.strip()
-    log_interaction(f"Detected intent: {intent}", run_folder)
+    ))
+    tracing.count("api_calls", api="chat")
+    reply = response.choices[0].message.content
+    # The model doesn't always answer with the exact label; anything unexpected counts as unclear
+    intent = normalize_intent(reply)
+    log_interaction(f"Detected intent: {intent}", run_folder, reply=reply.strip())
     print("Detected intent:", intent)
     return intent
 
-def call_for_help():
-    url = "https://724cu8r3wk.execute-api.ca-central-1.amazonaws.com/Prod/outcall"
-    headers = {'Content-Type': 'application/json'}
-    data = {
-        "emergencyPhoneNumber": EMERGENCYNUMBER,
-        "emergencyFirstname": "SRR",
-        "userFirstName": "Clay",
-        "userLastName": ""
-    }
-    response = requests.post(url, json=data, headers=headers)
-    print(f"Emergency request sent, response status code: {response.status_code}")
-    return response.status_code
+async def call_for_help():
+    # Shared client: pre-warmed keep-alive connection, timeouts, hedged retries
+    try:
+        return await stage("outcall", asyncio.to_thread(emergency.call_for_help, EMERGENCYNUMBER, user_first_name="Clay"))
+    except StageTimeout:
+        return None
+
+async def understand_response(run_folder, duration, gate):
+    """Record, transcribe and classify one answer; a stage that fails or times out counts as unclear"""
+    try:
+        audio_path = await record_audio(run_folder, duration=duration, gate=gate)
+        transcribed = await transcribe_audio(audio_path, run_folder)
+        return await interpret_intent(transcribed, run_folder)
+    except Exception as e:
+        log_interaction(f"Stage failed, treating response as unclear: {e}", run_folder)
+        print(f"Stage failed: {e}")
+        return "unclear"
 
 # Determine if the user is ok or not based on the interaction
-def main():
+async def interaction(run_folder=None):
     # Create a new folder for this run
-    run_folder = create_run_folder()
-    log_interaction("=== Starting new interaction ===", run_folder)
+    run_folder = run_folder or create_run_folder()
+    log_interaction("=== Starting new interaction ===", run_folder, kind="fall_checkin")
+    scheduler = InteractionScheduler(log=lambda message: log_interaction(message, run_folder))
     
     max_attempts = 3  # Maximum number of attempts for unclear responses
     attempt = 0
     
+    # Play the prompt, and warm up OpenAI and the outcall endpoint while it plays
+    mic_gate = scheduler.play_and_arm("audiofiles/prompt.wav", name="prompt")
+    scheduler.prewarm(openai)
+    
     while attempt < max_attempts:
-        if attempt == 0:
-            play_prompt()
-            # First attempt: 6 seconds recording
-            audio_path = record_audio(run_folder, duration=6)
-        else:
+        if attempt > 0:
             log_interaction(f"Attempt {attempt + 1}: Asking again after unclear response", run_folder)
-            # Follow-up attempts: 10 seconds recording
-            audio_path = record_audio(run_folder, duration=10)
-        
-        transcribed = transcribe_audio(audio_path, run_folder)
-        intent = interpret_intent(transcribed, run_folder)
+        # First attempt: 6 seconds recording, follow-ups: 10 seconds, starting when the prompt ends
+        intent = await understand_response(run_folder, 6 if attempt == 0 else 10, mic_gate)
+        scheduler.mark(f"attempt{attempt + 1}_classified")
 
         if intent == "ok":
             log_interaction("Action: False alarm - No action needed", run_folder)
@@ -156,27 +162,46 @@ def main():
             play_response_audio(intent)
             break
         elif intent == "not_ok":
-            log_interaction("Action: Emergency confirmed - Help needed", run_folder)
+            log_emergency("Action: Emergency confirmed - Help needed", run_folder)
             print("Emergency confirmed! Calling for help.")
+            # The outcall goes out while the response is still playing
             play_response_audio(intent)
-            # Call emergency number
-            status_code = call_for_help()
-            log_interaction(f"Emergency call initiated with status code: {status_code}", run_folder)
+            status_code = await call_for_help()
+            scheduler.mark("outcall_done")
+            log_emergency(f"Emergency call initiated with status code: {status_code}", run_folder,
+                          status_code=status_code)
             break
         else:  # unclear
             log_interaction(f"Action: Unclear response on attempt {attempt + 1}", run_folder)
             print(f"Unclear response. Attempt {attempt + 1} of {max_attempts}")
-            play_response_audio(intent)
             attempt += 1
             
             if attempt >= max_attempts:
-                log_interaction("Action: Maximum attempts reached - Escalating to emergency", run_folder)
+                play_response_audio(intent)
+                log_emergency("Action: Maximum attempts reached - Escalating to emergency", run_folder)
                 print("Maximum attempts reached. Escalating to emergency response.")
                 play_audio_file("audiofiles/emergency.wav")
-                status_code = call_for_help()
-                log_interaction(f"Emergency call initiated with status code: {status_code}", run_folder)
+                status_code = await call_for_help()
+                scheduler.mark("outcall_done")
+                log_emergency(f"Emergency call initiated with status code: {status_code}", run_folder,
+                              status_code=status_code)
+            else:
+                mic_gate = scheduler.play_and_arm(RESPONSE_AUDIO["unclear"], name=f"reprompt{attempt}")
     
-    log_interaction("=== Interaction complete ===\n", run_folder)
+    # Let the final response finish playing before the process exits
+    await stage("play", drain())
+    scheduler.mark("response_played")
+    log_interaction("Stage timings: " + "; ".join(scheduler.summary()), run_folder,
+                    stages=scheduler.stage_records())
+    log_interaction("=== Interaction complete ===", run_folder)
+    close_run_logger(run_folder)
+
+def main():
+    tracing.start()
+    get_engine()  # open the speaker now, so a wrong AUDIO_OUTPUT_DEVICE fails at startup
+    run_folder = create_run_folder()
+    # Spans and counters of the check-in go to <run folder>/trace.json when TRACING=1
+    get_runtime().run(tracing.traced(run_folder, interaction(run_folder)))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,102 @@
+"""
+Text-level wake-word matching for transcripts.
+
+A single compiled regex catches the wake word and its known spellings on word boundaries.
+Anything else is scored token by token: half spelling similarity (edit distance), half
+sound similarity (edit distance between Soundex-style consonant keys), with a bonus when
+the token follows a prefix such as "hey". Text matches when the best score reaches the
+threshold, so "hey wool" is caught while "jolly" and "well" are not.
+"""
+import os
+import re
+
+TOKEN = re.compile(r"[a-z']+")
+
+# Letters that sound alike share a digit; vowels and h/w/y only separate consonants
+SOUND_CODES = {c: d for d, letters in enumerate(("bfpv", "cgjkqsxz", "dt", "l", "mn", "r"), 1) for c in letters}
+
+WOOLLY_VARIANTS = ("wolly", "wooly", "willy", "willie", "wally", "olly", "wollie", "wolli", "woli", "woll")
+
+
+def phonetic_key(word):
+    """First letter plus the sound codes of the following consonants, repeats collapsed"""
+    if not word:
+        return ""
+    key = [word[0]]
+    previous = SOUND_CODES.get(word[0])
+    for c in word[1:]:
+        code = SOUND_CODES.get(c)
+        if code is not None and code != previous:
+            key.append(str(code))
+        if c not in "hw":
+            previous = code
+    return "".join(key)
+
+
+def edit_distance(a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    row = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        diagonal, row[0] = row[0], i
+        for j, cb in enumerate(b, 1):
+            diagonal, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, diagonal + (ca != cb))
+    return row[-1]
+
+
+def similarity(a, b):
+    """1.0 for identical strings, 0.0 when every character differs"""
+    longest = max(len(a), len(b))
+    return 1.0 - edit_distance(a, b) / longest if longest else 1.0
+
+
+class WakeWordMatcher:
+    def __init__(self, words=("woolly",), variants=WOOLLY_VARIANTS, prefixes=("hey",), threshold=None,
+                 prefix_bonus=0.1):
+        self.words = [(w, phonetic_key(w)) for w in words]
+        self.prefixes = set(prefixes)
+        self.threshold = threshold if threshold is not None else float(os.getenv("WAKE_WORD_THRESHOLD", "0.85"))
+        self.prefix_bonus = prefix_bonus
+        spellings = sorted(set(words) | set(variants), key=len, reverse=True)
+        self.exact = re.compile(r"\b(?:%s)\b" % "|".join(re.escape(s) for s in spellings))
+        lengths = [len(w) for w in words]
+        self.min_len, self.max_len = max(2, min(lengths) - 3), max(lengths) + 3
+        self.token_scores = {}  # transcripts reuse a small vocabulary, so remember per-token scores
+
+    def token_score(self, token):
+        score = self.token_scores.get(token)
+        if score is None:
+            key = phonetic_key(token)
+            score = max(0.5 * similarity(token, word) + 0.5 * similarity(key, word_key) for word, word_key in self.words)
+            if len(self.token_scores) >= 4096:
+                self.token_scores.clear()
+            self.token_scores[token] = score
+        return score
+
+    def score(self, text):
+        """
+        Best wake-word score in a transcript.
+        Returns:
+            (score between 0 and 1, matching token or None)
+        """
+        if not text:
+            return 0.0, None
+        text = text.lower()
+        exact = self.exact.search(text)
+        if exact:
+            return 1.0, exact.group(0)
+
+        best, best_token = 0.0, None
+        previous = None
+        for token in TOKEN.findall(text):
+            if self.min_len <= len(token) <= self.max_len:
+                score = self.token_score(token)
+                if previous in self.prefixes:
+                    score = min(1.0, score + self.prefix_bonus)
+                if score > best:
+                    best, best_token = score, token
+            previous = token
+        return best, best_token
+
+    def matches(self, text):
+        return self.score(text)[0] >= self.threshold
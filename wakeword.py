@@ -0,0 +1,142 @@
+"""
+Local wake-word spotting that runs continuously on the microphone.
+
+Audio only goes to the cloud after a local detector fires. Detectors share a tiny interface:
+    sample_rate, frame_length      -- the frame format they expect
+    process(frame) -> bool         -- feed one int16 frame, True on a hit
+    reset()                        -- clear state after a hit
+    needs_verification             -- True if hits should be confirmed by Whisper
+"""
+import os
+
+from audio_utils import frame_rms
+from capture import CaptureService
+
+
+class PorcupineDetector:
+    """Picovoice Porcupine keyword spotter (needs PICOVOICE_ACCESS_KEY and a keyword .ppn file)"""
+    needs_verification = False
+
+    def __init__(self, keyword_path=None, access_key=None, sensitivity=0.6):
+        import pvporcupine
+
+        access_key = access_key or os.getenv("PICOVOICE_ACCESS_KEY")
+        keyword_path = keyword_path or os.getenv("PORCUPINE_KEYWORD_PATH")
+        if not access_key or not keyword_path:
+            raise ValueError("PICOVOICE_ACCESS_KEY and PORCUPINE_KEYWORD_PATH must be set for Porcupine")
+        self.porcupine = pvporcupine.create(
+            access_key=access_key,
+            keyword_paths=[keyword_path],
+            sensitivities=[sensitivity]
+        )
+        self.sample_rate = self.porcupine.sample_rate
+        self.frame_length = self.porcupine.frame_length
+
+    def process(self, frame):
+        return self.porcupine.process(frame) >= 0
+
+    def reset(self):
+        pass
+
+    def close(self):
+        self.porcupine.delete()
+
+
+class SpeechBurstDetector:
+    """
+    Stand-in detector: fires on an isolated, word-length burst of speech.
+
+    It cannot tell "Woolly" from any other short word, so its hits are verified by Whisper,
+    but it keeps silence, room noise and long conversations away from the cloud.
+    """
+    needs_verification = True
+
+    def __init__(self, sample_rate=16000, frame_length=512, min_word=0.25, max_word=1.6,
+                 trailing_silence=0.35, threshold_ratio=3.0, min_rms=300.0):
+        self.sample_rate = sample_rate
+        self.frame_length = frame_length
+        self.frame_seconds = frame_length / sample_rate
+        self.min_word = min_word
+        self.max_word = max_word
+        self.trailing_silence = trailing_silence
+        self.threshold_ratio = threshold_ratio
+        self.min_rms = min_rms
+        self.noise_floor = None
+        self.reset()
+
+    def reset(self):
+        self.voiced = 0.0
+        self.silence = 0.0
+        self.in_burst = False
+
+    def process(self, frame):
+        rms = frame_rms(frame)
+        if self.noise_floor is None:
+            self.noise_floor = rms
+        threshold = max(self.min_rms, self.noise_floor * self.threshold_ratio)
+
+        if rms >= threshold:
+            self.in_burst = True
+            self.voiced += self.frame_seconds
+            self.silence = 0.0
+            return False
+
+        self.noise_floor = 0.98 * self.noise_floor + 0.02 * rms
+        if not self.in_burst:
+            return False
+        self.silence += self.frame_seconds
+        if self.silence < self.trailing_silence:
+            return False
+
+        hit = self.min_word <= self.voiced <= self.max_word
+        self.reset()
+        return hit
+
+
+def create_detector(name=None):
+    """Build the detector named by WAKE_WORD_ENGINE (porcupine or burst)"""
+    name = name or os.getenv("WAKE_WORD_ENGINE", "porcupine")
+    if name == "porcupine":
+        try:
+            return PorcupineDetector()
+        except Exception as e:
+            print(f"Porcupine unavailable ({e}), falling back to the speech-burst detector")
+    return SpeechBurstDetector()
+
+
+class WakeWordEngine:
+    """Keeps the microphone open on a capture ring and feeds its frames to a detector"""
+    def __init__(self, detector, device="plughw:3,0", ring_seconds=3.0):
+        self.detector = detector
+        self.device = device
+        self.hit_samples = int(detector.sample_rate * ring_seconds)
+        # Extra ring beyond the hit window so the returned view survives Whisper verification
+        self.capture = CaptureService(device, detector.sample_rate, ring_seconds=ring_seconds + 10)
+        self.since = 0
+
+    def start(self):
+        if self.capture.running():
+            return
+        self.capture.start()
+        self.since = self.capture.position
+
+    def stop(self):
+        """Release the microphone (e.g. while a conversation records responses)"""
+        self.capture.stop()
+        self.detector.reset()
+
+    def wait_for_hit(self):
+        """Block until the detector fires; returns a view of the audio leading up to the hit"""
+        self.start()
+        frame_length = self.detector.frame_length
+        position = self.capture.position
+        while True:
+            frame = self.capture.read(position, frame_length)
+            if frame is None:
+                raise RuntimeError("Microphone stream closed")
+            position += frame_length
+            if self.detector.process(frame):
+                audio = self.capture.view(max(self.since, position - self.hit_samples), position)
+                self.since = position
+                self.detector.reset()
+                return audio